@@ -0,0 +1,149 @@
+# agent_models.py
+# Which model each agent runs on, and latency budgets.
+# Every agent gets its model, reasoning effort, verbosity and max turns from here. The defaults below can be
+# overridden per agent in a JSON file (AGENT_MODEL_CONFIG_PATH), e.g.
+#   {"running_coach": {"model": "gpt-5", "reasoning": "medium", "fallback_model": "gpt-5-mini"}}
+# and on top of that with env vars named AGENT_<AGENT NAME>_<FIELD>, e.g. AGENT_CONTEXT_UPDATOR_MODEL=gpt-5-nano.
+# A request can run under a latency budget. Once more than AGENT_DOWNGRADE_AFTER_FRACTION of it is used up,
+# the remaining model calls of the request go to the agent's fallback model / reasoning effort instead.
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, fields, replace
+from typing import Any, Iterator, Optional
+
+from dotenv import load_dotenv
+from openai.types.shared import Reasoning
+
+from agents import Model, ModelResponse, ModelSettings
+from agents.models.openai_provider import OpenAIProvider
+
+load_dotenv()
+
+AGENT_MODEL_CONFIG_PATH = os.environ.get("AGENT_MODEL_CONFIG_PATH", "agent_models.json")
+AGENT_DOWNGRADE_AFTER_FRACTION = float(os.environ.get("AGENT_DOWNGRADE_AFTER_FRACTION", "0.5"))
+# Default budgets per kind of request. 0 means no budget.
+CHAT_LATENCY_BUDGET_SECONDS = float(os.environ.get("CHAT_LATENCY_BUDGET_SECONDS", "30"))
+BACKGROUND_LATENCY_BUDGET_SECONDS = float(os.environ.get("BACKGROUND_LATENCY_BUDGET_SECONDS", "0"))
+
+
+@dataclass(frozen=True)
+class AgentModelConfig:
+    model: str
+    reasoning: Optional[str] = None  # None = the model's default effort
+    verbosity: Optional[str] = None
+    max_turns: int = 10
+    # Used for the rest of a request once its latency budget is running out. None = keep the model.
+    fallback_model: Optional[str] = None
+    fallback_reasoning: Optional[str] = None
+
+
+DEFAULT_AGENT_MODELS = {
+    # Mechanical JSON edits, the smallest model does them fine.
+    "context_updator": AgentModelConfig(model="gpt-5-nano", reasoning="minimal", verbosity="low"),
+    "running_coach": AgentModelConfig(model="gpt-5-mini", reasoning="minimal", verbosity="low", fallback_model="gpt-5-nano"),
+    "climbing_coach": AgentModelConfig(model="gpt-5-mini", reasoning="minimal", verbosity="low", fallback_model="gpt-5-nano"),
+    "coordinator_chatbot_agent": AgentModelConfig(model="gpt-5-mini", fallback_reasoning="minimal"),
+}
+
+
+def _from_env(name: str, config: AgentModelConfig) -> AgentModelConfig:
+    overrides: dict[str, Any] = {}
+    for field in fields(AgentModelConfig):
+        value = os.environ.get(f"AGENT_{name.upper()}_{field.name.upper()}")
+        if value is not None:
+            overrides[field.name] = int(value) if field.name == "max_turns" else value
+    return replace(config, **overrides)
+
+
+def load_agent_models(path: str = AGENT_MODEL_CONFIG_PATH) -> dict[str, AgentModelConfig]:
+    configs = dict(DEFAULT_AGENT_MODELS)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for name, values in json.load(f).items():
+                configs[name] = replace(configs[name], **values) if name in configs else AgentModelConfig(**values)
+    return {name: _from_env(name, config) for name, config in configs.items()}
+
+
+agent_models = load_agent_models()
+
+
+def _reasoning(effort: Optional[str]) -> Optional[Reasoning]:
+    return Reasoning(effort=effort) if effort else None  # type: ignore[arg-type]
+
+
+def model_settings_for(agent_name: str) -> ModelSettings:
+    config = agent_models[agent_name]
+    return ModelSettings(verbosity=config.verbosity, reasoning=_reasoning(config.reasoning))  # type: ignore[arg-type]
+
+
+def max_turns_for(agent_name: str) -> int:
+    return agent_models[agent_name].max_turns
+
+
+### Latency budgets
+
+# (start, deadline) of the budget the current request runs under. Copied into the tasks the SDK starts for tools
+# and agents-as-tools, so nested runs see it too.
+_budget: ContextVar[Optional[tuple[float, float]]] = ContextVar("latency_budget", default=None)
+
+
+@contextmanager
+def latency_budget(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block (a whole agent run) under a latency budget. None or 0 means no budget."""
+    now = time.monotonic()
+    token = _budget.set((now, now + seconds) if seconds else None)
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def budget_used() -> Optional[float]:
+    """Fraction of the current budget used so far (can be above 1), None without a budget."""
+    budget = _budget.get()
+    if budget is None:
+        return None
+    start, deadline = budget
+    return (time.monotonic() - start) / (deadline - start)
+
+
+model_tiering_stats = {"calls": 0, "downgraded": 0}
+
+
+class TieredModel(Model):
+    """
+    The model for one agent. Calls the configured model, or the fallback once the request's budget is running out.
+    The OpenAI models are created on first use, so importing the agents needs no API key.
+    """
+
+    _provider = OpenAIProvider()
+    _models: dict[str, Model] = {}
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+
+    def _pick(self, model_settings: ModelSettings) -> tuple[Model, ModelSettings]:
+        config = agent_models[self.agent_name]
+        model_tiering_stats["calls"] += 1
+        name = config.model
+        used = budget_used()
+        if used is not None and used > AGENT_DOWNGRADE_AFTER_FRACTION and (config.fallback_model or config.fallback_reasoning):
+            model_tiering_stats["downgraded"] += 1
+            name = config.fallback_model or config.model
+            if config.fallback_reasoning:
+                model_settings = model_settings.resolve(ModelSettings(reasoning=_reasoning(config.fallback_reasoning)))
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = self._provider.get_model(name)
+        return model, model_settings
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> ModelResponse:
+        model, model_settings = self._pick(model_settings)
+        return await model.get_response(system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs)
+
+    def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        model, model_settings = self._pick(model_settings)
+        return model.stream_response(system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs)
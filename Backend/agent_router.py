@@ -0,0 +1,103 @@
+# agent_router.py
+# Cheap local routing in front of the coordinator.
+# Messages that are clearly about one sport go straight to that coach, which saves the coordinator's
+# extra LLM turn deciding to call the coach as a tool. Anything ambiguous still goes to the coordinator.
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from agents import Agent
+from custom_agents import climbing_coach, coordinator_chatbot_agent, running_coach
+from models import CoordinatorAgentContext
+
+load_dotenv()
+
+ROUTER_ENABLED = os.environ.get("ROUTER_ENABLED", "true").lower() == "true"
+# Share of the keyword score the winning sport needs, and the minimum score, before we skip the coordinator.
+ROUTER_CONFIDENCE_THRESHOLD = float(os.environ.get("ROUTER_CONFIDENCE_THRESHOLD", "0.85"))
+ROUTER_MIN_SCORE = float(os.environ.get("ROUTER_MIN_SCORE", "2"))
+
+# A YDS grade (5.4 - 5.15d), but not a distance or time such as "5.5 km" or "5.10 min/km".
+YDS_GRADE = r"5\.(?:1[0-5][abcd]?|[4-9])(?![\d.]|\s*(?:k|km|kms|kilomet\w*|mi|miles?|min|mins|minutes?|h|hours?)\b|/)"
+
+# (pattern, weight). Patterns are matched case-insensitively on word boundaries.
+SPORT_PATTERNS: dict[str, list[tuple[str, float]]] = {
+    "running": [
+        (r"run(s|ning|ner)?|jog(s|ging)?", 2.0),
+        # A bare "ran" is as often "ran out of chalk" or "ran late", so it only counts next to a distance, time or kind of run.
+        (r"ran (a |an |my )?(\d+(\.\d+)? ?(k|km|kms|kilomet\w*|mi|miles?|min|mins|minutes?|h|hours?)|easy|long|hard|fast|slow|tempo|intervals?)", 2.0),
+        (r"marathon|half marathon|ultra|5k|10k|parkrun|trail run", 2.0),
+        (r"pace|tempo|intervals?|strides|fartlek|long run|zone 2|cadence|splits?", 1.5),
+        (r"km|kilomet(er|re)s?|miles?|mileage|elevation gain|shin splints?|it band", 1.0),
+    ],
+    "climbing": [
+        # "send" and "project" are left out: on their own they are as likely to be about work as about a route.
+        (r"climb(s|ing|er)?|boulder(s|ing)?|crag|top ?rope|lead climbing", 2.0),
+        (rf"v\d{{1,2}}|{YDS_GRADE}|grade pyramid|redpoint|onsight|flash(ed)?", 2.0),
+        (r"crimps?|slopers?|overhang|hangboard|campus board|fingers?|pulleys?|belay", 1.5),
+    ],
+}
+
+# Requests that are the coordinator's own job (plans, goals, or more than one sport).
+COORDINATOR_PATTERNS = [
+    r"both|balance|combine|cross[- ]train(ing)?|all my sports",
+    r"(new|add|create|set|delete|remove|change|update) (a |my )?(goal|plan|training plan)",
+]
+
+_COMPILED_SPORTS = {
+    sport: [(re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE), weight) for pattern, weight in patterns]
+    for sport, patterns in SPORT_PATTERNS.items()
+}
+_COMPILED_COORDINATOR = [re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE) for pattern in COORDINATOR_PATTERNS]
+
+AGENTS_BY_ROUTE: dict[str, Agent[CoordinatorAgentContext]] = {
+    "running": running_coach,
+    "climbing": climbing_coach,
+    "coordinator": coordinator_chatbot_agent,
+}
+
+
+@dataclass
+class RouteDecision:
+    route: str  # "running", "climbing" or "coordinator"
+    confidence: float
+    scores: dict[str, float]
+
+
+def route_message(text: str, threshold: float = ROUTER_CONFIDENCE_THRESHOLD, min_score: float = ROUTER_MIN_SCORE) -> RouteDecision:
+    scores = {
+        sport: sum(weight * len(pattern.findall(text)) for pattern, weight in patterns)
+        for sport, patterns in _COMPILED_SPORTS.items()
+    }
+    total = sum(scores.values())
+    if total == 0 or any(pattern.search(text) for pattern in _COMPILED_COORDINATOR):
+        return RouteDecision("coordinator", 0.0, scores)
+
+    sport, score = max(scores.items(), key=lambda kv: kv[1])
+    confidence = score / total
+    if score < min_score or confidence < threshold:
+        return RouteDecision("coordinator", confidence, scores)
+    return RouteDecision(sport, confidence, scores)
+
+
+def _last_user_text(items: list[dict[str, Any]]) -> Optional[str]:
+    for item in reversed(items):
+        if item.get("role") == "user":
+            content = item.get("content", "")
+            if isinstance(content, str):
+                return content
+            return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return None
+
+
+def choose_starting_agent(items: list[dict[str, Any]]) -> Agent[CoordinatorAgentContext]:
+    """Pick the agent that should answer the latest user message."""
+    text = _last_user_text(items)
+    if not ROUTER_ENABLED or not text:
+        return coordinator_chatbot_agent
+    decision = route_message(text)
+    print(f"🧭 Routed to {decision.route} (confidence {decision.confidence:.2f}, scores {decision.scores})")
+    return AGENTS_BY_ROUTE[decision.route]
@@ -0,0 +1,464 @@
+# benchmark.py
+# Offline end-to-end benchmark of the API, no OpenAI or Supermemory account needed.
+# The app runs in-process (its real lifespan, routing, tools, stores and ingestion queue), with:
+#   - every agent's model swapped for a ScriptedModel that replays a fixed tool-call sequence after a configurable delay
+#   - MEMORY_BACKEND=local with the hashing embedder, in a temp dir, instead of Supermemory
+# Results (latency percentiles, time to the first streamed event, tool calls, prompt / completion tokens, payload bytes
+# per endpoint) are written as JSON,
+# and --compare prints the change against an earlier results file.
+## TO RUN: python benchmark.py --requests 50 --out bench.json [--compare bench_main.json]
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from uuid import uuid4
+
+# Must be set before the app modules are imported, they read their config at import time.
+_BENCH_DIR = tempfile.mkdtemp(prefix="dojo-bench-")
+for key, value in {
+    "MEMORY_BACKEND": "local",
+    "LOCAL_MEMORY_EMBEDDER": "hashing",
+    "LOCAL_MEMORY_DIR": os.path.join(_BENCH_DIR, "memory"),
+    "WORKOUT_STORE_PATH": os.path.join(_BENCH_DIR, "workouts.db"),
+    "IDEMPOTENCY_STORE_PATH": os.path.join(_BENCH_DIR, "idempotency.db"),
+    "CONTEXT_VERSION_STORE_PATH": os.path.join(_BENCH_DIR, "context_versions.db"),
+    "SESSION_STORE_PATH": "",
+    "FITNESS_REEVAL_WINDOW_SECONDS": "0",
+    "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "sk-offline-benchmark",
+}.items():
+    os.environ[key] = value
+
+import httpx
+from openai.types.responses import (
+    Response, ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputItemDoneEvent, ResponseOutputMessage,
+    ResponseOutputText, ResponseTextDeltaEvent, ResponseUsage,
+)
+
+from agents import Model, ModelResponse, Usage, set_tracing_disabled
+import custom_agents
+import main
+
+set_tracing_disabled(True)
+
+PERCENTILES = (50, 90, 99)
+
+
+### Scripted model
+
+@dataclass
+class Step:
+    tool: Optional[str] = None  # None = final text answer
+    arguments: dict[str, Any] = field(default_factory=dict)
+    text: str = "Done."
+
+
+@dataclass
+class RequestStats:
+    model_calls: int = 0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    first_body_at: Optional[float] = None  # perf_counter() when the app sent the first response bytes
+
+
+# Stats for the request currently being measured (requests run one at a time per worker task).
+_current_stats: dict[int, RequestStats] = {}
+
+
+def _stats() -> Optional[RequestStats]:
+    # Tools and background jobs run in child tasks, so walk up to the task that sent the request.
+    task = asyncio.current_task()
+    while task is not None:
+        stats = _current_stats.get(id(task))
+        if stats is not None:
+            return stats
+        task = getattr(task, "bench_parent", None)
+    return None
+
+
+def _tokens(value: Any) -> int:
+    return len(json.dumps(value, default=str)) // 4
+
+
+class ScriptedModel(Model):
+    """
+    Replays `script` for each run: step i is returned once i tool outputs have come back since the last
+    user message, so the sequence is the same whatever the tools return.
+    """
+
+    def __init__(self, script: list[Step], latency_ms: float, jitter_ms: float, rng: random.Random):
+        self.script = script
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = rng
+
+    def _step(self, input: str | list, tools: list) -> Step:
+        # Steps for tools the agent doesn't have in this run (e.g. a coach consulted read-only) are skipped.
+        names = {tool.name for tool in tools}
+        script = [step for step in self.script if step.tool is None or step.tool in names]
+        if isinstance(input, str):
+            return script[0]
+        last_user = max((i for i, item in enumerate(input) if item.get("role") == "user"), default=-1)
+        done = sum(1 for item in input[last_user + 1:] if item.get("type") == "function_call_output")
+        return script[min(done, len(script) - 1)]
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> ModelResponse:
+        await asyncio.sleep(max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        step = self._step(input, tools)
+        if step.tool is not None:
+            output = [ResponseFunctionToolCall(
+                type="function_call", id=f"fc_{uuid4().hex}", call_id=f"call_{uuid4().hex}",
+                name=step.tool, arguments=json.dumps(step.arguments), status="completed",
+            )]
+        else:
+            output = [ResponseOutputMessage(
+                type="message", id=f"msg_{uuid4().hex}", role="assistant", status="completed",
+                content=[ResponseOutputText(type="output_text", text=step.text, annotations=[])],
+            )]
+
+        prompt_tokens = _tokens([system_instructions, input, [getattr(t, "params_json_schema", t.name) for t in tools]])
+        completion_tokens = _tokens([item.model_dump() for item in output])
+        stats = _stats()
+        if stats is not None:
+            stats.model_calls += 1
+            stats.tool_calls += step.tool is not None
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+        return ModelResponse(
+            output=output,
+            usage=Usage(requests=1, input_tokens=prompt_tokens, output_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens),
+            response_id=None,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        """The same step as get_response, as Responses API stream events: text deltas word by word, then completed."""
+        response = await self.get_response(system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs)
+        sequence = 0
+        for index, item in enumerate(response.output):
+            if isinstance(item, ResponseOutputMessage):
+                for word in item.content[0].text.split(" "):
+                    yield ResponseTextDeltaEvent(
+                        type="response.output_text.delta", item_id=item.id, output_index=index, content_index=0,
+                        delta=word + " ", logprobs=[], sequence_number=sequence,
+                    )
+                    sequence += 1
+            yield ResponseOutputItemDoneEvent(type="response.output_item.done", item=item, output_index=index, sequence_number=sequence)
+            sequence += 1
+        usage = response.usage
+        yield ResponseCompletedEvent(
+            type="response.completed",
+            sequence_number=sequence,
+            response=Response(
+                id=f"resp_{uuid4().hex}", created_at=time.time(), model="scripted", object="response",
+                output=response.output, parallel_tool_calls=False, tool_choice="auto", tools=[],
+                usage=ResponseUsage.model_validate({
+                    "input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens, "total_tokens": usage.total_tokens,
+                    # cache_write_tokens only exists in newer openai versions; older ones ignore it.
+                    "input_tokens_details": {"cached_tokens": 0, "cache_write_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                }),
+            ),
+        )
+
+
+def install_models(latency_ms: float, jitter_ms: float, seed: int) -> None:
+    """Give every agent a scripted model. Agents used as tools are the same objects, so they are covered too."""
+    rng = random.Random(seed)
+    fitness_patch = json.dumps([
+        {"op": "replace", "path": "/activityFitnessLevels/0/agentDefinedFitnessLevel", "value": "Intermediate, building volume"},
+    ])
+
+    def coach_script(activity: str) -> list[Step]:
+        return [
+            Step("get_training_analytics", {"activity": activity, "weeks": 12}),
+            Step("query_workout_log", {"activity": activity, "last_n": 10}),
+            Step("search_workout_history", {"userId": BENCH_USER, "query": f"hard {activity} sessions", "activity": activity, "limit": 5}),
+            Step("context_updator", {"input": f"Set the agentDefinedFitnessLevel for {activity}."}),
+            Step(text=f"Your {activity} fitness level is updated."),
+        ]
+
+    scripts = [
+        (custom_agents.context_updator, [
+            Step("get_context", {"sections": ["fitness_levels"]}),
+            Step("patch_context", {"patch_json": fitness_patch}),
+            Step(text="Updated the fitness level."),
+        ]),
+        (custom_agents.running_coach, coach_script("running")),
+        (custom_agents.climbing_coach, coach_script("climbing")),
+        (custom_agents.coordinator_chatbot_agent, [
+            Step("get_context", {"sections": ["goals", "training_plan"]}),
+            Step("consult_coaches", {"question": "How is my training going?", "activities": ["running", "climbing"]}),
+            Step(text="Running and climbing are both on track."),
+        ]),
+    ]
+    for agent, script in scripts:
+        agent.model = ScriptedModel(script, latency_ms, jitter_ms, rng)
+
+
+### Fixtures
+
+BENCH_USER = "00000000-0000-4000-8000-00000000be4c"
+
+
+def make_context(days: int) -> dict:
+    start = datetime(2025, 1, 6, tzinfo=timezone.utc)
+    return {
+        "userId": BENCH_USER,
+        "goals": [{
+            "id": str(uuid4()), "goalActivity": "running", "title": "Sub 1:45 half", "description": "Spring half marathon",
+            "goalDeadline": (start + timedelta(days=120)).isoformat(), "isCompleted": False,
+        }],
+        "activityFitnessLevels": [
+            {"activity": "running", "userDefinedFitnessLevel": "Intermediate"},
+            {"activity": "climbing", "userDefinedFitnessLevel": "V4"},
+        ],
+        "currentTrainingPlan": [
+            {
+                "tracking_id": str(uuid4()),
+                "date": (start + timedelta(days=i)).isoformat(),
+                "sessions": [{"activity": "running", "sessionDescription": "Easy zone 2 run", "distanceKm": 8, "heartRate": 140, "elevationGain": 60, "paceMinPerKm": 360}]
+                if i % 2 == 0 else
+                [{"activity": "climbing", "sessionDescription": "Limit bouldering", "routes": [
+                    {"gradeValue": {"scale": "v", "value": "V5"}, "shortDescription": "Crimpy overhang"}]}],
+            }
+            for i in range(days)
+        ],
+    }
+
+
+def make_run(rng: random.Random, when: datetime) -> dict:
+    return {
+        "activity": "running", "date": when.isoformat(), "userNotes": "felt ok",
+        "distanceKm": round(rng.uniform(4, 22), 1), "avgHeartRate": rng.randint(130, 170),
+        "elevationGain": rng.randint(0, 400), "avgPacePerKm": round(rng.uniform(4.5, 6.5), 2),
+    }
+
+
+def make_climb(rng: random.Random, when: datetime) -> dict:
+    return {
+        "activity": "climbing", "date": when.isoformat(), "userNotes": "good session",
+        "routes": [{"grade": f"V{rng.randint(2, 7)}", "attempts": rng.randint(1, 5), "send": rng.random() < 0.6, "style": "boulder"} for _ in range(6)],
+    }
+
+
+### Driver
+
+@dataclass
+class Sample:
+    seconds: float
+    status: int
+    request_bytes: int
+    response_bytes: int
+    stats: RequestStats
+    body: str = field(default="", repr=False)
+    first_event_seconds: Optional[float] = None  # streamed endpoints only
+
+
+async def measure(client: httpx.AsyncClient, method: str, url: str, body: Optional[dict] = None) -> Sample:
+    stats = RequestStats()
+    task = asyncio.current_task()
+    _current_stats[id(task)] = stats
+    payload = json.dumps(body).encode() if body is not None else b""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, content=payload or None, headers={"Content-Type": "application/json"})
+    finally:
+        del _current_stats[id(task)]
+    return Sample(time.perf_counter() - started, response.status_code, len(payload), len(response.content), stats, body=response.text)
+
+
+async def measure_stream(client: httpx.AsyncClient, method: str, url: str, body: dict) -> Sample:
+    """
+    Like measure, for the NDJSON endpoints: also records the time to the first event, and an error event counts as
+    a failed request. httpx's ASGITransport buffers the whole body, so the first event is timed inside the app.
+    """
+    started = time.perf_counter()
+    sample = await measure(client, method, url, body)
+    if sample.stats.first_body_at is not None:
+        sample.first_event_seconds = sample.stats.first_body_at - started
+    for line in sample.body.splitlines():
+        event = json.loads(line)
+        if event["type"] == "error":
+            sample.status = event.get("status", 500)
+    return sample
+
+
+def timed_app(app):
+    """Wrap the ASGI app to note when each request's first response bytes are sent."""
+    async def wrapped(scope, receive, send):
+        async def timed_send(message):
+            stats = _stats()
+            if message["type"] == "http.response.body" and message.get("body") and stats is not None and stats.first_body_at is None:
+                stats.first_body_at = time.perf_counter()
+            await send(message)
+        await app(scope, receive, timed_send)
+    return wrapped
+
+
+def _track_child_tasks() -> None:
+    """Tag tasks with the task that created them, so model calls inside tools are counted for the right request."""
+    loop = asyncio.get_running_loop()
+    default_factory = loop.get_task_factory()
+
+    def factory(loop, coro, **kwargs):
+        task = default_factory(loop, coro, **kwargs) if default_factory else asyncio.Task(coro, loop=loop, **kwargs)
+        task.bench_parent = asyncio.current_task(loop)
+        return task
+
+    loop.set_task_factory(factory)
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples: list[Sample]) -> dict:
+    ok = [s for s in samples if s.status < 400]
+    latencies = [s.seconds * 1000 for s in ok]
+    first_events = [s.first_event_seconds * 1000 for s in ok if s.first_event_seconds is not None]
+    mean = lambda values: round(sum(values) / len(values), 2) if values else None
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "latency_ms": {
+            **{f"p{p}": round(_percentile(latencies, p), 2) for p in PERCENTILES if latencies},
+            "mean": mean(latencies),
+            "max": round(max(latencies), 2) if latencies else None,
+        },
+        "model_calls": mean([s.stats.model_calls for s in ok]),
+        "tool_calls": mean([s.stats.tool_calls for s in ok]),
+        "prompt_tokens": mean([s.stats.prompt_tokens for s in ok]),
+        "completion_tokens": mean([s.stats.completion_tokens for s in ok]),
+        "request_bytes": mean([s.request_bytes for s in ok]),
+        "response_bytes": mean([s.response_bytes for s in ok]),
+    }
+    if first_events:
+        summary["first_event_ms"] = {f"p{p}": round(_percentile(first_events, p), 2) for p in PERCENTILES}
+    return summary
+
+
+async def run_benchmarks(args: argparse.Namespace) -> dict:
+    _track_child_tasks()
+    install_models(args.model_latency_ms, args.model_jitter_ms, args.seed)
+    rng = random.Random(args.seed)
+    context = make_context(args.plan_days)
+    now = datetime.now(timezone.utc)
+    samples: dict[str, list[Sample]] = {}
+
+    async def run_many(name: str, make_request, streamed: bool = False):
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int):
+            async with semaphore:
+                return await (measure_stream if streamed else measure)(client, *make_request(i))
+
+        samples[name] = list(await asyncio.gather(*(one(i) for i in range(args.requests))))
+        print(f"⏱️  {name}: {summarize(samples[name])['latency_ms']}")
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=timed_app(main.app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # History first, so the coaches' tools have something to read.
+            history = [make_run(rng, now - timedelta(days=d)) for d in range(args.history_days)]
+            history += [make_climb(rng, now - timedelta(days=d, hours=12)) for d in range(0, args.history_days, 3)]
+            samples["POST /submit_workouts"] = [await measure(client, "POST", "/submit_workouts", {
+                "userId": BENCH_USER, "workouts": history, "coordinatorContext": context,
+            })]
+            await main.ingestion_queue.flush()
+            # Later requests send the imported context and its version, like the app does with the latest response.
+            imported = json.loads(samples["POST /submit_workouts"][0].body)
+            context, version = imported["context"], int(imported["etag"].strip('"'))
+
+            await run_many("POST /submit_workout", lambda i: ("POST", "/submit_workout?wait=true", {
+                "userId": BENCH_USER, "coordinatorContext": context, "contextVersion": version,
+                "workout": make_run(rng, now - timedelta(minutes=i)) if i % 2 == 0 else make_climb(rng, now - timedelta(minutes=i)),
+            }))
+            await run_many("POST /chat (coordinator)", lambda i: ("POST", "/chat", {
+                "messages": [{"role": "user", "content": "How should I balance my training this week?"}],
+                "coordinatorContext": context, "contextVersion": version, "timestamp": now.isoformat(), "userId": BENCH_USER, "conversation_id": f"bench-c-{i}",
+            }))
+            await run_many("POST /chat (routed to coach)", lambda i: ("POST", "/chat", {
+                "messages": [{"role": "user", "content": "How was my long run pace on my last 10k tempo run?"}],
+                "coordinatorContext": context, "contextVersion": version, "timestamp": now.isoformat(), "userId": BENCH_USER, "conversation_id": f"bench-r-{i}",
+            }))
+            await run_many("POST /chat/stream (coordinator)", lambda i: ("POST", "/chat/stream", {
+                "messages": [{"role": "user", "content": "How should I balance my training this week?"}],
+                "coordinatorContext": context, "contextVersion": version, "timestamp": now.isoformat(), "userId": BENCH_USER, "conversation_id": f"bench-s-{i}",
+            }), streamed=True)
+            metrics = (await client.get("/metrics")).text
+
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            f.write(metrics)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "args": vars(args),
+        },
+        "endpoints": {name: summarize(endpoint_samples) for name, endpoint_samples in samples.items()},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\nChange vs {baseline['meta'].get('commit')} (negative is better):")
+    for name, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        for metric in ("p50", "p90", "p99"):
+            a, b = before["latency_ms"].get(metric), now["latency_ms"].get(metric)
+            if a and b:
+                print(f"  {name:32} {metric:4} {a:9.1f} -> {b:9.1f} ms ({(b - a) / a:+.1%})")
+        a, b = before.get("first_event_ms", {}).get("p50"), now.get("first_event_ms", {}).get("p50")
+        if a and b:
+            print(f"  {name:32} first event p50 {a:9.1f} -> {b:9.1f} ms ({(b - a) / a:+.1%})")
+        for metric in ("tool_calls", "prompt_tokens", "response_bytes"):
+            a, b = before.get(metric), now.get(metric)
+            if a and b is not None and a != b:
+                print(f"  {name:32} {metric:14} {a} -> {b} ({(b - a) / a:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__ or "Offline API benchmark")
+    parser.add_argument("--requests", type=int, default=30, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--model-latency-ms", type=float, default=50.0, help="simulated time per model call")
+    parser.add_argument("--model-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--history-days", type=int, default=120, help="days of completed workouts to import first")
+    parser.add_argument("--plan-days", type=int, default=60, help="days in the training plan sent as context")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--metrics-out", help="also save the app's /metrics output here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args))
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Wrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
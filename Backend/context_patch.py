@@ -0,0 +1,170 @@
+# context_patch.py
+# RFC 6902 (JSON Patch) style edits of the CoordinatorAgentContext.
+# Lets the agents change one goal / session / fitness level without re-emitting the whole context.
+import copy
+from typing import Any
+
+from models import CoordinatorAgentContext
+from run_cache import mark_context_changed
+
+# Paths the agents are never allowed to patch. The user owns these values.
+PROTECTED_FIELDS = {"userId", "userDefinedFitnessLevel", "userDefinedFitnessLevelUpdatedDate"}
+# Protected fields per fitness level entry (checked by activity, so reordering the entries is fine).
+PROTECTED_FITNESS_FIELDS = ("userDefinedFitnessLevel", "userDefinedFitnessLevelUpdatedDate")
+
+
+class ContextPatchError(ValueError):
+    pass
+
+
+def _parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ContextPatchError(f"invalid path '{pointer}', paths must start with '/'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _check_writable(pointer: str, tokens: list[str]) -> None:
+    if not tokens:
+        raise ContextPatchError("patching the whole context is not allowed, use update_context instead")
+    protected = PROTECTED_FIELDS.intersection(tokens)
+    if protected:
+        raise ContextPatchError(f"'{pointer}' touches {', '.join(sorted(protected))}, which cannot be changed")
+
+
+def _protected_values(context: CoordinatorAgentContext) -> dict[str, Any]:
+    values: dict[str, Any] = {"userId": context.userId}
+    for level in context.activityFitnessLevels:
+        for field in PROTECTED_FITNESS_FIELDS:
+            value = getattr(level, field)
+            if value is not None:
+                values[f"{level.activity.value}.{field}"] = value
+    return values
+
+
+def _array_index(container: list, token: str, pointer: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise ContextPatchError(f"'{token}' in '{pointer}' is not a valid array index")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise ContextPatchError(f"index {index} in '{pointer}' is out of range")
+    return index
+
+
+def _resolve_parent(document: Any, tokens: list[str], pointer: str) -> Any:
+    current = document
+    for token in tokens[:-1]:
+        if isinstance(current, list):
+            current = current[_array_index(current, token, pointer, allow_end=False)]
+        elif isinstance(current, dict):
+            if token not in current:
+                raise ContextPatchError(f"'{pointer}' does not exist")
+            current = current[token]
+        else:
+            raise ContextPatchError(f"'{pointer}' does not exist")
+    return current
+
+
+def _get(document: Any, pointer: str) -> Any:
+    tokens = _parse_pointer(pointer)
+    if not tokens:
+        return document
+    parent = _resolve_parent(document, tokens, pointer)
+    if isinstance(parent, list):
+        return parent[_array_index(parent, tokens[-1], pointer, allow_end=False)]
+    if isinstance(parent, dict) and tokens[-1] in parent:
+        return parent[tokens[-1]]
+    raise ContextPatchError(f"'{pointer}' does not exist")
+
+
+def _add(document: Any, pointer: str, value: Any) -> str:
+    """Add `value` at `pointer` and return the concrete path it landed on ('-' resolved to an index)."""
+    tokens = _parse_pointer(pointer)
+    parent = _resolve_parent(document, tokens, pointer)
+    if isinstance(parent, list):
+        index = _array_index(parent, tokens[-1], pointer, allow_end=True)
+        parent.insert(index, value)
+        return pointer.rsplit("/", 1)[0] + f"/{index}"
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+        return pointer
+    raise ContextPatchError(f"cannot add at '{pointer}'")
+
+
+def _remove(document: Any, pointer: str) -> Any:
+    tokens = _parse_pointer(pointer)
+    parent = _resolve_parent(document, tokens, pointer)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, tokens[-1], pointer, allow_end=False))
+    if isinstance(parent, dict) and tokens[-1] in parent:
+        return parent.pop(tokens[-1])
+    raise ContextPatchError(f"'{pointer}' does not exist")
+
+
+def apply_operations(document: Any, operations: list[dict]) -> list[str]:
+    """Apply JSON Patch operations to a plain JSON document in place. Returns the changed paths."""
+    changed: list[str] = []
+    for number, operation in enumerate(operations):
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise ContextPatchError(f"operation {number} needs an 'op' and a 'path'")
+        op, path = operation["op"], operation["path"]
+        if op != "test":
+            _check_writable(path, _parse_pointer(path))
+
+        if op == "add":
+            path = _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(document, path)
+        elif op == "replace":
+            _get(document, path)
+            _remove(document, path)
+            _add(document, path, copy.deepcopy(operation["value"]))
+        elif op in ("move", "copy"):
+            source = operation.get("from")
+            if source is None:
+                raise ContextPatchError(f"operation {number} ({op}) needs a 'from' path")
+            if op == "move":
+                _check_writable(source, _parse_pointer(source))
+                if path.startswith(source + "/"):
+                    raise ContextPatchError(f"cannot move '{source}' into its own child '{path}'")
+                value = _remove(document, source)
+                changed.append(source)
+            else:
+                value = copy.deepcopy(_get(document, source))
+            path = _add(document, path, value)
+        elif op == "test":
+            if _get(document, path) != operation.get("value"):
+                raise ContextPatchError(f"test failed at '{path}'")
+            continue
+        else:
+            raise ContextPatchError(f"unknown op '{op}' in operation {number}")
+        changed.append(path)
+    return changed
+
+
+def apply_context_patch(context: CoordinatorAgentContext, operations: list[dict]) -> list[str]:
+    """
+    Apply the patch to `context` atomically: the operations run against a JSON copy, the result is
+    validated as a full CoordinatorAgentContext, and only then copied onto the live context.
+    The user owned values are compared before and after, so removing, moving or replacing a whole fitness level
+    can't change them either. If any operation, the validation or that check fails, `context` is left untouched.
+    """
+    document = context.model_dump(mode="json")
+    changed = apply_operations(document, operations)
+    try:
+        patched = CoordinatorAgentContext.model_validate(document)
+    except Exception as e:
+        raise ContextPatchError(f"patched context is invalid - {e}") from e
+
+    before, after = _protected_values(context), _protected_values(patched)
+    modified = sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+    if modified:
+        raise ContextPatchError(f"the patch changes {', '.join(modified)}, which cannot be changed")
+
+    for field in type(context).model_fields:
+        setattr(context, field, getattr(patched, field))
+    mark_context_changed(context)
+    return list(dict.fromkeys(changed))
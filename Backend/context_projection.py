@@ -0,0 +1,107 @@
+# context_projection.py
+# Compact, partial views of the CoordinatorAgentContext for the agents.
+# The full context (mostly currentTrainingPlan) is the biggest chunk of input tokens we send,
+# so tools only return the sections, dates and activity the caller actually asked for.
+import json
+from datetime import date, datetime
+from typing import Iterable, Literal, Optional, Union
+
+from models import CoordinatorAgentContext
+from instrumentation import context_dump_bytes, context_dump_seconds
+from run_cache import memoize_context_dump
+
+ContextSection = Literal["goals", "fitness_levels", "training_plan"]
+ALL_SECTIONS: tuple[ContextSection, ...] = ("goals", "fitness_levels", "training_plan")
+
+
+def _as_date(value: Union[date, datetime, str, None]) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+
+
+def dumps_compact(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def project_context(
+    context: CoordinatorAgentContext,
+    sections: Optional[Iterable[ContextSection]] = None,
+    start_date: Union[date, datetime, str, None] = None,
+    end_date: Union[date, datetime, str, None] = None,
+    activity: Optional[str] = None,
+) -> dict:
+    """
+    Build a JSON-ready dict with only the requested parts of the context.
+
+    - sections: any of "goals", "fitness_levels", "training_plan" (all of them when empty)
+    - start_date / end_date: inclusive window applied to currentTrainingPlan days
+    - activity: keep only the goals, fitness levels and planned sessions for this activity
+
+    Every list entry carries its "index" in the full context, so JSON Patch paths
+    (e.g. /currentTrainingPlan/<day index>/sessions/<session index>) stay correct after filtering.
+    """
+    wanted = set(sections or ALL_SECTIONS)
+    start, end = _as_date(start_date), _as_date(end_date)
+    projected: dict = {"userId": context.userId}
+
+    if "goals" in wanted:
+        projected["goals"] = [
+            {"index": index, **goal.model_dump(mode="json", exclude_none=True)}
+            for index, goal in enumerate(context.goals)
+            if activity is None or goal.goalActivity == activity
+        ]
+
+    if "fitness_levels" in wanted:
+        projected["activityFitnessLevels"] = [
+            {"index": index, **level.model_dump(mode="json", exclude_none=True)}
+            for index, level in enumerate(context.activityFitnessLevels)
+            if activity is None or level.activity == activity
+        ]
+
+    if "training_plan" in wanted:
+        plan = []
+        for day_index, day in enumerate(context.currentTrainingPlan):
+            day_date = day.date.date()
+            if (start and day_date < start) or (end and day_date > end):
+                continue
+            sessions = [
+                {"index": session_index, **session.model_dump(mode="json", exclude_none=True)}
+                for session_index, session in enumerate(day.sessions)
+                if activity is None or session.activity == activity
+            ]
+            if activity is not None and not sessions:
+                continue
+            plan.append({
+                "index": day_index,
+                "tracking_id": str(day.tracking_id),
+                "date": day.date.isoformat(),
+                "sessions": sessions,
+            })
+        projected["currentTrainingPlan"] = plan
+
+    return projected
+
+
+def dump_context(context: CoordinatorAgentContext, **projection) -> str:
+    """Minified JSON of `project_context(context, **projection)`, memoized for the run until the context changes."""
+    def build() -> str:
+        with context_dump_seconds.time():
+            dumped = dumps_compact(project_context(context, **projection))
+        context_dump_bytes.observe(len(dumped))
+        return dumped
+
+    key = dumps_compact({name: _projection_key(value) for name, value in sorted(projection.items()) if value is not None})
+    return memoize_context_dump(context, key, build)
+
+
+def _projection_key(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(value)
+    return value
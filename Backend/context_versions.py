@@ -0,0 +1,279 @@
+# context_versions.py
+# Per-user serialization and versioning of context mutations.
+# /chat, /submit_workout (through its fitness re-evaluation) and /submit_workouts all run agents that edit the
+# user's context. Runs for the same user now take that user's lock, so they happen one at a time, while different
+# users stay fully parallel. Every committed change bumps the user's version. That one version is the ETag and the
+# chat contextVersion, and the last CONTEXT_VERSION_HISTORY versions are kept in SQLite, so they survive restarts.
+# A client that sends If-Match with an outdated version gets a 412 with the latest context. A client that doesn't,
+# but says which version its context is based on (contextVersion, or the version its conversation last got back),
+# has its context merged with the changes committed since, instead of silently overwriting them. A context that
+# says neither is only accepted if it is the latest one.
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+from models import CoordinatorAgentContext
+
+load_dotenv()
+
+# Users whose versions are kept in memory. Users with a run in flight are never evicted; the rest reload from SQLite.
+CONTEXT_VERSION_MAX_USERS = int(os.environ.get("CONTEXT_VERSION_MAX_USERS", "10000"))
+# Committed versions kept per user, to merge clients that are a few versions behind.
+CONTEXT_VERSION_HISTORY = int(os.environ.get("CONTEXT_VERSION_HISTORY", "16"))
+# Empty keeps the versions in memory only.
+CONTEXT_VERSION_STORE_PATH = os.environ.get("CONTEXT_VERSION_STORE_PATH", "context_versions.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS context_versions (
+    user_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    context TEXT NOT NULL,
+    created_at REAL NOT NULL,         -- unix seconds
+    PRIMARY KEY (user_id, version)
+);
+"""
+
+# List fields merged entry by entry, matched on these keys.
+MERGE_KEYS = {"goals": "id", "activityFitnessLevels": "activity", "currentTrainingPlan": "tracking_id"}
+
+
+class ContextConflict(Exception):
+    def __init__(self, version: int, context: Optional[CoordinatorAgentContext]):
+        super().__init__(f"context changed on the server, the latest version is {version}")
+        self.version = version
+        self.context = context
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    """The version from an If-Match header ('"3"', 'W/"3"' or '3'); None when absent or '*'. ValueError if malformed."""
+    if not header or header.strip() == "*":
+        return None
+    return int(header.strip().removeprefix("W/").strip('"'))
+
+
+def _merge_entries(base: list[dict], ours: list[dict], theirs: list[dict], key: str) -> list[dict]:
+    b, o, t = ({entry[key]: entry for entry in entries} for entries in (base, ours, theirs))
+    merged = []
+    for k in list(o) + [k for k in t if k not in o]:
+        # A missing entry is a deletion, so it merges like any other change.
+        entry = t.get(k) if o.get(k) == b.get(k) else o.get(k)
+        if entry is not None:
+            merged.append(entry)
+    return merged
+
+
+def merge_contexts(base: CoordinatorAgentContext, ours: CoordinatorAgentContext, theirs: CoordinatorAgentContext) -> CoordinatorAgentContext:
+    """
+    Three way merge of two contexts that both started from `base`. Every field (and every goal, fitness level and
+    plan day) takes the side that changed it. When both sides changed the same entry, `ours` wins.
+    """
+    b, o, t = (context.model_dump(mode="json") for context in (base, ours, theirs))
+    merged: dict[str, Any] = {}
+    for name, value in o.items():
+        if value == b[name]:
+            merged[name] = t[name]
+        elif t[name] == b[name]:
+            merged[name] = value
+        elif name in MERGE_KEYS:
+            merged[name] = _merge_entries(b[name], value, t[name], MERGE_KEYS[name])
+        else:
+            merged[name] = value
+    return CoordinatorAgentContext.model_validate(merged)
+
+
+class ContextVersionStore:
+    """SQLite copy of the recent committed contexts per user."""
+
+    def __init__(self, path: str, history: int = CONTEXT_VERSION_HISTORY):
+        self.path = path
+        self.history = history
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_sync(self, userId: str) -> list[tuple[int, str]]:
+        rows = self._connection().execute(
+            "SELECT version, context FROM context_versions WHERE user_id = ? ORDER BY version DESC LIMIT ?",
+            (userId, self.history),
+        ).fetchall()
+        return list(reversed(rows))
+
+    def save_sync(self, userId: str, version: int, context_json: str) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO context_versions (user_id, version, context, created_at) VALUES (?, ?, ?, ?)",
+                (userId, version, context_json, time.time()),
+            )
+            conn.execute("DELETE FROM context_versions WHERE user_id = ? AND version <= ?", (userId, version - self.history))
+
+    async def load(self, userId: str) -> list[tuple[int, str]]:
+        return await asyncio.to_thread(self.load_sync, userId)
+
+    async def save(self, userId: str, version: int, context_json: str) -> None:
+        await asyncio.to_thread(self.save_sync, userId, version, context_json)
+
+
+@dataclass
+class _UserState:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    version: int = 0
+    context_json: Optional[str] = None
+    # version -> context JSON of the recent commits, oldest first.
+    history: OrderedDict[int, str] = field(default_factory=OrderedDict)
+    loaded: bool = False
+    active: int = 0  # runs holding or waiting for the lock
+
+
+@dataclass
+class ContextTransaction:
+    """Handed to the caller while it holds the user's lock."""
+    version: int
+    committed: bool = False
+
+
+class UserContextVersions:
+    def __init__(self, store: Optional[ContextVersionStore] = None, max_users: int = CONTEXT_VERSION_MAX_USERS,
+                 history: int = CONTEXT_VERSION_HISTORY):
+        self.store = store
+        self.max_users = max_users
+        self.history = history
+        self._users: OrderedDict[str, _UserState] = OrderedDict()
+        self.stats = {"runs": 0, "waited": 0, "conflicts": 0, "commits": 0, "merged": 0}
+
+    def _state(self, userId: str) -> _UserState:
+        key = userId.lower()
+        state = self._users.get(key)
+        if state is None:
+            state = self._users[key] = _UserState()
+        self._users.move_to_end(key)
+        return state
+
+    def _evict(self) -> None:
+        for key in list(self._users):
+            if len(self._users) <= self.max_users:
+                break
+            if self._users[key].active == 0:
+                del self._users[key]
+
+    async def load(self, userId: str) -> None:
+        """Read the user's versions from the store, once. The sync methods below only see loaded users."""
+        state = self._state(userId)
+        if state.loaded:
+            return
+        rows = await self.store.load(userId.lower()) if self.store else []
+        if not state.loaded:
+            for version, context_json in rows:
+                if version > state.version:
+                    state.version, state.context_json = version, context_json
+                    state.history[version] = context_json
+            state.loaded = True
+
+    def current_version(self, userId: str) -> int:
+        state = self._users.get(userId.lower())
+        return state.version if state else 0
+
+    def latest_context(self, userId: str) -> Optional[CoordinatorAgentContext]:
+        """A copy of the last committed context, None if this user has no committed run."""
+        state = self._users.get(userId.lower())
+        return CoordinatorAgentContext.model_validate_json(state.context_json) if state and state.context_json else None
+
+    def context_at(self, userId: str, version: int) -> Optional[CoordinatorAgentContext]:
+        """A copy of a recent committed version, None if it is unknown or too old."""
+        state = self._users.get(userId.lower())
+        context_json = state.history.get(version) if state else None
+        return CoordinatorAgentContext.model_validate_json(context_json) if context_json else None
+
+    async def check(self, userId: str, expected_version: Optional[int]) -> None:
+        """Raise ContextConflict if the client's version is outdated. Also usable without the lock, to fail fast."""
+        if expected_version is None:
+            return
+        await self.load(userId)
+        state = self._users.get(userId.lower())
+        if state is not None and state.context_json is not None and expected_version != state.version:
+            self.stats["conflicts"] += 1
+            raise ContextConflict(state.version, CoordinatorAgentContext.model_validate_json(state.context_json))
+
+    def rebase(self, userId: str, context: CoordinatorAgentContext, base_version: Optional[int]) -> CoordinatorAgentContext:
+        """
+        `context` is the client's copy of `base_version`, maybe edited on the device since. Returns it with the changes
+        committed on the server after `base_version` merged in. Raises ContextConflict if that version is too old to
+        merge, or if no base version is known and the context isn't the latest one: it could be based on anything.
+        """
+        state = self._users.get(userId.lower())
+        if state is None or state.context_json is None or base_version == state.version:
+            return context
+        base = self.context_at(userId, base_version) if base_version is not None else None
+        if base is None and base_version is None and context.model_dump_json() == state.context_json:
+            return context
+        if base is None:
+            self.stats["conflicts"] += 1
+            raise ContextConflict(state.version, CoordinatorAgentContext.model_validate_json(state.context_json))
+        self.stats["merged"] += 1
+        return merge_contexts(base, context, CoordinatorAgentContext.model_validate_json(state.context_json))
+
+    async def check_rebase(self, userId: str, context: CoordinatorAgentContext, base_version: Optional[int]) -> None:
+        """Raise ContextConflict if `context` couldn't be rebased right now. Usable without the lock, to fail fast."""
+        await self.load(userId)
+        self.rebase(userId, context, base_version)
+
+    @asynccontextmanager
+    async def mutation(self, userId: str, expected_version: Optional[int] = None) -> AsyncIterator[ContextTransaction]:
+        """
+        Hold the user's lock for one mutating run. Raises ContextConflict if `expected_version` is given and
+        isn't the latest. Call commit() with the resulting context before leaving the block.
+        """
+        state = self._state(userId)
+        state.active += 1
+        if state.lock.locked():
+            self.stats["waited"] += 1
+        try:
+            async with state.lock:
+                await self.check(userId, expected_version)
+                await self.load(userId)
+                transaction = ContextTransaction(version=state.version)
+                self.stats["runs"] += 1
+                yield transaction
+        finally:
+            state.active -= 1
+            self._evict()
+
+    async def commit(self, userId: str, transaction: ContextTransaction, context: CoordinatorAgentContext) -> int:
+        """Record `context` as the user's latest. The version only moves when the context actually changed."""
+        state = self._state(userId)
+        context_json = context.model_dump_json()
+        if context_json != state.context_json:
+            version = state.version + 1
+            if self.store is not None:
+                await self.store.save(userId.lower(), version, context_json)
+            state.version, state.context_json = version, context_json
+            state.history[version] = context_json
+            while len(state.history) > self.history:
+                state.history.popitem(last=False)
+            self.stats["commits"] += 1
+        transaction.version = state.version
+        transaction.committed = True
+        return state.version
+
+
+user_contexts = UserContextVersions(store=ContextVersionStore(CONTEXT_VERSION_STORE_PATH) if CONTEXT_VERSION_STORE_PATH else None)
@@ -1,8 +1,10 @@
 ### PACKAGES 
 from __future__ import annotations as _annotations
+import asyncio
+import json
 from dotenv import load_dotenv
-from uuid import uuid4 
-from datetime import datetime, timezone
+from uuid import UUID, uuid4 
+from datetime import datetime, timezone, timedelta
 from openai.types.shared import Reasoning
 from agents import (
     Agent,
@@ -22,332 +24,47 @@ from agents import (
 
 ### FILE IMPORTS
 from models import CoordinatorAgentContext, UserDefinedGoal
-from planned_workouts_model import DailyWorkoutDTO, AnyWorkoutSessionDTO, ClimbingWorkoutDTO, RunningWorkoutDTO
-from memory_management import search_workout_memories, search_workout_documents
+from planned_workouts_model import ActivityTypeEnum, DailyWorkoutDTO, AnyWorkoutSessionDTO, ClimbingWorkoutDTO, RunningWorkoutDTO
+from memory_management import search_workout_history as search_memory_history
+from workout_store import workout_store
+from training_analytics import running_analytics, climbing_analytics
+from context_patch import apply_context_patch
+from context_projection import ContextSection, dump_context
+from plan_index import PlanIndexError, plan_index
+from plan_generator import CLIMBING_WEEKLY_CLIMBS, climbing_plan, plan_weeks, running_plan
+from instrumentation import metrics_hooks
+from run_cache import mark_context_changed, memoize_search
+from agent_models import TieredModel, max_turns_for, model_settings_for
 
 load_dotenv() # This explicitly loads the .env file, which contains the API keys. 
 
-context_format = """
-{
-  "$defs": {
-    "ActivityTypeEnum": {
-      "enum": [
-        "climbing",
-        "running"
-      ],
-      "title": "ActivityTypeEnum",
-      "type": "string"
-    },
-    "AnyWorkoutSessionDTO": {
-      "description": "Swift:\n  enum AnyWorkoutSessionDTO: Codable {\n      case running(RunningWorkoutDTO)\n      case climbing(ClimbingWorkoutDTO)\n\n      var activity: ActivityTypeEnum { ... }\n      var sessionDescription: String { get set }\n  }\n\nJSON shape is just the underlying DTO with an \"activity\" discriminator:\n  { \"activity\": \"running\", ... }\n  { \"activity\": \"climbing\", ... }",
-      "discriminator": {
-        "mapping": {
-          "climbing": "#/$defs/ClimbingWorkoutDTO",
-          "running": "#/$defs/RunningWorkoutDTO"
-        },
-        "propertyName": "activity"
-      },
-      "oneOf": [
-        {
-          "$ref": "#/$defs/RunningWorkoutDTO"
-        },
-        {
-          "$ref": "#/$defs/ClimbingWorkoutDTO"
-        }
-      ],
-      "title": "AnyWorkoutSessionDTO"
-    },
-    "ClimbRouteDTO": {
-      "description": "Swift:\n  struct ClimbRouteDTO: Codable {\n      var id = UUID()\n      var gradeValue: GradeValue\n      var shortDescription: String\n  }",
-      "properties": {
-        "id": {
-          "format": "uuid",
-          "title": "Id",
-          "type": "string"
-        },
-        "gradeValue": {
-          "$ref": "#/$defs/GradeValueModel"
-        },
-        "shortDescription": {
-          "title": "Shortdescription",
-          "type": "string"
-        }
-      },
-      "required": [
-        "gradeValue",
-        "shortDescription"
-      ],
-      "title": "ClimbRouteDTO",
-      "type": "object"
-    },
-    "ClimbingWorkoutDTO": {
-      "description": "Swift:\n  struct ClimbingWorkoutDTO: WorkoutSessionDTO {\n      var sessionDescription: String\n      var activity: ActivityTypeEnum = .climbing\n      var routes: [ClimbRouteDTO] = []\n  }",
-      "properties": {
-        "sessionDescription": {
-          "title": "Sessiondescription",
-          "type": "string"
-        },
-        "activity": {
-          "const": "climbing",
-          "default": "climbing",
-          "title": "Activity",
-          "type": "string"
-        },
-        "routes": {
-          "items": {
-            "$ref": "#/$defs/ClimbRouteDTO"
-          },
-          "title": "Routes",
-          "type": "array"
-        }
-      },
-      "required": [
-        "sessionDescription"
-      ],
-      "title": "ClimbingWorkoutDTO",
-      "type": "object"
-    },
-    "DailyWorkoutDTO": {
-      "description": "Swift:\n  struct DailyWorkoutDTO: Codable {\n      var tracking_id: UUID\n      var date: Date\n      var sessions: [AnyWorkoutSessionDTO]\n  }\n\nPython side stores `date` as `datetime`, but accepts:\n  - Apple reference seconds (Double)\n  - ISO 8601 string\n  - datetime",
-      "properties": {
-        "tracking_id": {
-          "format": "uuid",
-          "title": "Tracking Id",
-          "type": "string"
-        },
-        "date": {
-          "format": "date-time",
-          "title": "Date",
-          "type": "string"
-        },
-        "sessions": {
-          "items": {
-            "$ref": "#/$defs/AnyWorkoutSessionDTO"
-          },
-          "title": "Sessions",
-          "type": "array"
-        }
-      },
-      "required": [
-        "tracking_id",
-        "date",
-        "sessions"
-      ],
-      "title": "DailyWorkoutDTO",
-      "type": "object"
-    },
-    "FitnessLevel": {
-      "properties": {
-        "activity": {
-          "$ref": "#/$defs/ActivityTypeEnum"
-        },
-        "userDefinedFitnessLevel": {
-          "anyOf": [
-            {
-              "type": "string"
-            },
-            {
-              "type": "null"
-            }
-          ],
-          "default": null,
-          "title": "Userdefinedfitnesslevel"
-        },
-        "userDefinedFitnessLevelUpdatedDate": {
-          "anyOf": [
-            {
-              "format": "date-time",
-              "type": "string"
-            },
-            {
-              "type": "null"
-            }
-          ],
-          "default": null,
-          "title": "Userdefinedfitnesslevelupdateddate"
-        },
-        "agentDefinedFitnessLevel": {
-          "anyOf": [
-            {
-              "type": "string"
-            },
-            {
-              "type": "null"
-            }
-          ],
-          "default": null,
-          "title": "Agentdefinedfitnesslevel"
-        },
-        "agentFitnessLevelUpdatedDate": {
-          "anyOf": [
-            {
-              "format": "date-time",
-              "type": "string"
-            },
-            {
-              "type": "null"
-            }
-          ],
-          "default": null,
-          "title": "Agentfitnesslevelupdateddate"
-        }
-      },
-      "required": [
-        "activity"
-      ],
-      "title": "FitnessLevel",
-      "type": "object"
-    },
-    "GradeValueModel": {
-      "description": "Wire/object form matching Swift:\n{\n  \"scale\": \"yds\" | \"v\",\n  \"value\": \"5.10a\" | \"V7\"\n}\n\nAlso accepts a plain string \"V7\" or \"5.10a\" in requests (will infer scale).",
-      "properties": {
-        "scale": {
-          "enum": [
-            "yds",
-            "v"
-          ],
-          "title": "Scale",
-          "type": "string"
-        },
-        "value": {
-          "title": "Value",
-          "type": "string"
-        }
-      },
-      "required": [
-        "scale",
-        "value"
-      ],
-      "title": "GradeValueModel",
-      "type": "object"
-    },
-    "RunningWorkoutDTO": {
-      "description": "Swift:\n  struct RunningWorkoutDTO: WorkoutSessionDTO {\n      var sessionDescription: String\n      var activity: ActivityTypeEnum = .running\n\n      var distanceKm: Double\n      var heartRate: Int\n      var elevationGain: Int\n      var paceMinPerKm: TimeInterval  // seconds per km\n  }",
-      "properties": {
-        "sessionDescription": {
-          "title": "Sessiondescription",
-          "type": "string"
-        },
-        "activity": {
-          "const": "running",
-          "default": "running",
-          "title": "Activity",
-          "type": "string"
-        },
-        "distanceKm": {
-          "title": "Distancekm",
-          "type": "number"
-        },
-        "heartRate": {
-          "title": "Heartrate",
-          "type": "integer"
-        },
-        "elevationGain": {
-          "title": "Elevationgain",
-          "type": "integer"
-        },
-        "paceMinPerKm": {
-          "title": "Paceminperkm",
-          "type": "number"
-        }
-      },
-      "required": [
-        "sessionDescription",
-        "distanceKm",
-        "heartRate",
-        "elevationGain",
-        "paceMinPerKm"
-      ],
-      "title": "RunningWorkoutDTO",
-      "type": "object"
-    },
-    "UserDefinedGoal": {
-      "properties": {
-        "id": {
-          "format": "uuid",
-          "title": "Id",
-          "type": "string"
-        },
-        "goalActivity": {
-          "$ref": "#/$defs/ActivityTypeEnum"
-        },
-        "title": {
-          "title": "Title",
-          "type": "string"
-        },
-        "description": {
-          "title": "Description",
-          "type": "string"
-        },
-        "goalDeadline": {
-          "format": "date-time",
-          "title": "Goaldeadline",
-          "type": "string"
-        },
-        "isCompleted": {
-          "title": "Iscompleted",
-          "type": "boolean"
-        }
-      },
-      "required": [
-        "id",
-        "goalActivity",
-        "title",
-        "description",
-        "goalDeadline",
-        "isCompleted"
-      ],
-      "title": "UserDefinedGoal",
-      "type": "object"
-    }
-  },
-  "properties": {
-    "userId": {
-      "title": "Userid",
-      "type": "string"
-    },
-    "goals": {
-      "items": {
-        "$ref": "#/$defs/UserDefinedGoal"
-      },
-      "title": "Goals",
-      "type": "array"
-    },
-    "currentTrainingPlan": {
-      "items": {
-        "$ref": "#/$defs/DailyWorkoutDTO"
-      },
-      "title": "Currenttrainingplan",
-      "type": "array"
-    },
-    "activityFitnessLevels": {
-      "items": {
-        "$ref": "#/$defs/FitnessLevel"
-      },
-      "title": "Activityfitnesslevels",
-      "type": "array"
-    }
-  },
-  "required": [
-    "userId",
-    "goals",
-    "currentTrainingPlan",
-    "activityFitnessLevels"
-  ],
-  "title": "CoordinatorAgentContext",
-  "type": "object"
-}
-"""
+# Built once from the Pydantic model and minified, so the instructions that embed it are byte-identical
+# on every request (and always match the real schema). A stable prefix is what provider side prompt caching keys on.
+context_format = json.dumps(CoordinatorAgentContext.model_json_schema(), separators=(",", ":"), sort_keys=True)
+
+def with_request_details(static_instructions: str):
+    """
+    Agent instructions = the static text (cacheable prefix) + today's date and the user id as a small per-request suffix.
+    Anything that changes between requests must go in the suffix, never in the static text.
+    """
+    def instructions(run_context: RunContextWrapper[CoordinatorAgentContext], agent: Agent[CoordinatorAgentContext]) -> str:
+        return f"{static_instructions}\nToday's date is {datetime.now(timezone.utc).date().isoformat()}. The user's id is {run_context.context.userId}."
+    return instructions
 
 
 ### TOOLS 
+def _dump_day(context: CoordinatorAgentContext, day: DailyWorkoutDTO) -> str:
+    """The changed plan day only, instead of the whole plan."""
+    return dump_context(context, sections=["training_plan"], start_date=day.date, end_date=day.date)
+
+
 @function_tool 
 async def create_climbing_workout(context: RunContextWrapper[CoordinatorAgentContext], 
                                   climbing_workout_json: str,
-                                  date: datetime) -> None:
+                                  date: datetime) -> str:
     """
-    A tool that accepts a DailyWorkoutDTO object representing a single DailyWorkout,
-    and creates a new DailyWorkout, and then appends it to the currentTrainingPlan in the coordinator context.
+    A tool that accepts a single climbing session, and adds it to the training plan on the given date.
+    If the plan has no day for that date yet, the day is created in date order.
     Args:
         climbing_workout_json: The single climbing workout as a JSON string. For example:
         {
@@ -375,39 +92,35 @@ async def create_climbing_workout(context: RunContextWrapper[CoordinatorAgentCon
         date: The date of the climbing workout.
 
     """
-    new_climbing_workout = AnyWorkoutSessionDTO.model_validate_json(climbing_workout_json)
-    #Incomplete
+    try:
+        new_climbing_workout = AnyWorkoutSessionDTO.model_validate_json(climbing_workout_json)
+        if new_climbing_workout.activity != "climbing":
+            return "error: failed to create climbing workout - the session is not a climbing session"
+        day = plan_index(context.context).insert(new_climbing_workout, date)
+        mark_context_changed(context.context)
+        return _dump_day(context.context, day)
+
+    except Exception as e:
+        print(f"error: failed to create climbing workout - {e}")
+        return f"error: failed to create climbing workout - {e}"
 
 
 
 @function_tool
-async def create_workout(context: RunContextWrapper[CoordinatorAgentContext], new_workout_json: str) -> str:
+async def create_workout(context: RunContextWrapper[CoordinatorAgentContext], new_workout_json: str, date: datetime | None = None) -> str:
     """
-    A tool that accepts a JSON string representing a single DailyWorkout,
-    and creates a new DailyWorkout, and then appends it to the currentTrainingPlan in the coordinator context.
+    A tool that accepts a JSON string representing a single running or climbing session,
+    and adds it to the training plan on the given date (the day is created in date order if it doesn't exist yet).
+    Returns that day of the plan, with the new session's id. Session ids stay the same across messages until the session is edited or moved; after that, get its new id with get_context.
     Args:
-        updated_goal_json: The single updates goal.
+        new_workout_json: The single session, e.g. {"activity": "running", "sessionDescription": "Easy zone 2", "distanceKm": 8, "heartRate": 140, "elevationGain": 50, "paceMinPerKm": 360}
+        date: The day the session is planned for. Defaults to today.
     """
     try:
-        # Parse incoming JSON into a PlannedWorkout
         new_workout = AnyWorkoutSessionDTO.model_validate_json(new_workout_json)
-        
-        plan = context.context.currentTrainingPlan
-        print(plan)
-        # If there's no training plan at all or it's empty, create the first day
-        if not plan:
-            first_day = DailyWorkoutDTO(
-                tracking_id=uuid4(),
-                sessions=[new_workout],
-                date=datetime.now(timezone.utc),
-            )
-            context.context.currentTrainingPlan = [first_day]
-        else:
-            # Append to the first existing day by default
-            plan[0].sessions.append(new_workout)
-
-        # Return the updated coordinator context as JSON for LLM consumption
-        return context.context.model_dump_json(indent=1)
+        day = plan_index(context.context).insert(new_workout, date or datetime.now(timezone.utc))
+        mark_context_changed(context.context)
+        return _dump_day(context.context, day)
 
     except Exception as e:
         # Return a simple error string so the LLM/toolchain can reason about failure
@@ -417,90 +130,128 @@ async def create_workout(context: RunContextWrapper[CoordinatorAgentContext], ne
 @function_tool
 async def update_workout(context: RunContextWrapper[CoordinatorAgentContext], updated_workout_json: str) -> str:
     """
-    A tool that accepts a JSON string representing a single PlannedWorkout,
-    updates the matching PlannedWorkout in the coordinator context (by id) or
-    appends it to the first day if not found, and returns the updated
-    CoordinatorAgentContext as JSON.
+    A tool that accepts a JSON string representing a single planned session, and replaces the planned
+    session with the same id. Returns the day of the plan it is on. Session ids stay the same across messages until the session is edited or moved; after that, get its new id with get_context.
     Args:
-        updated_workout_json: The single updated planned workout.
+        updated_workout_json: The single updated planned session, with the "id" of the session it replaces.
         Remember that the JSON string will either be for a running workout or a climbing workout which will look like one of these: 
         {
-            "climbing" : {
-              "id" : "556753E8-3E2A-4716-945D-65E77DA47398",
-              "routes" : [
+            "id" : "556753E8-3E2A-4716-945D-65E77DA47398",
+            "activity" : "climbing",
+            "sessionDescription" : "Focus on a solid warm up followed by a few limit bouldering problems. This could be tricky but you should be able to flash 12a on the first go. Cool down with a face climb.",
+            "routes" : [
                 {
                   "id" : "E0CADBCF-B500-4902-AA00-D1BFB8ED80A8",
-                  "shortDescription" : "Warm-up circuit – focus on smooth footwork. Then do some more super nails routes and go for the send",
-                  "grade" : "5.10a"
-                },
-                {
-                  "id" : "A32FE64B-24AE-482A-B347-1E9CEF8D2D1C",
-                  "shortDescription" : "Compression boulder with big slopers",
-                  "grade" : "5.11b"
+                  "shortDescription" : "Warm-up circuit – focus on smooth footwork.",
+                  "gradeValue" : {"scale": "yds", "value": "5.10a"}
                 },
                 {
                   "id" : "3C3E8AAE-6A14-40FE-9316-EEB418BBF50A",
                   "shortDescription" : "Steep overhangs and power endurance",
-                  "grade" : "V5"
-                },
-                {
-                  "id" : "498678E1-C5F9-48D2-A490-BCEAA324197C",
-                  "shortDescription" : "Crimpy face climb to cool down",
-                  "grade" : "V4"
+                  "gradeValue" : {"scale": "v", "value": "V5"}
                 }
-              ],
-              "sessionDescription" : "Focus on a solid warm up followed by a few limit bouldering problems. This could be tricky but you should be able to flash 12a on the first go. Cool down with a face climb."
-            }
+            ]
         }
         OR
         {
-            "running" : {
-              "distanceKm" : 24,
-              "id" : "B11290D6-B41B-40BA-AA99-C8B59F025D59", // UUID
-              "heartRate" : 123, // BPM
-              "sessionDescription" : "Aim for a long zone 2 run, you should be kinda fast by now.",
-              "elevationGain" : 50, // in meters
-              "paceMinPerKm" : 400 // in seconds per km
-            }
+            "id" : "B11290D6-B41B-40BA-AA99-C8B59F025D59", // UUID
+            "activity" : "running",
+            "distanceKm" : 24,
+            "heartRate" : 123, // BPM
+            "sessionDescription" : "Aim for a long zone 2 run, you should be kinda fast by now.",
+            "elevationGain" : 50, // in meters
+            "paceMinPerKm" : 400 // in seconds per km
         }
     """
     try:
-        # parse incoming JSON into a PlannedWorkout
+        # parse incoming JSON into a planned session
         updated_workout = AnyWorkoutSessionDTO.model_validate_json(updated_workout_json)
+        day = plan_index(context.context).update(updated_workout)
+        mark_context_changed(context.context)
+        return _dump_day(context.context, day)
 
-        # find existing PlannedWorkout by id inside each DailyWorkout.workouts and update
-        found = False
-        for day in context.context.currentTrainingPlan:
-            for idx, pw in enumerate(day.sessions):
-                if pw.id == updated_workout.tracking_id:
-                    # replace the PlannedWorkout inside the day's workouts list
-                    day.sessions[idx] = updated_workout
-                    found = True
-                    break
-            if found:
-                break
+    except PlanIndexError as e:
+        return f"error: failed to update workouts - {e}, use create_workout for new sessions"
+    except Exception as e:
+        # return a simple error string so the LLM/toolchain can reason about failure
+        return f"error: failed to update workouts - {e}"
 
-        # if not found, append to the first day (or return an error if no days exist)
-        if not found:
-            if context.context.currentTrainingPlan:
-                context.context.currentTrainingPlan[0].sessions.append(updated_workout)
-            else:
-                return "error: no training plan present to append workout"
 
-        # return the updated coordinator context as JSON for LLM consumption
-        return context.context.model_dump_json(indent=1)
+@function_tool
+async def move_workout(context: RunContextWrapper[CoordinatorAgentContext], session_id: UUID, date: datetime) -> str:
+    """
+    A tool that moves a planned session to another day. A day left without sessions is removed from the plan.
+    Session ids stay the same across messages until the session is edited or moved; after that, get its new id with get_context.
+    Args:
+        session_id: The id of the planned session.
+        date: The day to move it to.
+    """
+    try:
+        day = plan_index(context.context).move(session_id, date)
+        mark_context_changed(context.context)
+        return _dump_day(context.context, day)
 
     except Exception as e:
-        # return a simple error string so the LLM/toolchain can reason about failure
-        return f"error: failed to update workouts - {e}"
+        return f"error: failed to move workout - {e}"
 
 
 @function_tool
-async def get_context(context: RunContextWrapper[CoordinatorAgentContext]) -> str:
+async def delete_workout(context: RunContextWrapper[CoordinatorAgentContext], session_id: UUID) -> str:
     """
-    A tool that retrieves the user's current goals and training plan.
+    A tool that removes a planned session from the training plan. A day left without sessions is removed too.
+    Session ids stay the same across messages until the session is edited or moved; after that, get its new id with get_context.
+    Args:
+        session_id: The id of the planned session.
     """
-    return context.context.model_dump_json(indent=1)
+    try:
+        session = plan_index(context.context).delete(session_id)
+        mark_context_changed(context.context)
+        return f"deleted {session.activity} session {session_id}"
+
+    except Exception as e:
+        return f"error: failed to delete workout - {e}"
+
+
+@function_tool
+async def get_context(context: RunContextWrapper[CoordinatorAgentContext],
+                      sections: list[ContextSection] | None = None,
+                      start_date: datetime | None = None,
+                      end_date: datetime | None = None) -> str:
+    """
+    A tool that retrieves the user's current goals, fitness levels and training plan as compact JSON.
+    Only ask for what you need: the training plan can be long.
+    Args:
+        sections: Which parts to return, any of "goals", "fitness_levels", "training_plan". Leave empty for all of them.
+        start_date: Only return training plan days on or after this date.
+        end_date: Only return training plan days on or before this date.
+    Every goal, fitness level, plan day and session has an "index", which is its position for patch_context paths.
+    """
+    return dump_context(context.context, sections=sections, start_date=start_date, end_date=end_date)
+
+
+def _activity_context_tool(activity: str):
+    """get_context for a coach: same tool, but only that coach's activity is returned."""
+
+    @function_tool(name_override="get_context")
+    async def get_activity_context(context: RunContextWrapper[CoordinatorAgentContext],
+                                   sections: list[ContextSection] | None = None,
+                                   start_date: datetime | None = None,
+                                   end_date: datetime | None = None) -> str:
+        """
+        A tool that retrieves the user's goals, fitness level and planned sessions for your activity as compact JSON.
+        Only ask for what you need: the training plan can be long.
+        Args:
+            sections: Which parts to return, any of "goals", "fitness_levels", "training_plan". Leave empty for all of them.
+            start_date: Only return training plan days on or after this date.
+            end_date: Only return training plan days on or before this date.
+        Every goal, fitness level, plan day and session has an "index", which is its position for patch_context paths.
+        """
+        return dump_context(context.context, sections=sections, start_date=start_date, end_date=end_date, activity=activity)
+
+    return get_activity_context
+
+get_running_context = _activity_context_tool("running")
+get_climbing_context = _activity_context_tool("climbing")
 
 
 
@@ -529,9 +280,10 @@ async def update_goal(context: RunContextWrapper[CoordinatorAgentContext], updat
 
         if not found:
             context.context.goals.append(updated_goal)
+        mark_context_changed(context.context)
 
         # return the updated coordinator context as JSON for LLM consumption
-        return context.context.model_dump_json(indent=1)
+        return dump_context(context.context)
 
     except Exception as e:
         # return a simple error string so the LLM/toolchain can reason about failure
@@ -553,8 +305,10 @@ async def update_context(context: RunContextWrapper[CoordinatorAgentContext], ne
 
         # return the updated coordinator context as JSON for LLM consumption
         # mutate wrapper.context in place
-        for field, value in new_context.model_dump().items():
-            setattr(context.context, field, value)
+        # assign the validated attributes: model_dump() values would turn goals and plan days into plain dicts
+        for field in type(new_context).model_fields:
+            setattr(context.context, field, getattr(new_context, field))
+        mark_context_changed(context.context)
         print("context.context inside the update_context tool:")
         print(context.context)
         return "Successfully updated context."
@@ -563,8 +317,38 @@ async def update_context(context: RunContextWrapper[CoordinatorAgentContext], ne
         # return a simple error string so the LLM/toolchain can reason about failure
         return f"error: failed to update context - {e}"
 
+@function_tool
+async def patch_context(context: RunContextWrapper[CoordinatorAgentContext], patch_json: str) -> str:
+    """
+    A tool that applies a JSON Patch (RFC 6902) to the CoordinatorAgentContext. Use this for every edit instead of
+    re-sending the whole context. The operations are applied all-or-nothing: if one fails or the result is not a
+    valid context, nothing is changed and you get an error back. Never change the field called userDefinedFitnessLevel.
+    Args:
+        patch_json: A JSON list of operations. Each has "op" ("add", "remove", "replace", "move", "copy" or "test"),
+        a "path" (a JSON Pointer such as "/goals/0/title" or "/currentTrainingPlan/-" to append) and a "value" for add/replace/test
+        or a "from" path for move/copy. For example:
+        [
+            {"op": "replace", "path": "/activityFitnessLevels/0/agentDefinedFitnessLevel", "value": "Intermediate, 5k in 24 min"},
+            {"op": "add", "path": "/currentTrainingPlan/2/sessions/-", "value": {"activity": "running", "sessionDescription": "Easy zone 2", "distanceKm": 8, "heartRate": 140, "elevationGain": 50, "paceMinPerKm": 360}}
+        ]
+    Returns:
+        A JSON object listing the changed paths, or an error message.
+    """
+    print("Patch Context Tool Called")
+    print(patch_json)
+    try:
+        operations = json.loads(patch_json)
+        if isinstance(operations, dict):
+            operations = [operations]
+        changed = apply_context_patch(context.context, operations)
+        return json.dumps({"changed": changed}, separators=(",", ":"))
+
+    except Exception as e:
+        # return a simple error string so the LLM/toolchain can reason about failure
+        return f"error: failed to patch context - {e}"
+
 @function_tool 
-async def search_workout_history(userId: str, query: str, activity: str, limit: int) -> str: 
+async def search_workout_history(context: RunContextWrapper[CoordinatorAgentContext], userId: str, query: str, activity: str, limit: int) -> str: 
     """
     A tool that searches the users workout history based on your input parameters. 
     Args: 
@@ -573,42 +357,238 @@ async def search_workout_history(userId: str, query: str, activity: str, limit:
     activity: The activity type you're searching for (your specialty as a coach).
     limit: The maximum number of returned workout results you want.
     Returns:
-        A JSON string representing the search results from the user's workout history. Note that the avgPacePerKm
+        A JSON list of the matching workouts from the user's workout history, most relevant first. Note that the avgPacePerKm
         field is in minutes per kilometer format (e.g., 4.5 means 4 minutes and 30 seconds per kilometer).
     """
     print("Coach Query: ", query, activity, "userId: ", userId)
-    workout_documents = search_workout_documents(userId=userId, query=query, activity=activity, limit=limit)
-    workout_memories = search_workout_memories(userId=userId, query=query, activity=activity, limit=limit)
-    workout_history = "---Documents---\n" + workout_documents + "---Memories---\n" + workout_memories
-    return workout_history
+    workout_history = await memoize_search(
+        context.context,
+        ("search_workout_history", userId.lower(), activity, " ".join(query.lower().split()), limit),
+        lambda: search_memory_history(userId=userId, query=query, activity=activity, limit=limit),
+    )
+    return json.dumps(workout_history, separators=(",", ":"), ensure_ascii=False)
+
+@function_tool
+async def get_training_analytics(context: RunContextWrapper[CoordinatorAgentContext], activity: ActivityTypeEnum, weeks: int = 12) -> str:
+    """
+    A tool that computes exact training load numbers from the user's completed workout history. Use this instead of
+    adding up numbers from search_workout_history yourself.
+    Args:
+        activity: "running" or "climbing" (your specialty as a coach).
+        weeks: How many recent weeks to break down week by week.
+    Returns:
+        Compact JSON. Running: weekly km / elevation / runs / distance weighted pace (minutes per km), trends per week,
+        acute:chronic workload ratio (7 day vs 28 day average km, above ~1.5 means a risky spike) and km per HR zone.
+        Climbing: weekly sessions / routes / sends, send rate, acute:chronic ratio of routes climbed and a grade pyramid per scale.
+    """
+    # The weekly breakdown plus the 28 day chronic window before it.
+    since = datetime.now(timezone.utc) - timedelta(weeks=weeks, days=28)
+    workouts = await memoize_search(
+        context.context,
+        ("training_analytics", activity, weeks),
+        lambda: workout_store.query(context.context.userId, activity, start_date=since),
+    )
+    if activity == "running":
+        analytics = running_analytics(workouts, weeks=weeks)
+    else:
+        analytics = climbing_analytics(workouts, weeks=weeks)
+    return json.dumps(analytics, separators=(",", ":"))
+
+@function_tool
+async def query_workout_log(context: RunContextWrapper[CoordinatorAgentContext],
+                            activity: ActivityTypeEnum,
+                            start_date: datetime | None = None,
+                            end_date: datetime | None = None,
+                            last_n: int | None = None,
+                            min_distance_km: float | None = None,
+                            max_distance_km: float | None = None,
+                            min_pace_min_per_km: float | None = None,
+                            max_pace_min_per_km: float | None = None,
+                            min_grade: str | None = None,
+                            max_grade: str | None = None) -> str:
+    """
+    A tool that looks up the user's completed workouts exactly, newest first. Use it for questions like
+    "my last 10 runs", "runs longer than 15 km since March" or "climbing sessions where I sent V5 or harder".
+    Use search_workout_history instead for fuzzy questions about how workouts felt.
+    Args:
+        activity: "running" or "climbing".
+        start_date: Only workouts on or after this date.
+        end_date: Only workouts on or before this date.
+        last_n: Return at most this many workouts.
+        min_distance_km: Running only, minimum distance.
+        max_distance_km: Running only, maximum distance.
+        min_pace_min_per_km: Running only, minimum average pace in minutes per km (e.g. 4.5). Bigger numbers are slower.
+        max_pace_min_per_km: Running only, maximum average pace in minutes per km.
+        min_grade: Climbing only, the hardest sent route must be at least this grade (e.g. "V5" or "5.11a").
+        max_grade: Climbing only, the hardest sent route must be at most this grade.
+    """
+    try:
+        filters = dict(
+            start_date=start_date, end_date=end_date, limit=last_n,
+            min_distance_km=min_distance_km, max_distance_km=max_distance_km,
+            min_pace_min_per_km=min_pace_min_per_km, max_pace_min_per_km=max_pace_min_per_km,
+            min_grade=min_grade, max_grade=max_grade,
+        )
+        workouts = await memoize_search(
+            context.context,
+            ("query_workout_log", activity) + tuple(sorted((k, str(v)) for k, v in filters.items())),
+            lambda: workout_store.query(context.context.userId, activity, **filters),
+        )
+        return json.dumps([w.model_dump(mode="json") for w in workouts], separators=(",", ":"))
+
+    except Exception as e:
+        # return a simple error string so the LLM/toolchain can reason about failure
+        return f"error: failed to query workouts - {e}"
+
+# Weekly km to start a running plan from when the user has no recent runs, by the word their fitness level uses.
+STARTING_WEEKLY_KM = {"beginner": 15.0, "intermediate": 30.0, "advanced": 50.0}
+
+async def _running_defaults(context: CoordinatorAgentContext) -> dict:
+    """Weekly km, easy pace (seconds per km) and max HR from the last 4 weeks of runs, or from the fitness level."""
+    since = datetime.now(timezone.utc) - timedelta(days=28)
+    workouts = await workout_store.query(context.userId, "running", start_date=since)
+    if workouts:
+        analytics = running_analytics(workouts, weeks=4)
+        paces = [week["avg_pace_min_per_km"] for week in analytics["weeks"] if week["avg_pace_min_per_km"]]
+        defaults = {"weekly_km": max(sum(week["km"] for week in analytics["weeks"]) / 4, 10.0)}
+        if paces:
+            # Average pace includes the hard runs, easy runs are a bit slower.
+            defaults["easy_pace_sec_per_km"] = sum(paces) / len(paces) * 60 * 1.05
+        if analytics["hr_zones"]:
+            defaults["max_hr"] = analytics["hr_zones"]["max_hr_used"]
+        return defaults
+    level = next((f for f in context.activityFitnessLevels if f.activity == "running"), None)
+    text = " ".join(filter(None, [level.agentDefinedFitnessLevel, level.userDefinedFitnessLevel])).lower() if level else ""
+    return {"weekly_km": next((km for word, km in STARTING_WEEKLY_KM.items() if word in text), 25.0)}
+
+@function_tool
+async def generate_training_plan(context: RunContextWrapper[CoordinatorAgentContext],
+                                 activity: ActivityTypeEnum,
+                                 sessions_per_week: int,
+                                 goal_id: UUID | None = None,
+                                 deadline: datetime | None = None,
+                                 start_date: datetime | None = None,
+                                 weekly_km: float | None = None,
+                                 easy_pace_sec_per_km: float | None = None,
+                                 max_hr: int | None = None,
+                                 race_distance_km: float | None = None,
+                                 project_grade: str | None = None,
+                                 replace_existing: bool = False) -> str:
+    """
+    A tool that builds a whole periodized training plan (base, build, peak and taper blocks with recovery weeks)
+    up to a goal's deadline and adds it to the training plan. Use it for multi-week plans instead of creating
+    sessions one by one. Returns a week by week summary; use get_context to see the sessions, and update_workout to change one.
+    Args:
+        activity: "running" or "climbing".
+        sessions_per_week: Sessions per week, 1-7.
+        goal_id: The goal the plan is for, its goalDeadline ends the plan. Defaults to the next open goal for the activity.
+        deadline: End of the plan if there is no goal for it.
+        start_date: First day of the plan. Defaults to tomorrow.
+        weekly_km: Running only, the starting weekly distance. Defaults to the last 4 weeks of running, or the fitness level.
+        easy_pace_sec_per_km: Running only, easy pace in seconds per km (e.g. 360 for 6:00/km). Defaults to the user's recent pace.
+        max_hr: Running only, the user's max heart rate. Defaults to an estimate from their runs, or 190.
+        race_distance_km: Running only, if the goal is a race of this distance it is planned on the deadline.
+        project_grade: Climbing only, the grade the user is working towards, e.g. "V6" or "5.12a". Required for climbing.
+        replace_existing: Always pass it. true removes the activity's sessions already planned between the start and the
+            deadline first, false keeps them next to the new plan. Only replace them when the user asked for a new plan.
+    """
+    try:
+        ctx = context.context
+        goal = None
+        if goal_id is not None:
+            goal = next((g for g in ctx.goals if g.id == goal_id), None)
+            if goal is None:
+                return f"error: failed to generate training plan - no goal with id {goal_id}"
+        elif deadline is None:
+            now = datetime.now(timezone.utc)
+            open_goals = [g for g in ctx.goals if g.goalActivity == activity and not g.isCompleted and g.goalDeadline > now]
+            goal = min(open_goals, key=lambda g: g.goalDeadline, default=None)
+        end = (goal.goalDeadline if goal else deadline)
+        if end is None:
+            return "error: failed to generate training plan - no open goal for this activity, pass a deadline"
+        start = (start_date or datetime.now(timezone.utc) + timedelta(days=1)).date()
+
+        if activity == "running":
+            settings = await _running_defaults(ctx)
+            settings.update({k: v for k, v in dict(weekly_km=weekly_km, easy_pace_sec_per_km=easy_pace_sec_per_km, max_hr=max_hr).items() if v})
+            sessions = running_plan(start, end.date(), runs_per_week=sessions_per_week, race_distance_km=race_distance_km, **settings)
+            weeks = plan_weeks(start, end.date(), settings["weekly_km"])
+        else:
+            if not project_grade:
+                return "error: failed to generate training plan - project_grade is required for climbing plans"
+            sessions = climbing_plan(start, end.date(), sessions_per_week, project_grade)
+            weeks = plan_weeks(start, end.date(), CLIMBING_WEEKLY_CLIMBS)
+
+        index = plan_index(ctx)
+        removed = 0
+        if replace_existing:
+            existing = [session.id for day in index.days_between(start, end) for session in day.sessions if session.activity == activity]
+            for session_id in existing:
+                index.delete(session_id)
+            removed = len(existing)
+        for day, session in sessions:
+            index.insert(session, day)
+        mark_context_changed(ctx)
+
+        return json.dumps({
+            "goal": goal.title if goal else None,
+            "start": start.isoformat(),
+            "deadline": end.date().isoformat(),
+            "sessions_added": len(sessions),
+            "sessions_removed": removed,
+            "weeks": [
+                {"week": w.number, "phase": w.phase + (" recovery" if w.recovery else ""),
+                 ("km" if activity == "running" else "climbs"): round(w.volume, 1)}
+                for w in weeks
+            ],
+        }, separators=(",", ":"))
+
+    except Exception as e:
+        print(f"error: failed to generate training plan - {e}")
+        return f"error: failed to generate training plan - {e}"
 
 ### AGENTS
 
 context_updator = Agent[CoordinatorAgentContext](
     name = "context_updator",
-    model = "gpt-5-mini",
-    instructions=f" You are an agent that is in charge of updating the coordinator context based on new information provided to you. Use the get context tool first to make sure you have the latest context, then make the updates as specified. This is the format for the context: {context_format} \n, FYI, todays date is {datetime.now(timezone.utc).isoformat()}. When you update the training plan, you shouldn't delete existing workouts unless told to. If they ask you to add a workout, you need to regenerate the entire context with the new workout added to the currentTrainingPlan field. If you are updating a goal, make sure you keep all the other goals the same except for the one you're updating. This is also true for the fitness levels. Never change the field called userDefinedFitnessLevel. You are in charge of the agentDefinedFitnessLevel.",
+    model = TieredModel("context_updator"),
+    hooks = metrics_hooks,
+    model_settings = model_settings_for("context_updator"),
+    instructions=with_request_details(f"You are an agent that is in charge of updating the coordinator context based on new information provided to you. Use the get context tool first to make sure you have the latest context, then make the updates as specified. This is the format for the context: {context_format}\nFor planned sessions, use create_workout, update_workout, move_workout and delete_workout, which find sessions by their id and keep the plan in date order. Make every other change with the patch_context tool, using the smallest set of operations that does the job (for example one 'replace' for a single field). Only use update_context if you really have to replace the whole context. When you update the training plan, you shouldn't delete existing workouts unless told to. If you are updating a goal or a fitness level, only touch that one entry. Never change the field called userDefinedFitnessLevel. You are in charge of the agentDefinedFitnessLevel."),
     handoff_description="An agent who is responsible for updating the context. Just specify the fields that you want to update, and provide the new values.",
     tools = [
         get_context,
+        create_workout,
+        update_workout,
+        move_workout,
+        delete_workout,
+        patch_context,
         update_context
     ]
 )
 
 running_coach = Agent[CoordinatorAgentContext](
     name="running_coach",
-    model="gpt-5-mini",
-    instructions=f"""
+    model=TieredModel("running_coach"),
+    hooks=metrics_hooks,
+    instructions=with_request_details("""
     You are a running coach with expertise in training plans for running.
     You are specifically in charge of making informed decisions about running training based on the users running workout history which you can find using the tool provided. Remember that this is a conversation, so keep your responses short and to the point.
-    """,
+    You might be talking to the user directly, or to the coordinator agent on the user's behalf.
+    For numbers like weekly volume, trends or training load, use the get_training_analytics tool rather than working them out yourself.
+    To build a plan for a goal, use the generate_training_plan tool instead of writing out the sessions yourself, then adjust single sessions if needed. Say whether it replaces the sessions already planned with replace_existing.
+    """),
     handoff_description="A running coach that has in depth knowledge of the users running history.",
-    model_settings = ModelSettings(verbosity="low", reasoning=Reasoning(effort= "minimal")),
+    model_settings=model_settings_for("running_coach"),
     tools=[
         search_workout_history,
-        get_context,
+        get_training_analytics,
+        query_workout_log,
+        get_running_context,
+        generate_training_plan,
         context_updator.as_tool(
             tool_name="context_updator",
+            max_turns=max_turns_for("context_updator"),
             tool_description="An agent who is responsible for updating the context. Just specify the fields that you want to update, and provide the new values."
         )
     ]
@@ -618,47 +598,99 @@ running_coach = Agent[CoordinatorAgentContext](
 
 climbing_coach = Agent[CoordinatorAgentContext](
     name="climbing_coach",
-    model="gpt-5-mini",
-    instructions=f"""
+    model=TieredModel("climbing_coach"),
+    hooks=metrics_hooks,
+    instructions=with_request_details("""
     You are a climbing coach with expertise in training plans for climbing.
     You are specifically in charge of making informed decisions about climbing training based on the users climbing workout history which you can find using the tool provided.  
-    """,
+    You might be talking to the user directly, or to the coordinator agent on the user's behalf.
+    For numbers like weekly volume, trends or training load, use the get_training_analytics tool rather than working them out yourself.
+    To build a plan for a goal, use the generate_training_plan tool instead of writing out the sessions yourself, then adjust single sessions if needed. Say whether it replaces the sessions already planned with replace_existing.
+    """),
     handoff_description="A rock climbing coach that has in depth knowledge of the users climbing history.",
-    model_settings = ModelSettings(verbosity="low", reasoning=Reasoning(effort= "minimal")),
+    model_settings=model_settings_for("climbing_coach"),
     tools=[
         search_workout_history, 
-        get_context,
+        get_training_analytics,
+        query_workout_log,
+        get_climbing_context,
+        generate_training_plan,
         context_updator.as_tool(
             tool_name="context_updator",
+            max_turns=max_turns_for("context_updator"),
             tool_description="An agent who is responsible for updating the context. Just specify the fields that you want to update, and provide the new values."
         )
     ],
     
 )
 
+COACHES = {"running": running_coach, "climbing": climbing_coach}
+# Tools a consulted coach doesn't get: the coaches run in parallel on the same context, so only the coordinator edits it.
+CONTEXT_WRITING_TOOLS = {"generate_training_plan", "context_updator"}
+
+
+def _read_only(coach: Agent[CoordinatorAgentContext]) -> Agent[CoordinatorAgentContext]:
+    # Cloned per call rather than at import, so the clone always has the coach's current model.
+    return coach.clone(tools=[tool for tool in coach.tools if tool.name not in CONTEXT_WRITING_TOOLS])
+
+@function_tool
+async def consult_coaches(context: RunContextWrapper[CoordinatorAgentContext], question: str, activities: list[ActivityTypeEnum] | None = None) -> str:
+    """
+    A tool that asks several coaches the same question at the same time, for questions that involve more than one
+    sport (e.g. how to balance climbing and running this week). Much faster than asking the coaches one after the other.
+    Args:
+        question: The question for the coaches, with everything they need to know. They each look up their own sport's history.
+        activities: The coaches to ask, "running" and / or "climbing". Defaults to both.
+    Returns:
+        JSON object with each coach's answer, keyed by coach name.
+    """
+    coaches = [_read_only(COACHES[activity]) for activity in dict.fromkeys(activities or COACHES)]
+    prompt = (f"{question}\nThe coordinator is asking the {' and '.join(coach.name for coach in coaches)} this at the same time "
+              "and will combine the answers. Answer from your sport's point of view, and leave changes to the context to the coordinator.")
+    # The coaches share the run's context (and its run cache), so a lookup both of them make is only done once.
+    # They can only read it, so the parallel runs can't overwrite each other's changes.
+    results = await asyncio.gather(
+        *(Runner.run(starting_agent=coach, input=prompt, context=context.context, max_turns=max_turns_for(coach.name)) for coach in coaches),
+        return_exceptions=True,
+    )
+    answers = {}
+    for coach, result in zip(coaches, results):
+        if isinstance(result, BaseException):
+            answers[coach.name] = f"error: {coach.name} failed - {result}"
+        else:
+            answers[coach.name] = str(result.final_output)
+    return json.dumps(answers, ensure_ascii=False)
+
 coordinator_chatbot_agent = Agent[CoordinatorAgentContext](
     name="coordinator_chatbot_agent",
-    model="gpt-5-mini",
-    instructions=f"""
+    model=TieredModel("coordinator_chatbot_agent"),
+    hooks=metrics_hooks,
+    model_settings=model_settings_for("coordinator_chatbot_agent"),
+    instructions=with_request_details("""
     You are a coordinator with expertise in fitness and training plans for climbing and running.
     You are specifically in charge of talking to the user to understand their needs and answer questions
     they might have about their training plan. You should almost always begin by using the 'get_context' tool so that you can see their current goals and training plan. 
     
     Sometimes, the user may ask you something about a specific sport that they're training for. In this case you should consider asking the coach for that activity for help. They will have more expertise than you about the sport, and will be able to tell you the users training history. Remember that this is a conversation, so keep your responses short and to the point.
+    If the question involves both running and climbing (e.g. how to balance them this week), use the consult_coaches tool to ask both coaches at once instead of asking them one after the other, then combine their answers into one reply.
     If they tell you make a goal, or workout, or fitness level, then use the update_context tool to update the goal. You do not have access to the users workout history in the context, you have to ask the running_coach or climbing_coach for that information. For example if the user asks why their knee hurts, you can ask the running_coach about their running history to see if there are any clues there. If the user tells you to make a goal or workout and they give you the details, then you should just do that without asking the coach.
-    """,
+    """),
     tools=[
         running_coach.as_tool(
             tool_name="running_coach",
+            max_turns=max_turns_for("running_coach"),
             tool_description="A running coach that has in depth knowledge of the users running history, and their running training plan. Make sure you give them the userId in lowercase.",
         ),
         climbing_coach.as_tool(
             tool_name="climbing_coach",
+            max_turns=max_turns_for("climbing_coach"),
             tool_description="A climbing coach that has in depth knowledge of the users climbing history, and their climbing training plan. Make sure you give them the userId.",
         ),
+        consult_coaches,
         get_context,
         context_updator.as_tool(
             tool_name="context_updator",
+            max_turns=max_turns_for("context_updator"),
             tool_description="An agent who is responsible for updating the context. Just specify the fields that you want to update, and provide the new values."
         )
 
@@ -0,0 +1,188 @@
+# fitness_reevaluation.py
+# Coalesces fitness level re-evaluations.
+# Every submitted workout used to trigger its own coach run. Now submissions for the same user and activity
+# that arrive within FITNESS_REEVAL_WINDOW_SECONDS of each other are collected into one job, and the coach
+# runs once over all of them. The job id is returned to the client, which can poll the status endpoint
+# for the updated context.
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional, Union, cast
+
+from dotenv import load_dotenv
+
+from agents import Runner, TResponseInputItem
+from completed_workouts_model import CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO
+from context_versions import ContextConflict, etag, user_contexts
+from agent_models import BACKGROUND_LATENCY_BUDGET_SECONDS, latency_budget, max_turns_for
+from custom_agents import climbing_coach, running_coach
+from models import CoordinatorAgentContext
+from run_admission import BACKGROUND, run_scheduler
+
+load_dotenv()
+
+# Quiet period after the latest submission before the coach runs.
+FITNESS_REEVAL_WINDOW_SECONDS = float(os.environ.get("FITNESS_REEVAL_WINDOW_SECONDS", "60"))
+# Upper bound on how long a job can be pushed back by a steady stream of submissions.
+FITNESS_REEVAL_MAX_DELAY_SECONDS = float(os.environ.get("FITNESS_REEVAL_MAX_DELAY_SECONDS", "300"))
+# Finished jobs kept around for the status endpoint.
+FITNESS_REEVAL_MAX_JOBS = int(os.environ.get("FITNESS_REEVAL_MAX_JOBS", "1000"))
+
+CompletedWorkout = Union[CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO]
+
+
+@dataclass
+class ReevaluationJob:
+    id: str
+    userId: str
+    activity: str
+    context: CoordinatorAgentContext
+    workouts: list[CompletedWorkout] = field(default_factory=list)
+    # User context version the submitted context was based on, and the version committed by the run.
+    base_version: int = 0
+    version: Optional[int] = None
+    status: str = "pending"  # "pending", "running", "done" or "failed"
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    deadline: float = 0.0
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    def status_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "activity": self.activity,
+            "workouts": len(self.workouts),
+            "error": self.error,
+            "etag": etag(self.version) if self.version is not None else None,
+            "context": self.context if self.status == "done" else None,
+        }
+
+
+async def run_coach(job: ReevaluationJob) -> CoordinatorAgentContext:
+    """
+    Run the activity's coach once over every workout collected in the job, holding the user's context lock and a
+    background run slot. If another run committed a newer context since the workouts were submitted, the coach works
+    on the submitted context merged with it, or on the latest one when the submission is too old to merge.
+    """
+    coach = climbing_coach if job.activity == "climbing" else running_coach
+    workouts = "\n".join(str(workout.model_dump(mode="python")) for workout in job.workouts)
+    messages = [
+        {
+        "content": f"Update my coach defined fitness level for {job.activity}, but first look at the {len(job.workouts)} workout(s) I just submitted, and search memories for my workout history. My user ID is {job.userId} Here are the workouts:\n{workouts}",
+        "role": "user"
+        }
+    ]
+    async with run_scheduler.slot(job.userId, BACKGROUND, reject=False), user_contexts.mutation(job.userId) as transaction:
+        try:
+            job.context = user_contexts.rebase(job.userId, job.context, job.base_version)
+        except ContextConflict as conflict:
+            job.context = conflict.context or job.context
+        with latency_budget(BACKGROUND_LATENCY_BUDGET_SECONDS):
+            result = await Runner.run(
+                starting_agent=coach,
+                input=cast(list[TResponseInputItem], messages),
+                context=job.context,
+                max_turns=max_turns_for(coach.name)
+            )
+        job.version = await user_contexts.commit(job.userId, transaction, result.context_wrapper.context)
+    return result.context_wrapper.context
+
+
+class FitnessReevaluationScheduler:
+    def __init__(
+        self,
+        run: Callable[[ReevaluationJob], Awaitable[CoordinatorAgentContext]],
+        window_seconds: float = FITNESS_REEVAL_WINDOW_SECONDS,
+        max_delay_seconds: float = FITNESS_REEVAL_MAX_DELAY_SECONDS,
+        max_jobs: int = FITNESS_REEVAL_MAX_JOBS,
+    ):
+        self._run = run
+        self._window_seconds = window_seconds
+        self._max_delay_seconds = max_delay_seconds
+        self._max_jobs = max_jobs
+        self._pending: dict[tuple[str, str], ReevaluationJob] = {}
+        self._jobs: OrderedDict[str, ReevaluationJob] = OrderedDict()
+        self.stats = {"submissions": 0, "runs": 0, "failed": 0}
+
+    def schedule(self, userId: str, workout: CompletedWorkout, context: CoordinatorAgentContext, base_version: int) -> ReevaluationJob:
+        """
+        Add a workout to the user's pending job for that activity, creating the job if there is none. `base_version`
+        is the user context version `context` is based on; the run merges in what was committed after it.
+        """
+        key = (userId.lower(), workout.activity)
+        job = self._pending.get(key)
+        if job is None:
+            job = ReevaluationJob(id=str(uuid.uuid4()), userId=userId, activity=workout.activity, context=context)
+            self._pending[key] = job
+            self._remember(job)
+        else:
+            # The newest submission carries the client's newest context.
+            job.context = context
+        job.base_version = base_version
+        job.workouts.append(workout)
+        job.deadline = min(time.monotonic() + self._window_seconds, job.created_at + self._max_delay_seconds)
+        if job.task is None:
+            job.task = asyncio.create_task(self._run_when_quiet(job), name=f"fitness-reeval-{job.id}")
+        self.stats["submissions"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[ReevaluationJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: ReevaluationJob, timeout: Optional[float] = None) -> bool:
+        """Wait for the job to finish. Returns False if the timeout expired first."""
+        try:
+            await asyncio.wait_for(job.finished.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Run every pending job now instead of waiting out its window."""
+        jobs = list(self._pending.values())
+        for job in jobs:
+            job.deadline = 0.0
+            if job.task is not None:
+                job.task.cancel()
+                job.task = asyncio.create_task(self._run_when_quiet(job))
+        if jobs:
+            await asyncio.wait([job.task for job in jobs if job.task], timeout=timeout)
+        print("🏋️ Fitness re-evaluation stopped.", self.stats)
+
+    def _remember(self, job: ReevaluationJob) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > self._max_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished.is_set():
+                break
+            del self._jobs[oldest_id]
+
+    async def _run_when_quiet(self, job: ReevaluationJob) -> None:
+        # The deadline moves as more workouts arrive, so keep sleeping until it stops moving.
+        while (delay := job.deadline - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+        key = (job.userId.lower(), job.activity)
+        if self._pending.get(key) is job:
+            del self._pending[key]
+        job.status = "running"
+        print(f"🏋️ Re-evaluating {job.activity} fitness for {job.userId} over {len(job.workouts)} workout(s).")
+        try:
+            job.context = await self._run(job)
+            job.status = "done"
+            self.stats["runs"] += 1
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            self.stats["failed"] += 1
+            print(f"error: fitness re-evaluation {job.id} failed - {e}")
+        finally:
+            job.finished.set()
+
+
+fitness_scheduler = FitnessReevaluationScheduler(run_coach)
@@ -0,0 +1,142 @@
+# history_compaction.py
+# Shrinks the conversation history before it is sent to the model.
+# The full transcript is still returned to the client / kept in the session store,
+# only the model input is compacted:
+#   1. older get_context outputs are collapsed, only the latest one per set of arguments is kept
+#   2. tool outputs outside the most recent turns are truncated
+#   3. if the history is still over budget, the oldest turns are rolled into one running summary message
+import json
+import os
+from typing import Any
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "12000"))
+HISTORY_KEEP_RECENT_TURNS = int(os.environ.get("HISTORY_KEEP_RECENT_TURNS", "4"))
+HISTORY_MAX_TOOL_OUTPUT_CHARS = int(os.environ.get("HISTORY_MAX_TOOL_OUTPUT_CHARS", "1500"))
+HISTORY_SUMMARY_LINE_CHARS = int(os.environ.get("HISTORY_SUMMARY_LINE_CHARS", "240"))
+HISTORY_SUMMARY_MAX_LINES = int(os.environ.get("HISTORY_SUMMARY_MAX_LINES", "40"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Tools whose output is a snapshot of the current context; only the newest snapshot of the same projection
+# (same arguments) is useful. A call without arguments returns everything and outdates every earlier one.
+SNAPSHOT_TOOLS = {"get_context"}
+
+
+def estimate_tokens(items: list[dict[str, Any]]) -> int:
+    # ~4 characters per token is close enough for budgeting.
+    return len(json.dumps(items, default=str)) // 4
+
+
+def _is_user_turn(item: dict[str, Any]) -> bool:
+    return item.get("role") == "user" and item.get("type", "message") == "message"
+
+
+def _is_summary(item: dict[str, Any]) -> bool:
+    return item.get("role") == "developer" and str(item.get("content", "")).startswith(SUMMARY_PREFIX)
+
+
+def _text_of(item: dict[str, Any]) -> str:
+    content = item.get("content", "")
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f" ...[truncated {len(text) - limit} chars]"
+
+
+def _recent_start(items: list[dict[str, Any]], keep_recent_turns: int) -> int:
+    """Index of the first item of the last `keep_recent_turns` user turns."""
+    user_turns = [i for i, item in enumerate(items) if _is_user_turn(item)]
+    if len(user_turns) <= keep_recent_turns:
+        return 0
+    return user_turns[-keep_recent_turns] if keep_recent_turns > 0 else len(items)
+
+
+def _snapshot_key(call: dict[str, Any]) -> tuple[str, str]:
+    try:
+        arguments = {k: v for k, v in json.loads(call.get("arguments") or "{}").items() if v not in (None, [], "")}
+    except (ValueError, AttributeError):
+        return call.get("name"), str(call.get("arguments"))
+    return call.get("name"), json.dumps(arguments, sort_keys=True)
+
+
+def _collapse_snapshots(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    calls = {
+        item.get("call_id"): _snapshot_key(item)
+        for item in items
+        if item.get("type") == "function_call" and item.get("name") in SNAPSHOT_TOOLS
+    }
+    outputs = [i for i, item in enumerate(items) if item.get("type") == "function_call_output" and item.get("call_id") in calls]
+    latest: dict[tuple[str, str], int] = {}
+    latest_full: dict[str, int] = {}
+    for i in outputs:
+        key = calls[items[i]["call_id"]]
+        latest[key] = i
+        if key[1] == "{}":
+            latest_full[key[0]] = i
+    outdated = set()
+    for i in outputs:
+        key = calls[items[i]["call_id"]]
+        if latest[key] != i or latest_full.get(key[0], -1) > i:
+            outdated.add(i)
+    compacted = []
+    for i, item in enumerate(items):
+        if i in outdated:
+            name = calls[item["call_id"]][0]
+            item = {**item, "output": f"[outdated {name} result removed, see the latest {name} call]"}
+        compacted.append(item)
+    return compacted
+
+
+def _truncate_old_tool_outputs(items: list[dict[str, Any]], recent_start: int, max_chars: int) -> list[dict[str, Any]]:
+    compacted = []
+    for i, item in enumerate(items):
+        if i < recent_start and item.get("type") == "function_call_output" and isinstance(item.get("output"), str):
+            item = {**item, "output": _truncate(item["output"], max_chars)}
+        compacted.append(item)
+    return compacted
+
+
+def _summarize(items: list[dict[str, Any]], line_chars: int, max_lines: int) -> dict[str, Any]:
+    lines = []
+    for item in items:
+        if _is_summary(item):
+            lines.extend(_text_of(item)[len(SUMMARY_PREFIX):].strip().splitlines())
+        elif item.get("type") == "function_call":
+            lines.append(f"- (tool) {item.get('name')} was called")
+        elif item.get("role") in ("user", "assistant") and item.get("type", "message") == "message":
+            text = " ".join(_text_of(item).split())
+            if text:
+                lines.append(f"- {item['role']}: {_truncate(text, line_chars)}")
+    # The summary rolls forward across turns, so only its newest lines are kept.
+    return {"role": "developer", "content": SUMMARY_PREFIX + "\n" + "\n".join(lines[-max_lines:])}
+
+
+def compact_history(
+    items: list[dict[str, Any]],
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    keep_recent_turns: int = HISTORY_KEEP_RECENT_TURNS,
+    max_tool_output_chars: int = HISTORY_MAX_TOOL_OUTPUT_CHARS,
+    summary_line_chars: int = HISTORY_SUMMARY_LINE_CHARS,
+    summary_max_lines: int = HISTORY_SUMMARY_MAX_LINES,
+) -> list[dict[str, Any]]:
+    """
+    Return a copy of `items` that fits `token_budget` as well as possible.
+    The last `keep_recent_turns` user turns are kept verbatim, apart from outdated get_context results.
+    """
+    compacted = _collapse_snapshots(items)
+    recent_start = _recent_start(compacted, keep_recent_turns)
+    compacted = _truncate_old_tool_outputs(compacted, recent_start, max_tool_output_chars)
+
+    if recent_start == 0 or estimate_tokens(compacted) <= token_budget:
+        return compacted
+    # Cutting on a user turn keeps every function_call next to its function_call_output.
+    return [_summarize(compacted[:recent_start], summary_line_chars, summary_max_lines)] + compacted[recent_start:]
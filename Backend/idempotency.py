@@ -0,0 +1,123 @@
+# idempotency.py
+# Replays the stored response for repeated workout submissions.
+# The iOS client retries on flaky networks. Without this, every retry wrote another copy of the workout
+# into memory (polluting search_workout_history) and queued another fitness re-evaluation.
+# Requests are keyed by the client's Idempotency-Key header, or by a canonical hash of the workout itself.
+# Keys live in SQLite so they survive restarts, and expire after IDEMPOTENCY_TTL_SECONDS.
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+load_dotenv()
+
+IDEMPOTENCY_STORE_PATH = os.environ.get("IDEMPOTENCY_STORE_PATH", "idempotency.db")
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600)))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "50000"))
+# Expired / surplus keys are pruned every this many writes rather than on every write.
+IDEMPOTENCY_PRUNE_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotent_responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL          -- unix seconds
+);
+CREATE INDEX IF NOT EXISTS idx_idempotent_responses_created_at ON idempotent_responses (created_at);
+"""
+
+
+def content_key(scope: str, userId: str, content: Any) -> str:
+    """Canonical hash of a request body: same user + same content -> same key, whatever the key order."""
+    canonical = json.dumps(jsonable_encoder(content), sort_keys=True, separators=(",", ":"))
+    return f"{scope}:{userId.lower()}:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        path: str = IDEMPOTENCY_STORE_PATH,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        # Requests currently being handled, so a retry that arrives mid-flight waits instead of running twice.
+        self._inflight: dict[str, asyncio.Event] = {}
+        self._writes = 0
+        self.stats = {"replayed": 0, "stored": 0}
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_sync(self, key: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT response FROM idempotent_responses WHERE key = ? AND created_at >= ?",
+            (key, time.time() - self.ttl_seconds),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_sync(self, key: str, response: dict) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotent_responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time()),
+            )
+            self._writes += 1
+            if self._writes % IDEMPOTENCY_PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM idempotent_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+                conn.execute(
+                    """
+                    DELETE FROM idempotent_responses WHERE key NOT IN (
+                        SELECT key FROM idempotent_responses ORDER BY created_at DESC LIMIT ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+
+    async def run_once(self, key: str, handler: Callable[[], Awaitable[Any]]) -> tuple[dict, bool]:
+        """
+        Return (response, replayed). The handler only runs if `key` has no stored response; its JSON-encoded
+        result is stored. Failed requests are not stored, so the client can retry them.
+        """
+        # The key is claimed before the store is read: a request that read nothing while another one was still
+        # storing its response would otherwise find no in-flight entry afterwards and run the handler again.
+        pending = self._inflight.get(key)
+        while pending is not None:
+            await pending.wait()
+            pending = self._inflight.get(key)
+
+        done = asyncio.Event()
+        self._inflight[key] = done
+        try:
+            cached = await asyncio.to_thread(self.get_sync, key)
+            if cached is not None:
+                self.stats["replayed"] += 1
+                return cached, True
+            response = jsonable_encoder(await handler())
+            await asyncio.to_thread(self.put_sync, key, response)
+            self.stats["stored"] += 1
+            return response, False
+        finally:
+            del self._inflight[key]
+            done.set()
+
+
+idempotency_store = IdempotencyStore()
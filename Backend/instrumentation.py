@@ -0,0 +1,208 @@
+# instrumentation.py
+# In-process metrics, exposed in the Prometheus text format on /metrics.
+# Covers every agent (wall time, LLM time, tokens), every tool, the memory backend calls, context serialization
+# and HTTP requests, so a slow chat can be pinned on the model, the memory search or our own code.
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from agents import Agent, AgentHooks, RunContextWrapper, Tool
+from agents.run import AgentRunner, set_default_agent_runner
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series: dict[tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{{{','.join(labels + [f'le={chr(34)}{le}{chr(34)}'])}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total:g}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+### Metrics
+
+agent_run_seconds = Histogram("dojo_agent_run_seconds", "Wall time of one agent turn, tools and sub-agents included.", ("agent",), LATENCY_BUCKETS)
+llm_call_seconds = Histogram("dojo_llm_call_seconds", "Time spent waiting for one model response.", ("agent",), LATENCY_BUCKETS)
+llm_tokens = Histogram("dojo_llm_tokens", "Tokens per model call.", ("agent", "direction"), TOKEN_BUCKETS)
+tool_call_seconds = Histogram("dojo_tool_call_seconds", "Duration of one function tool call.", ("agent", "tool"), LATENCY_BUCKETS)
+memory_call_seconds = Histogram("dojo_memory_call_seconds", "Latency of memory backend calls.", ("backend", "operation"), LATENCY_BUCKETS)
+context_dump_seconds = Histogram("dojo_context_dump_seconds", "Time to project and serialize the context for a tool.", (), LATENCY_BUCKETS)
+context_dump_bytes = Histogram("dojo_context_dump_bytes", "Size of the serialized context returned to an agent.", (), BYTES_BUCKETS)
+http_request_seconds = Histogram("dojo_http_request_seconds", "HTTP request duration.", ("method", "path", "status"), LATENCY_BUCKETS)
+http_request_bytes = Histogram("dojo_http_request_bytes", "HTTP request body size.", ("method", "path"), BYTES_BUCKETS)
+http_response_bytes = Histogram("dojo_http_response_bytes", "HTTP response body size (streamed responses excluded).", ("method", "path"), BYTES_BUCKETS)
+
+ALL_METRICS = (
+    agent_run_seconds, llm_call_seconds, llm_tokens, tool_call_seconds, memory_call_seconds,
+    context_dump_seconds, context_dump_bytes, http_request_seconds, http_request_bytes, http_response_bytes,
+)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in ALL_METRICS for line in metric.render()) + "\n"
+
+
+### Agent hooks
+
+class _Timers:
+    """Start times keyed by whatever identifies an in-flight call. Bounded, so runs that die half way can't leak."""
+
+    def __init__(self, max_entries: int = 10000):
+        self._starts: OrderedDict[tuple, list[float]] = OrderedDict()
+        self._max_entries = max_entries
+
+    def start(self, key: tuple) -> None:
+        self._starts.setdefault(key, []).append(time.perf_counter())
+        while len(self._starts) > self._max_entries:
+            self._starts.popitem(last=False)
+
+    def stop(self, key: tuple) -> Optional[float]:
+        stack = self._starts.get(key)
+        if not stack:
+            return None
+        started = stack.pop()
+        if not stack:
+            del self._starts[key]
+        return time.perf_counter() - started
+
+
+# Id of the Runner.run the current task belongs to. The hooks run in tasks the SDK starts during the run, which copy
+# it, so on_start and on_end of one run see the same id however many runs of the agent share the context.
+_run_id: ContextVar[Optional[int]] = ContextVar("agent_run_id", default=None)
+_run_ids = itertools.count(1)
+# Hook calls made outside a MeasuredRunner run, timed per context instead. Should stay 0.
+hook_stats = {"unscoped": 0}
+
+
+class MeasuredRunner(AgentRunner):
+    """
+    The default runner behind Runner.run / run_streamed (see the end of this file). Gives every run its own id,
+    including the nested runs of agents used as tools, which go through Runner.run too.
+    """
+
+    async def run(self, starting_agent, input, **kwargs):
+        token = _run_id.set(next(_run_ids))
+        try:
+            return await super().run(starting_agent, input, **kwargs)
+        finally:
+            _run_id.reset(token)
+
+    def run_streamed(self, starting_agent, input, **kwargs):
+        # The streaming loop task is created in here, so it copies the id.
+        token = _run_id.set(next(_run_ids))
+        try:
+            return super().run_streamed(starting_agent, input, **kwargs)
+        finally:
+            _run_id.reset(token)
+
+
+def _invocation(context: RunContextWrapper) -> tuple:
+    """Identifies one Runner.run, so parallel runs of the same agent on the same context keep their own timers."""
+    run_id = _run_id.get()
+    if run_id is None:
+        hook_stats["unscoped"] += 1
+        return ("context", id(context.context))
+    return ("run", run_id)
+
+
+def _run_key(context: RunContextWrapper, agent: Agent) -> tuple:
+    return (_invocation(context), agent.name)
+
+
+def _tool_key(context: RunContextWrapper, agent: Agent, tool: Tool) -> tuple:
+    return _run_key(context, agent) + (tool.name, getattr(context, "tool_call_id", None))
+
+
+class MetricsHooks(AgentHooks[Any]):
+    """
+    Set as `hooks` on every agent (not passed to Runner.run), so agents that run as tools of other agents
+    are measured too.
+    """
+
+    def __init__(self):
+        self._agents = _Timers()
+        self._llm = _Timers()
+        self._tools = _Timers()
+
+    async def on_start(self, context, agent) -> None:
+        self._agents.start(_run_key(context, agent))
+
+    async def on_end(self, context, agent, output) -> None:
+        elapsed = self._agents.stop(_run_key(context, agent))
+        if elapsed is not None:
+            agent_run_seconds.observe(elapsed, agent=agent.name)
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self._llm.start(_run_key(context, agent))
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        elapsed = self._llm.stop(_run_key(context, agent))
+        if elapsed is not None:
+            llm_call_seconds.observe(elapsed, agent=agent.name)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            llm_tokens.observe(usage.input_tokens, agent=agent.name, direction="input")
+            llm_tokens.observe(usage.output_tokens, agent=agent.name, direction="output")
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._tools.start(_tool_key(context, agent, tool))
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        elapsed = self._tools.stop(_tool_key(context, agent, tool))
+        if elapsed is not None:
+            tool_call_seconds.observe(elapsed, agent=agent.name, tool=tool.name)
+
+
+metrics_hooks = MetricsHooks()
+set_default_agent_runner(MeasuredRunner())
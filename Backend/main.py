@@ -1,94 +1,491 @@
 # fastapi_app.py
-from typing import Any, Dict, List, cast, Union
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, cast, Union
 from pydantic import BaseModel, model_validator
 from uuid import UUID
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from openai.types.responses import ResponseTextDeltaEvent
 from agents import Runner, TResponseInputItem 
 from models import CoordinatorAgentContext  # your model
 from custom_agents import coordinator_chatbot_agent, climbing_coach, running_coach
 from completed_workouts_model import CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO
-from memory_management import WorkoutPayload, save_workout_to_memory
+from memory_management import BulkWorkoutPayload, WorkoutPayload, close_memory_client, search_cache
+from memory_ingestion import ingestion_queue
+from session_store import ConversationSession, session_store
+from history_compaction import compact_history
+from agent_router import choose_starting_agent
+from workout_store import workout_store
+from fitness_reevaluation import fitness_scheduler
+from idempotency import content_key, idempotency_store
+from instrumentation import http_request_bytes, http_request_seconds, http_response_bytes, render_metrics
+from run_cache import run_cache_stats, start_run
+from context_versions import ContextConflict, etag, parse_if_match, user_contexts
+from run_admission import BACKGROUND, INTERACTIVE, AdmissionRejected, run_scheduler
+from agent_models import BACKGROUND_LATENCY_BUDGET_SECONDS, CHAT_LATENCY_BUDGET_SECONDS, latency_budget, max_turns_for, model_tiering_stats
 
-app = FastAPI()
+# How long shutdown waits for queued memory writes before dropping them.
+MEMORY_FLUSH_TIMEOUT_SECONDS = float(os.environ.get("MEMORY_FLUSH_TIMEOUT_SECONDS", "20"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ingestion_queue.start()
+    yield
+    await fitness_scheduler.stop(timeout=MEMORY_FLUSH_TIMEOUT_SECONDS)
+    await ingestion_queue.stop(timeout=MEMORY_FLUSH_TIMEOUT_SECONDS)
+    await close_memory_client()
+
+app = FastAPI(lifespan=lifespan)
 ## TO RUN LOCALLY: uvicorn main:app --reload --host 0.0.0.0 --port 8000
 
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # The route template, not the raw path, so ids in the URL don't create a series each.
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    http_request_seconds.observe(time.perf_counter() - started, method=request.method, path=path, status=response.status_code)
+    if request.headers.get("content-length"):
+        http_request_bytes.observe(int(request.headers["content-length"]), method=request.method, path=path)
+    if response.headers.get("content-length"):
+        http_response_bytes.observe(int(response.headers["content-length"]), method=request.method, path=path)
+    return response
+
 class ChatPayload(BaseModel):
     # <-- Treat messages as plain JSON dicts; do NOT use TResponseInputItem here.
-    messages: List[Dict[str, Any]]
-    coordinatorContext: CoordinatorAgentContext
+    # Either send the full history in `messages` (legacy clients), or only the new items in
+    # `newMessages` and let the server keep the history for `conversation_id`.
+    messages: Optional[List[Dict[str, Any]]] = None
+    newMessages: Optional[List[Dict[str, Any]]] = None
+    # Optional once the server holds the conversation: send `contextVersion` instead, and only
+    # send the context again if it changed on the device.
+    coordinatorContext: Optional[CoordinatorAgentContext] = None
+    contextVersion: Optional[int] = None
     timestamp: datetime
     userId: UUID
     conversation_id: str
 
+    @model_validator(mode="after")
+    def _check_messages(self):
+        if self.messages is None and self.newMessages is None:
+            raise ValueError("Send either 'messages' (full history) or 'newMessages'.")
+        return self
+
  
+async def _resolve_chat_state(payload: ChatPayload, expected_version: Optional[int]
+                              ) -> tuple[list[Dict[str, Any]], CoordinatorAgentContext, Optional[ConversationSession], Optional[str]]:
+    """
+    Work out the full history and the context for this turn from the payload and the stored session. Called while
+    holding the user's context lock. A context the client sends is merged with whatever was committed after the
+    version it is based on (If-Match, else contextVersion, else the version this conversation last got back).
+    Also returns the JSON of the context the client holds, None if it is behind the server.
+    """
+    userId = str(payload.userId)
+    session = await session_store.get(payload.conversation_id)
+    if session is not None and session.userId != userId.lower():
+        raise HTTPException(status_code=403, detail="conversation_id belongs to another user")
 
-@app.post("/chat")
-async def chat(payload: ChatPayload):
-    # It's so stupid that I have to do this it does nothing other than prevent the 
-    # garbage type checker from complaining.
-    input_items = cast(list[TResponseInputItem], payload.messages) 
-    print("Payload reeived for ", payload.coordinatorContext.userId)
-    result = await Runner.run(
-        starting_agent=coordinator_chatbot_agent,
-        input=input_items,
-        context=payload.coordinatorContext
-        #conversation_id=payload.conversation_id,
-        # optionally:
-        # previous_response_id=payload.previous_response_id,
-        
-    )
-    print("Completed the result")
-    # print("Updated Context:")
-    # print(result.context_wrapper.context)
-
-    # print("Context Wrapper")
-    # print(result.context_wrapper)
+    if payload.messages is not None:
+        history = payload.messages
+    elif session is not None:
+        history = session.messages + (payload.newMessages or [])
+    else:
+        raise HTTPException(status_code=404, detail="Unknown conversation_id, send the full 'messages' history.")
+
+    version = user_contexts.current_version(userId)
+    if payload.coordinatorContext is not None:
+        client_json = payload.coordinatorContext.model_dump_json()
+        base_version = next((v for v in (expected_version, payload.contextVersion) if v is not None),
+                            session.contextVersion if session else None)
+        context = user_contexts.rebase(userId, payload.coordinatorContext, base_version)
+    elif payload.contextVersion is not None and (latest := user_contexts.context_at(userId, payload.contextVersion)) is not None:
+        # The client didn't change its copy, so it is that version as committed; the latest includes it.
+        context = user_contexts.latest_context(userId) or latest
+        client_json = latest.model_dump_json() if payload.contextVersion == version else None
+    elif session is not None and payload.contextVersion == session.contextVersion and session.contextVersion == version:
+        context, client_json = session.context, session.context.model_dump_json()
+    else:
+        raise HTTPException(status_code=409, detail="Context version is out of date, send 'coordinatorContext'.")
+    start_run(context)
+    return history, context, session, client_json
+
+
+def _expected_version(if_match: Optional[str]) -> Optional[int]:
+    try:
+        return parse_if_match(if_match)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this server, e.g. \"3\"")
+
+
+def _precondition_failed(conflict: ContextConflict) -> HTTPException:
+    """412 with the latest context, so the client can re-apply its change on top of it."""
+    return HTTPException(status_code=412, detail={
+        "error": str(conflict),
+        "etag": etag(conflict.version),
+        "context": jsonable_encoder(conflict.context),
+    })
+
+
+def _chat_budget(latency_budget_ms: Optional[int]) -> float:
+    """The client's X-Latency-Budget-Ms if it sent one, CHAT_LATENCY_BUDGET_SECONDS otherwise."""
+    return latency_budget_ms / 1000 if latency_budget_ms else CHAT_LATENCY_BUDGET_SECONDS
+
+
+def _too_busy(rejected: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(rejected), headers={"Retry-After": str(rejected.retry_after)})
+
+
+async def _finish_chat_turn(payload: ChatPayload, history: list[Dict[str, Any]], context: CoordinatorAgentContext,
+                            session: Optional[ConversationSession], client_json: Optional[str], messages: list,
+                            version: int) -> Dict[str, Any]:
+    """Store the finished turn in the session store and build the /chat response body."""
+    # contextVersion is the user's context version, the same number as the ETag.
+    await session_store.save(ConversationSession(
+        conversation_id=payload.conversation_id,
+        userId=str(payload.userId).lower(),
+        messages=messages,
+        context=context,
+        contextVersion=version,
+    ))
+
+    if payload.messages is not None:
+        return {
+            "server_msg": "no_update",
+            "messages": messages,
+            "context": context,
+            "contextVersion": version,
+        }
+    # Delta response: only what the client doesn't have yet.
     return {
         "server_msg": "no_update",
-        "messages": result.to_input_list(),  # list[ResponseInputItemParam]-compatible dicts
-        "context": result.context_wrapper.context,
+        "newMessages": messages[len(history):],
+        "context": context if context.model_dump_json() != client_json else None,
+        "contextVersion": version,
     }
 
 
+@app.post("/chat")
+async def chat(
+    payload: ChatPayload,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
+    latency_budget_ms: Optional[int] = Header(None, alias="X-Latency-Budget-Ms"),
+):
+    """
+    Runs for one user are serialized. Send the ETag of the context you hold as If-Match to get a 412
+    (with the latest context) instead of overwriting changes made by another request. Without If-Match, the context
+    you send is merged with the changes committed after its contextVersion. The response's contextVersion is the
+    same version as the ETag.
+    Answered with a 429 and Retry-After when too many agent runs are queued.
+    Once half of the latency budget (X-Latency-Budget-Ms, or CHAT_LATENCY_BUDGET_SECONDS) is used, the agents
+    switch to their faster fallback models for the rest of the turn.
+    """
+    userId = str(payload.userId)
+    expected_version = _expected_version(if_match)
+    try:
+        async with run_scheduler.slot(userId, INTERACTIVE), \
+                user_contexts.mutation(userId, expected_version) as transaction:
+            history, context, session, client_json = await _resolve_chat_state(payload, expected_version)
+            # It's so stupid that I have to do this it does nothing other than prevent the 
+            # garbage type checker from complaining.
+            input_items = cast(list[TResponseInputItem], compact_history(history)) 
+            print("Payload reeived for ", context.userId)
+            starting_agent = choose_starting_agent(history)
+            with latency_budget(_chat_budget(latency_budget_ms)):
+                result = await Runner.run(
+                    starting_agent=starting_agent,
+                    input=input_items,
+                    context=context,
+                    max_turns=max_turns_for(starting_agent.name)
+                )
+            print("Completed the result")
+            version = await user_contexts.commit(userId, transaction, context)
+    except ContextConflict as conflict:
+        raise _precondition_failed(conflict)
+    except AdmissionRejected as rejected:
+        raise _too_busy(rejected)
+
+    response.headers["ETag"] = etag(version)
+    # The model saw a compacted history; the client and the session keep the full transcript.
+    messages = history + result.to_input_list()[len(input_items):]  # list[ResponseInputItemParam]-compatible dicts
+    return await _finish_chat_turn(payload, history, context, session, client_json, messages, version)
+
+
+def _ndjson(event: Dict[str, Any]) -> str:
+    return json.dumps(jsonable_encoder(event), separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def _call_id(raw_item: Any) -> Optional[str]:
+    if isinstance(raw_item, dict):
+        return raw_item.get("call_id") or raw_item.get("id")
+    return getattr(raw_item, "call_id", None) or getattr(raw_item, "id", None)
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    payload: ChatPayload,
+    if_match: Optional[str] = Header(None, alias="If-Match"),
+    latency_budget_ms: Optional[int] = Header(None, alias="X-Latency-Budget-Ms"),
+):
+    """
+    Same request body and final result as /chat, but streamed as newline delimited JSON events:
+      {"type": "agent", "name": ...}                                  the active agent changed
+      {"type": "text_delta", "delta": ...}                            assistant text as it is generated
+      {"type": "tool_call_started", "tool": ..., "call_id": ...}
+      {"type": "tool_call_finished", "call_id": ...}
+      {"type": "final", ...}                                          the normal /chat response body
+      {"type": "error", "detail": ...}
+    The final event also carries the context's "etag". If-Match works like on /chat: a stale ETag is a 412 when it is
+    already outdated on arrival, or an error event (with status 412) if another run for the user commits first.
+    The conversation and context are looked up once the run holds the user's lock; problems with them (unknown
+    conversation_id, outdated contextVersion) come back as error events with the status /chat would answer with.
+    Admission control works the same way: a 429 when the queue is already full, otherwise an error event with status 429.
+    X-Latency-Budget-Ms works like on /chat.
+    """
+    userId = str(payload.userId)
+    expected_version = _expected_version(if_match)
+    try:
+        await user_contexts.check(userId, expected_version)
+        run_scheduler.check(userId, INTERACTIVE)
+    except ContextConflict as conflict:
+        raise _precondition_failed(conflict)
+    except AdmissionRejected as rejected:
+        raise _too_busy(rejected)
+
+    async def events():
+        try:
+            async with run_scheduler.slot(userId, INTERACTIVE), \
+                    user_contexts.mutation(userId, expected_version) as transaction:
+                # Resolved under the lock, so a run that committed while this one waited is not overwritten.
+                history, context, session, client_json = await _resolve_chat_state(payload, expected_version)
+                input_items = cast(list[TResponseInputItem], compact_history(history))
+                print("Streaming payload received for ", context.userId)
+                starting_agent = choose_starting_agent(history)
+                # The streamed run works in a task started here, which keeps the budget.
+                with latency_budget(_chat_budget(latency_budget_ms)):
+                    result = Runner.run_streamed(
+                        starting_agent=starting_agent,
+                        input=input_items,
+                        context=context,
+                        max_turns=max_turns_for(starting_agent.name)
+                    )
+                async for event in result.stream_events():
+                    if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                        yield _ndjson({"type": "text_delta", "delta": event.data.delta})
+                    elif event.type == "agent_updated_stream_event":
+                        yield _ndjson({"type": "agent", "name": event.new_agent.name})
+                    elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                        raw_item = event.item.raw_item
+                        tool = raw_item.get("name") if isinstance(raw_item, dict) else getattr(raw_item, "name", None)
+                        yield _ndjson({"type": "tool_call_started", "tool": tool, "call_id": _call_id(raw_item)})
+                    elif event.type == "run_item_stream_event" and event.name == "tool_output":
+                        yield _ndjson({"type": "tool_call_finished", "call_id": _call_id(event.item.raw_item)})
+                version = await user_contexts.commit(userId, transaction, context)
+
+            messages = history + result.to_input_list()[len(input_items):]
+            final = await _finish_chat_turn(payload, history, context, session, client_json, messages, version)
+            yield _ndjson({"type": "final", **final, "etag": etag(version)})
+        except HTTPException as e:
+            yield _ndjson({"type": "error", "status": e.status_code, "detail": e.detail})
+        except ContextConflict as conflict:
+            yield _ndjson({"type": "error", "status": 412, **_precondition_failed(conflict).detail})
+        except AdmissionRejected as rejected:
+            yield _ndjson({"type": "error", "status": 429, "detail": str(rejected), "retry_after": rejected.retry_after})
+        except Exception as e:
+            print(f"error: streamed chat failed - {e}")
+            yield _ndjson({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 
 @app.post("/submit_workout")
-async def submit_workout(payload: WorkoutPayload):
-    print("Received workout submission:")
+async def submit_workout(
+    payload: WorkoutPayload,
+    response: Response,
+    wait: bool = False,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    if_match: Optional[str] = Header(None, alias="If-Match"),
+):
+    """
+    Stores the workout and schedules a fitness level re-evaluation. Workouts of the same activity submitted
+    within FITNESS_REEVAL_WINDOW_SECONDS share one coach run; poll /fitness_reevaluations/{reevaluation_id}
+    for the updated context, or pass ?wait=true to hold the response until the run has finished.
 
-    messages = [
-        {
-        "content": f"Update my coach defined fitness level for {payload.workout.activity}, but first look at the workout I just submitted, and search memories for my workout history. My user ID is {payload.userId} Here is the workout:\n{payload.workout.model_dump(mode='python')}",
-        "role": "user"
-        }
-    ]
-    input_items = cast(list[TResponseInputItem], messages) 
-    # print(payload)
-    currentAgent = running_coach or climbing_coach
+    Retries (same Idempotency-Key header, or without one the same user and workout) get the first response back
+    and are not stored again. With If-Match, a submission based on an outdated context is rejected with a 412.
+    Without it, send the version coordinatorContext is based on as contextVersion: the re-evaluation merges in the
+    changes committed since. A context that is neither the latest nor says what it is based on gets a 412.
+    When the background run queue is full the workout is not accepted, and the client gets a 429 with Retry-After.
+    """
+    expected_version = _expected_version(if_match)
+    key = f"submit_workout:{str(payload.userId).lower()}:{idempotency_key}" if idempotency_key \
+        else content_key("submit_workout", str(payload.userId), payload.workout)
+    try:
+        result, replayed = await idempotency_store.run_once(key, lambda: _submit_workout(payload, wait, expected_version))
+    except ContextConflict as conflict:
+        raise _precondition_failed(conflict)
+    except AdmissionRejected as rejected:
+        raise _too_busy(rejected)
+    if replayed:
+        print(f"♻️ Duplicate workout submission for {payload.userId}, replaying the stored response.")
+        response.headers["Idempotent-Replayed"] = "true"
+    response.headers["ETag"] = result["etag"]
+    return result
+
+
+async def _submit_workout(payload: WorkoutPayload, wait: bool, expected_version: Optional[int]) -> dict:
+    print("Received workout submission:")
+    userId = str(payload.userId)
+    # Checked in here, so a retry of a submission that was already accepted gets the stored response, not a 412 / 429.
+    await user_contexts.check(userId, expected_version)
+    base_version = expected_version if expected_version is not None else payload.contextVersion
+    await user_contexts.check_rebase(userId, payload.coordinatorContext, base_version)
+    if base_version is None:
+        # Accepted without a version only when it is the latest context.
+        base_version = user_contexts.current_version(userId)
+    # Turned away before anything is stored; once accepted, the re-evaluation waits for its slot.
+    run_scheduler.check(userId, BACKGROUND)
 
     if payload.workout.activity == "climbing":
         workout = cast(CompletedClimbingWorkoutDTO, payload.workout)
         print(f"Climbing workout on {workout.date} with {len(workout.routes)} routes.")
-        currentAgent = climbing_coach
 
     elif payload.workout.activity == "running":
         workout = cast(CompletedRunningWorkoutDTO, payload.workout)
         print(f"Running workout on {workout.date} for {workout.distanceKm} km.")
-        currentAgent = running_coach
 
-    save_workout_to_memory(payload)
+    # Exact, local copy for date range / last-N queries (fast, so it is written inline).
+    await workout_store.add(str(payload.userId), payload.workout)
+    # Written in the background by the ingestion workers, never on the request path.
+    await ingestion_queue.enqueue(payload)
+
+    job = fitness_scheduler.schedule(userId, payload.workout, payload.coordinatorContext, base_version)
+    if wait:
+        await fitness_scheduler.wait(job)
+        if job.status == "failed":
+            raise HTTPException(status_code=502, detail=f"fitness level update failed - {job.error}")
+        return {
+            "server_msg": "updated fitness level",
+            "reevaluation_id": job.id,
+            "etag": etag(job.version),
+            "context": job.context,
+        }
+
+    return {
+        "server_msg": "fitness level update scheduled",
+        "reevaluation_id": job.id,
+        "etag": etag(user_contexts.current_version(str(payload.userId))),
+        "context": payload.coordinatorContext,
+    }
+
+
 
-    result = await Runner.run(
-        starting_agent=currentAgent,
-        input=input_items,
-        context=payload.coordinatorContext
-    )
+@app.get("/fitness_reevaluations/{reevaluation_id}")
+async def fitness_reevaluation_status(reevaluation_id: str):
+    job = fitness_scheduler.get(reevaluation_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reevaluation_id")
+    return job.status_dict()
+
+
+
+@app.post("/submit_workouts")
+async def submit_workouts(
+    payload: BulkWorkoutPayload,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    if_match: Optional[str] = Header(None, alias="If-Match"),
+):
+    """
+    Bulk import (e.g. a HealthKit history backfill). Every workout is validated with the payload, written to the
+    workout store in one transaction, and queued for memory ingestion in batches. The fitness level is then
+    re-evaluated once per activity, instead of once per workout. Retried imports are deduplicated, and If-Match /
+    contextVersion work, like on /submit_workout.
+    """
+    key = f"submit_workouts:{str(payload.userId).lower()}:{idempotency_key}" if idempotency_key \
+        else content_key("submit_workouts", str(payload.userId), payload.workouts)
+    expected_version = _expected_version(if_match)
+    try:
+        result, replayed = await idempotency_store.run_once(key, lambda: _submit_workouts(payload, expected_version))
+    except ContextConflict as conflict:
+        raise _precondition_failed(conflict)
+    except AdmissionRejected as rejected:
+        raise _too_busy(rejected)
+    if replayed:
+        print(f"♻️ Duplicate bulk submission for {payload.userId}, replaying the stored response.")
+        response.headers["Idempotent-Replayed"] = "true"
+    response.headers["ETag"] = result["etag"]
+    return result
+
+
+async def _submit_workouts(payload: BulkWorkoutPayload, expected_version: Optional[int]) -> dict:
+    print(f"Received bulk submission of {len(payload.workouts)} workouts.")
+    userId = str(payload.userId)
+    base_version = expected_version if expected_version is not None else payload.contextVersion
+    await user_contexts.check(userId, expected_version)
+    await user_contexts.check_rebase(userId, payload.coordinatorContext, base_version)
+    # Turned away before anything is stored; once accepted, the import waits for its slot instead of failing.
+    run_scheduler.check(userId, BACKGROUND)
+
+    imported: Dict[str, List[datetime]] = {}
+    for workout in payload.workouts:
+        imported.setdefault(workout.activity, []).append(workout.date)
+
+    async with run_scheduler.slot(userId, BACKGROUND, reject=False), user_contexts.mutation(userId, expected_version) as transaction:
+        # Stored only once the version checks under the lock have passed, so a 412 leaves nothing behind to duplicate.
+        context = user_contexts.rebase(userId, payload.coordinatorContext, base_version)
+        await workout_store.add_many(userId, payload.workouts)
+        await ingestion_queue.enqueue_many(payload.as_workout_payloads())
+        # One activity at a time: both coaches edit the same context.
+        for activity, dates in imported.items():
+            coach = climbing_coach if activity == "climbing" else running_coach
+            messages = [
+                {
+                "content": f"I just imported {len(dates)} {activity} workouts from {min(dates).date()} to {max(dates).date()}. Update my coach defined fitness level for {activity}. Use the get_training_analytics and query_workout_log tools to look at my history rather than asking for the workouts. My user ID is {payload.userId}",
+                "role": "user"
+                }
+            ]
+            with latency_budget(BACKGROUND_LATENCY_BUDGET_SECONDS):
+                result = await Runner.run(
+                    starting_agent=coach,
+                    input=cast(list[TResponseInputItem], messages),
+                    context=context,
+                    max_turns=max_turns_for(coach.name)
+                )
+            context = result.context_wrapper.context
+        version = await user_contexts.commit(userId, transaction, context)
 
     return {
         "server_msg": "updated fitness level",
-        "context": result.context_wrapper.context,
+        "imported": {activity: len(dates) for activity, dates in imported.items()},
+        "etag": etag(version),
+        "context": context,
     }
-        
-    
 
-    
\ No newline at end of file
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+
+@app.get("/memory_stats")
+async def memory_stats():
+    return {
+        "search_cache": search_cache.snapshot(),
+        "ingestion": {**ingestion_queue.stats, "pending": ingestion_queue.pending()},
+        "fitness_reevaluation": fitness_scheduler.stats,
+        "idempotency": idempotency_store.stats,
+        "run_cache": run_cache_stats,
+        "context_versions": user_contexts.stats,
+        "agent_runs": run_scheduler.snapshot(),
+        "model_tiering": model_tiering_stats,
+    }
@@ -0,0 +1,304 @@
+# memory_backends.py
+# Storage backends behind memory_management.py.
+# Every backend stores workout memories and answers the two searches the coaches use.
+# Search hits are returned as plain dicts:
+#   {"id", "source": "document" | "memory", "score", "date", "content", "document_ids"}
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+import numpy as np
+from dotenv import load_dotenv
+from supermemory import AsyncSupermemory
+
+load_dotenv()
+
+
+class MemoryBackend(ABC):
+
+    @abstractmethod
+    async def add(self, content: str, activity: str, metadata: dict[str, str]) -> str:
+        """Store one workout memory and return its document id."""
+
+    @abstractmethod
+    async def search_documents(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def search_memories(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+### SUPERMEMORY
+
+def _supermemory_filters(userId: str, filters: Optional[dict[str, str]]) -> dict:
+    return {
+        "AND": [{"key": "user", "value": userId}]
+        + [{"key": key, "value": value} for key, value in (filters or {}).items()]
+    }
+
+
+class SupermemoryBackend(MemoryBackend):
+    def __init__(self, api_key: Optional[str] = None):
+        # One long-lived async client shared by the whole process, so memory writes and searches
+        # reuse the same pooled HTTP connections instead of building a new client per call.
+        self.client = AsyncSupermemory(api_key=api_key or os.environ.get("SUPERMEMORY_API_KEY"))
+
+    async def add(self, content: str, activity: str, metadata: dict[str, str]) -> str:
+        result = await self.client.memories.add(
+            content=content,
+            container_tags=[activity],
+            metadata=metadata,
+        )
+        print(result)
+        return result.id
+
+    async def search_documents(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        results = await self.client.search.documents(
+            q=query,
+            limit=limit,
+            document_threshold=0.4,
+            chunk_threshold=0.4,
+            rerank=True,
+            rewrite_query=True,
+            include_full_docs=True,
+            include_summary=True,
+            only_matching_chunks=False,
+            container_tags=[activity],
+            filters=_supermemory_filters(userId, filters),
+        )
+        return [
+            {
+                "id": r.document_id,
+                "source": "document",
+                "score": r.score,
+                "date": (r.metadata or {}).get("date"),
+                "content": r.content or r.summary or "\n".join(c.content for c in r.chunks),
+                "document_ids": [r.document_id],
+            }
+            for r in results.results
+        ]
+
+    async def search_memories(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        results = await self.client.search.memories(
+            q=query,
+            container_tag=activity,
+            limit=limit,
+            threshold=0.5,
+            rerank=True,
+            filters=_supermemory_filters(userId, filters),
+            include={"documents": True},
+        )
+        return [
+            {
+                "id": r.id,
+                "source": "memory",
+                "score": r.similarity,
+                "date": (r.metadata or {}).get("date"),
+                "content": r.memory,
+                "document_ids": [d.id for d in (r.documents or [])],
+            }
+            for r in results.results
+        ]
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+### LOCAL VECTOR STORE
+
+class HashingEmbedder:
+    """
+    Deterministic, offline text embedding: word unigrams/bigrams and character trigrams are
+    hashed into a fixed number of signed buckets, then L2-normalised.
+    Good enough for lexical similarity over workout notes, and needs no network.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"[a-z0-9.]+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                matrix[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return matrix
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 1536):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI()
+        self.model = model
+        self.dim = dim
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dim)
+        return np.asarray([d.embedding for d in response.data], dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def _split_memories(content: str) -> list[str]:
+    # Supermemory extracts "memories" (facts) out of each document server side.
+    # Locally each non-empty line/sentence of the document is stored as one memory.
+    parts = [p.strip() for p in re.split(r"\n+|(?<=[.!?])\s+(?=[A-Z])", content)]
+    return [p for p in parts if len(p) > 3] or [content]
+
+
+_HIT_SOURCE = {"documents": "document", "memories": "memory"}
+
+
+class _Shard:
+    """
+    One user + activity + kind ("documents" or "memories") worth of embeddings.
+
+    Rows are appended to a raw float32 file (`<kind>.<dim>.f32`) that is read back through
+    np.memmap, with row metadata in a matching JSON lines file.
+    The methods do blocking file I/O and are called through asyncio.to_thread, so they lock against each other.
+    """
+
+    def __init__(self, directory: Path, kind: str, dim: int):
+        self.vectors_path = directory / f"{kind}.{dim}.f32"
+        self.meta_path = directory / f"{kind}.jsonl"
+        self.dim = dim
+        self._matrix: Optional[np.ndarray] = None
+        self._meta: list[dict] = []
+        self._lock = threading.Lock()
+
+    def append(self, vectors: np.ndarray, rows: list[dict]) -> None:
+        with self._lock:
+            self.vectors_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._matrix = None
+
+    def load(self) -> tuple[Optional[np.ndarray], list[dict]]:
+        with self._lock:
+            if self._matrix is None:
+                if not self.vectors_path.exists() or self.vectors_path.stat().st_size == 0:
+                    return None, []
+                rows = self.vectors_path.stat().st_size // (4 * self.dim)
+                self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+                with open(self.meta_path, encoding="utf-8") as f:
+                    self._meta = [json.loads(line) for line in f][:rows]
+            return self._matrix, self._meta
+
+
+class LocalVectorBackend(MemoryBackend):
+    """
+    Embedded vector store for offline runs, tests and benchmarks.
+
+    Embeddings are sharded on disk as `<root>/<user>/<activity>/`, so a search only touches the
+    matrix for one user and activity. Search is brute-force cosine similarity (rows are stored
+    normalised, so it is a single matrix-vector product) followed by an argpartition top-k.
+    """
+
+    def __init__(self, root: Optional[str] = None, embedder=None, min_score: float = 0.1):
+        self.root = Path(root or os.environ.get("LOCAL_MEMORY_DIR", ".local_memory"))
+        self.embedder = embedder or HashingEmbedder()
+        self.min_score = min_score
+        self._shards: dict[tuple[str, str, str], _Shard] = {}
+        self._lock = asyncio.Lock()
+
+    def _shard(self, userId: str, activity: str, kind: str) -> _Shard:
+        key = (userId.lower(), activity.lower(), kind)
+        if key not in self._shards:
+            directory = self.root / re.sub(r"[^a-z0-9_-]", "_", key[0]) / re.sub(r"[^a-z0-9_-]", "_", key[1])
+            self._shards[key] = _Shard(directory, kind, self.embedder.dim)
+        return self._shards[key]
+
+    async def add(self, content: str, activity: str, metadata: dict[str, str]) -> str:
+        document_id = uuid4().hex
+        memories = _split_memories(content)
+        vectors = _normalize_rows(await self.embedder.embed([content] + memories))
+        base = {**metadata, "activity": activity, "document_id": document_id}
+        async with self._lock:
+            await asyncio.to_thread(
+                self._shard(metadata["user"], activity, "documents").append,
+                vectors[:1], [{**base, "id": document_id, "content": content}],
+            )
+            await asyncio.to_thread(
+                self._shard(metadata["user"], activity, "memories").append,
+                vectors[1:], [{**base, "id": uuid4().hex, "content": memory} for memory in memories],
+            )
+        return document_id
+
+    async def _search(self, kind: str, userId: str, query: str, activity: str, limit: int, filters: Optional[dict[str, str]]) -> list[dict]:
+        shard = self._shard(userId, activity, kind)
+        matrix, meta = await asyncio.to_thread(shard.load)
+        if matrix is None or limit <= 0:
+            return []
+        query_vector = _normalize_rows(await self.embedder.embed([query]))[0]
+        return await asyncio.to_thread(self._top_hits, kind, matrix, meta, query_vector, limit, filters)
+
+    def _top_hits(self, kind: str, matrix: np.ndarray, meta: list[dict], query_vector: np.ndarray, limit: int, filters: Optional[dict[str, str]]) -> list[dict]:
+        # The matrix is a memmap, so scoring reads the shard from disk; runs in a worker thread.
+        scores = matrix @ query_vector
+        if filters:
+            mask = np.fromiter(
+                (all(row.get(key) == value for key, value in filters.items()) for row in meta),
+                dtype=bool,
+                count=len(meta),
+            )
+            scores = np.where(mask, scores, -np.inf)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": meta[i]["id"],
+                "source": _HIT_SOURCE[kind],
+                "score": float(scores[i]),
+                "date": meta[i].get("date"),
+                "content": meta[i]["content"],
+                "document_ids": [meta[i]["document_id"]],
+            }
+            for i in top
+            if scores[i] >= self.min_score
+        ]
+
+    async def search_documents(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        return await self._search("documents", userId, query, activity, limit, filters)
+
+    async def search_memories(self, userId: str, query: str, activity: str, limit: int = 5, filters: Optional[dict[str, str]] = None) -> list[dict]:
+        return await self._search("memories", userId, query, activity, limit, filters)
+
+
+def create_memory_backend(name: Optional[str] = None) -> MemoryBackend:
+    """Build the backend selected by MEMORY_BACKEND ("supermemory" by default, or "local")."""
+    name = (name or os.environ.get("MEMORY_BACKEND", "supermemory")).lower()
+    if name == "supermemory":
+        return SupermemoryBackend()
+    if name == "local":
+        embedder_name = os.environ.get("LOCAL_MEMORY_EMBEDDER", "hashing").lower()
+        embedder = OpenAIEmbedder() if embedder_name == "openai" else HashingEmbedder()
+        return LocalVectorBackend(embedder=embedder)
+    raise ValueError(f"Unknown MEMORY_BACKEND '{name}', expected 'supermemory' or 'local'.")
@@ -0,0 +1,137 @@
+# memory_ingestion.py
+# Background ingestion of completed workouts into Supermemory.
+# Requests only enqueue the workout, a small pool of worker tasks performs the
+# (slow) remote write with retries, so one slow memory write never blocks the event loop.
+import asyncio
+import os
+import random
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+from memory_management import WorkoutPayload, save_workout_to_memory
+
+load_dotenv()
+
+INGEST_QUEUE_SIZE = int(os.environ.get("MEMORY_INGEST_QUEUE_SIZE", "256"))
+INGEST_WORKERS = int(os.environ.get("MEMORY_INGEST_WORKERS", "4"))
+INGEST_MAX_RETRIES = int(os.environ.get("MEMORY_INGEST_MAX_RETRIES", "4"))
+INGEST_BACKOFF_SECONDS = float(os.environ.get("MEMORY_INGEST_BACKOFF_SECONDS", "0.5"))
+INGEST_MAX_BACKOFF_SECONDS = float(os.environ.get("MEMORY_INGEST_MAX_BACKOFF_SECONDS", "30"))
+# Bulk imports are queued in batches of this many workouts, one batch per queue slot.
+INGEST_BATCH_SIZE = int(os.environ.get("MEMORY_INGEST_BATCH_SIZE", "25"))
+
+
+class MemoryIngestionQueue:
+    """
+    Bounded in-process queue drained by `workers` asyncio tasks. Each queue slot holds a batch of workouts.
+
+    - enqueue() / enqueue_many() wait when the queue is full (backpressure instead of unbounded growth)
+    - failed writes are retried with exponential backoff + jitter
+    - flush() waits until everything enqueued so far has been written (or given up on)
+    """
+
+    def __init__(
+        self,
+        write: Callable[[WorkoutPayload], Awaitable[None]],
+        maxsize: int = INGEST_QUEUE_SIZE,
+        workers: int = INGEST_WORKERS,
+        max_retries: int = INGEST_MAX_RETRIES,
+        backoff_seconds: float = INGEST_BACKOFF_SECONDS,
+        max_backoff_seconds: float = INGEST_MAX_BACKOFF_SECONDS,
+    ):
+        self._write = write
+        self._maxsize = maxsize
+        self._worker_count = workers
+        self._max_retries = max_retries
+        self._backoff_seconds = backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._queue: Optional[asyncio.Queue[list[WorkoutPayload]]] = None
+        self._workers: list[asyncio.Task] = []
+        self.stats = {"enqueued": 0, "written": 0, "retried": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def pending(self) -> int:
+        """Number of queued batches."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        # The queue is created here so it binds to the server's running event loop.
+        self._queue = asyncio.Queue(maxsize=self._maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"memory-ingest-{i}")
+            for i in range(self._worker_count)
+        ]
+        print(f"🧠 Memory ingestion started with {self._worker_count} workers.")
+
+    async def enqueue(self, payload: WorkoutPayload) -> None:
+        await self.enqueue_many([payload])
+
+    async def enqueue_many(self, payloads: list[WorkoutPayload], batch_size: int = INGEST_BATCH_SIZE) -> None:
+        for start in range(0, len(payloads), batch_size):
+            batch = payloads[start:start + batch_size]
+            if not self.running or self._queue is None:
+                # No workers (e.g. lifespan not run): fall back to writing inline.
+                await self._write_batch(batch)
+                continue
+            await self._queue.put(batch)
+            self.stats["enqueued"] += len(batch)
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queue is drained. Returns False if the timeout expired first."""
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"⚠️ Memory ingestion flush timed out with {self.pending()} batches pending.")
+            return False
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        await self.flush(timeout=timeout)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        print("🧠 Memory ingestion stopped.", self.stats)
+
+    async def _worker(self, index: int) -> None:
+        assert self._queue is not None
+        while True:
+            batch = await self._queue.get()
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._queue.task_done()
+
+    async def _write_batch(self, batch: list[WorkoutPayload]) -> None:
+        for payload in batch:
+            await self._write_with_retries(payload)
+
+    async def _write_with_retries(self, payload: WorkoutPayload) -> None:
+        for attempt in range(self._max_retries + 1):
+            try:
+                await self._write(payload)
+                self.stats["written"] += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self._max_retries:
+                    self.stats["failed"] += 1
+                    print(f"error: giving up on memory write for user {payload.userId} after {attempt + 1} attempts - {e}")
+                    return
+                delay = min(self._max_backoff_seconds, self._backoff_seconds * (2 ** attempt))
+                delay *= random.uniform(0.5, 1.0)
+                self.stats["retried"] += 1
+                print(f"⚠️ Memory write failed (attempt {attempt + 1}), retrying in {delay:.2f}s - {e}")
+                await asyncio.sleep(delay)
+
+
+ingestion_queue = MemoryIngestionQueue(save_workout_to_memory)
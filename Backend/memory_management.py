@@ -1,75 +1,220 @@
-from supermemory import Supermemory 
+import asyncio
 import os 
+import re
+import time
+from collections import OrderedDict
 from pydantic import BaseModel
-from typing import Union
+from typing import List, Optional, Union
 from uuid import UUID
 from dotenv import load_dotenv 
 import json 
 from completed_workouts_model import CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO
 from models import CoordinatorAgentContext
+from memory_backends import MemoryBackend, create_memory_backend
+from instrumentation import memory_call_seconds
 
 
 load_dotenv()
 
-client = Supermemory(api_key=os.environ.get("SUPERMEMORY_API_KEY")) 
+# Where workout memories live, picked with the MEMORY_BACKEND env var (see memory_backends.py).
+backend: MemoryBackend = create_memory_backend()
+
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Words coaches add to a query that don't change what the vector search finds
+# ("running" vs "running history" vs "show me my running workouts"). Time qualifiers like "last" or "recent"
+# do change it, so they are kept, and so is the word order.
+_QUERY_FILLER_WORDS = {"a", "an", "history", "me", "my", "of", "show", "the", "user", "users", "workout", "workouts"}
+
+def normalize_search_query(query: str, activity: str) -> str:
+    words = [w for w in re.findall(r"[a-z0-9.]+", query.lower()) if w not in _QUERY_FILLER_WORDS]
+    return " ".join(words) or activity.lower()
+
+class SearchCache:
+    """
+    Per-user cache of workout-history search results.
+
+    Keyed on (userId, activity, normalized query, limit). Entries expire after `ttl_seconds`,
+    and the least recently used ones are evicted once either `max_entries` or `max_bytes`
+    (estimated from the serialized result size) is exceeded.
+    """
+
+    def __init__(self, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[float, int, list[dict]]] = OrderedDict()
+        self._keys_by_scope: dict[tuple[str, str], set[tuple]] = {}
+        # Bumped on every invalidation, so a search that started before it can't store its now stale results.
+        self._generations: dict[tuple[str, str], int] = {}
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_skipped": 0}
+
+    @staticmethod
+    def make_key(userId: str, activity: str, query: str, limit: int) -> tuple:
+        return (userId.lower(), activity.lower(), normalize_search_query(query, activity), limit)
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def generation(self, key: tuple) -> int:
+        """Read before searching and pass to set(), which skips the write if the scope was invalidated since."""
+        return self._generations.get(key[:2], 0)
+
+    def set(self, key: tuple, value: list[dict], generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation(key):
+            self.stats["stale_skipped"] += 1
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._keys_by_scope.setdefault(key[:2], set()).add(key)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, userId: str, activity: str) -> None:
+        scope = (userId.lower(), activity.lower())
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+        for key in self._keys_by_scope.pop(scope, set()):
+            if key in self._entries:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_scope.clear()
+        self._bytes = 0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    def _remove(self, key: tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        scope = self._keys_by_scope.get(key[:2])
+        if scope is not None:
+            scope.discard(key)
+            if not scope:
+                del self._keys_by_scope[key[:2]]
+
+search_cache = SearchCache()
 
 class WorkoutPayload(BaseModel):
     userId: UUID
     #allow one of the two workout types
     workout: Union[CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO]  
     coordinatorContext: CoordinatorAgentContext
+    # The user context version coordinatorContext is based on (the last ETag / contextVersion the client got).
+    contextVersion: Optional[int] = None
 
-def save_workout_to_memory(workoutPayload: WorkoutPayload):
-    client = Supermemory(api_key=os.environ.get("SUPERMEMORY_API_KEY"))
-    workoutMemory = f"user_{workoutPayload.userId}: \n{workoutPayload.workout.model_dump(mode="python")}"
-
-    result = client.memories.add(
-        content = workoutMemory,
-        container_tags = [
-            f"{workoutPayload.workout.activity}"
-        ],
-        metadata= {
-            "user": str(workoutPayload.userId),
-            "date": str(workoutPayload.workout.date.year) + "-" + str(workoutPayload.workout.date.month) + "-" + str(workoutPayload.workout.date.day),
-            "activity": workoutPayload.workout.activity
-            }
-    )
-    print(result)
-
-def search_workout_documents(userId: str, query: str, activity: str, limit: int = 5) -> str: 
-    results = client.search.documents(
-        q=query,
-        limit=limit,
-        document_threshold=0.4,
-        chunk_threshold=0.4,
-        rerank=True,
-        rewrite_query=True,
-        include_full_docs=True,
-        include_summary=True,
-        only_matching_chunks=False,
-        container_tags=[activity],
-        filters={
-            "AND": [{"key" : "user", "value" : userId}]
-        }
-    )
-    print("🔎📄 Searched documents and found ", len(results.results), " results.")
-    return json.dumps(results.model_dump(), indent=2)
-
-def search_workout_memories(userId: str, query: str, activity: str, limit: int = 5):
+class BulkWorkoutPayload(BaseModel):
+    userId: UUID
+    workouts: List[Union[CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO]]
+    coordinatorContext: CoordinatorAgentContext
+    contextVersion: Optional[int] = None
 
-    filters = {
-        "AND": [
-            {"key": "user", "value": userId}
+    def as_workout_payloads(self) -> List[WorkoutPayload]:
+        return [
+            WorkoutPayload(userId=self.userId, workout=workout, coordinatorContext=self.coordinatorContext, contextVersion=self.contextVersion)
+            for workout in self.workouts
         ]
-    }
-
-    results = client.search.memories(
-        q=query,
-        container_tag=activity,
-        limit=limit,
-        threshold=0.5,
-        rerank=True,
-        filters= filters, 
+
+async def save_workout_to_memory(workoutPayload: WorkoutPayload):
+    workout = workoutPayload.workout
+    workoutMemory = f"user_{workoutPayload.userId}: \n{workout.model_dump_json()}"
+
+    with memory_call_seconds.time(backend=type(backend).__name__, operation="add"):
+        document_id = await backend.add(
+            content = workoutMemory,
+            activity = workout.activity,
+            metadata= {
+                "user": str(workoutPayload.userId),
+                "date": str(workout.date.year) + "-" + str(workout.date.month) + "-" + str(workout.date.day),
+                "activity": workout.activity
+                }
+        )
+    # The new workout changes what this user's searches for this activity should return.
+    search_cache.invalidate(str(workoutPayload.userId), workout.activity)
+    print("🧠 Saved workout memory ", document_id)
+
+async def close_memory_client():
+    await backend.close()
+
+async def search_workout_documents(userId: str, query: str, activity: str, limit: int = 5) -> list[dict]: 
+    with memory_call_seconds.time(backend=type(backend).__name__, operation="search_documents"):
+        results = await backend.search_documents(userId=userId, query=query, activity=activity, limit=limit)
+    print("🔎📄 Searched documents and found ", len(results), " results.")
+    return results
+
+async def search_workout_memories(userId: str, query: str, activity: str, limit: int = 5) -> list[dict]:
+    with memory_call_seconds.time(backend=type(backend).__name__, operation="search_memories"):
+        results = await backend.search_memories(userId=userId, query=query, activity=activity, limit=limit)
+    print("🔎🧠 Searched memories and found ", len(results), " results.")
+    return results
+
+def _content_key(content: str) -> str:
+    return " ".join(content.lower().split())
+
+def merge_search_results(*result_sets: list[dict], limit: int) -> list[dict]:
+    """
+    Merge document and memory hits into one list ordered by score (best first).
+    Hits that point at the same source document, or carry the same text, are collapsed
+    into the highest scoring one.
+    """
+    hits = sorted((h for results in result_sets for h in results), key=lambda h: h["score"], reverse=True)
+    seen_documents: set[str] = set()
+    seen_content: set[str] = set()
+    merged = []
+    for hit in hits:
+        content_key = _content_key(hit["content"])
+        if content_key in seen_content or any(d in seen_documents for d in hit["document_ids"]):
+            continue
+        seen_content.add(content_key)
+        seen_documents.update(hit["document_ids"])
+        merged.append({
+            "source": hit["source"],
+            "score": round(hit["score"], 3),
+            "date": hit["date"],
+            "content": hit["content"],
+        })
+        if len(merged) >= limit:
+            break
+    return merged
+
+async def search_workout_history(userId: str, query: str, activity: str, limit: int = 5) -> list[dict]:
+    """
+    Run the document and memory searches concurrently and merge them into one de-duplicated list.
+    Results are served from `search_cache` when the same user asked an equivalent query recently.
+    """
+    cache_key = SearchCache.make_key(userId, activity, query, limit)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        print("🔎⚡ Search cache hit for ", cache_key)
+        return cached
+    generation = search_cache.generation(cache_key)
+    documents, memories = await asyncio.gather(
+        search_workout_documents(userId=userId, query=query, activity=activity, limit=limit),
+        search_workout_memories(userId=userId, query=query, activity=activity, limit=limit),
     )
-    print("🔎🧠 Searched memories and found ", len(results.results), " results.")
-    return json.dumps(results.model_dump(), indent=2)
\ No newline at end of file
+    merged = merge_search_results(documents, memories, limit=limit)
+    search_cache.set(cache_key, merged, generation=generation)
+    return merged
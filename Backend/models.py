@@ -1,5 +1,5 @@
 #models.py
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, PrivateAttr, field_validator
 from uuid import UUID
 from datetime import datetime, timezone, timedelta
 from enum import Enum
@@ -67,7 +67,11 @@ class CoordinatorAgentContext(BaseModel):
     goals: List[UserDefinedGoal]
     currentTrainingPlan: List[DailyWorkoutDTO]
     activityFitnessLevels: List[FitnessLevel]
-   
+    # plan_index.PlanIndex over currentTrainingPlan, built lazily by plan_index.plan_index().
+    _plan_index: Any = PrivateAttr(default=None)
+    # Run scoped memoization, see run_cache.py. _version is bumped on every edit made by a tool.
+    _run_cache: dict = PrivateAttr(default_factory=dict)
+    _version: int = PrivateAttr(default=0)
 
     @field_validator("userId", mode="after")
     @classmethod
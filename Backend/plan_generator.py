@@ -0,0 +1,216 @@
+# plan_generator.py
+# Deterministic periodized training plans.
+# The weeks up to a goal's deadline are split into base / build / peak / taper blocks, the weekly volume is
+# progressed through them (with a recovery week every RECOVERY_EVERY_WEEKS), and each week gets a session mix for
+# its block. The agents only choose the parameters; the sessions come out of here as validated DTOs, so a
+# 16 week plan costs one short tool call instead of the model writing out every session as JSON.
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from planned_workouts_model import AnyWorkoutSessionDTO, ClimbRouteDTO, ClimbingWorkoutDTO, RunningWorkoutDTO
+
+BASE, BUILD, PEAK, TAPER = "base", "build", "peak", "taper"
+RECOVERY_EVERY_WEEKS = 4
+RECOVERY_VOLUME = 0.7
+# Weekly volume change per block (fraction of the previous week).
+WEEKLY_PROGRESSION = {BASE: 0.08, BUILD: 0.05, PEAK: 0.0}
+# Taper weeks, last one first: share of the peak volume.
+TAPER_VOLUME = (0.5, 0.7)
+# Never plan more than this multiple of the starting volume.
+MAX_VOLUME_INCREASE = 1.6
+# Climbs per week a climbing plan starts from.
+CLIMBING_WEEKLY_CLIMBS = 30
+# Climbing sessions list this many target routes at most; the description carries the full count.
+MAX_LISTED_ROUTES = 6
+
+# Days of the week (0 = first day of the plan week) used for 1-7 sessions, spread out so hard days don't stack.
+SESSION_DAYS = {
+    1: (5,),
+    2: (1, 5),
+    3: (1, 3, 5),
+    4: (0, 2, 4, 5),
+    5: (0, 1, 3, 4, 6),
+    6: (0, 1, 2, 3, 4, 6),
+    7: (0, 1, 2, 3, 4, 5, 6),
+}
+
+V_GRADES = [f"V{n}" for n in range(18)]
+YDS_GRADES = [f"5.{n}" for n in range(4, 10)] + [f"5.{n}{letter}" for n in range(10, 16) for letter in "abcd"]
+
+
+class PlanGeneratorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PlanWeek:
+    number: int  # 1 based
+    start: date
+    phase: str
+    recovery: bool
+    volume: float  # km for running, routes for climbing
+
+
+def periodize(weeks: int) -> list[str]:
+    """The block each week belongs to, e.g. 16 weeks -> 7 base, 5 build, 2 peak, 2 taper."""
+    if weeks < 1:
+        raise PlanGeneratorError("the plan needs at least one week")
+    taper = 0 if weeks < 3 else 1 if weeks < 8 else 2
+    peak = 0 if weeks < 4 else max(1, round(weeks * 0.15))
+    build = round((weeks - taper - peak) * 0.45)
+    base = weeks - taper - peak - build
+    return [BASE] * base + [BUILD] * build + [PEAK] * peak + [TAPER] * taper
+
+
+def plan_weeks(start: date, deadline: date, starting_volume: float) -> list[PlanWeek]:
+    """Weeks from `start` up to and including `deadline`, with their block and planned volume."""
+    if deadline < start:
+        raise PlanGeneratorError(f"the deadline {deadline} is before the start {start}")
+    weeks = (deadline - start).days // 7 + 1
+    phases = periodize(weeks)
+    cap = starting_volume * MAX_VOLUME_INCREASE
+    plan: list[PlanWeek] = []
+    volume = peak_volume = starting_volume
+    for i, phase in enumerate(phases):
+        recovery = phase in (BASE, BUILD) and (i + 1) % RECOVERY_EVERY_WEEKS == 0
+        if phase == TAPER:
+            week_volume = peak_volume * TAPER_VOLUME[min(len(phases) - 1 - i, len(TAPER_VOLUME) - 1)]
+        elif recovery:
+            week_volume = volume * RECOVERY_VOLUME
+        else:
+            if i > 0:
+                volume = min(cap, volume * (1 + WEEKLY_PROGRESSION[phase]))
+            week_volume = peak_volume = volume
+        plan.append(PlanWeek(number=i + 1, start=start + timedelta(weeks=i), phase=phase, recovery=recovery, volume=week_volume))
+    return plan
+
+
+def _session_dates(week: PlanWeek, sessions_per_week: int, deadline: date) -> list[date]:
+    if not 1 <= sessions_per_week <= 7:
+        raise PlanGeneratorError("sessions_per_week must be between 1 and 7")
+    return [week.start + timedelta(days=d) for d in SESSION_DAYS[sessions_per_week] if week.start + timedelta(days=d) <= deadline]
+
+
+def _week_label(week: PlanWeek) -> str:
+    return f"Week {week.number}, {week.phase}{' (recovery)' if week.recovery else ''}"
+
+
+### Running
+
+# Session types per block, hardest first. The remaining runs of the week are easy runs.
+RUNNING_QUALITY = {BASE: ["strides"], BUILD: ["tempo", "intervals"], PEAK: ["race_pace", "intervals"], TAPER: ["race_pace"]}
+# (share of max HR, pace as a multiple of the easy pace)
+RUNNING_INTENSITY = {
+    "easy": (0.72, 1.0),
+    "long": (0.75, 1.03),
+    "strides": (0.75, 0.98),
+    "tempo": (0.86, 0.88),
+    "intervals": (0.92, 0.80),
+    "race_pace": (0.88, 0.85),
+    "race": (0.90, 0.85),
+}
+RUNNING_DESCRIPTIONS = {
+    "easy": "Easy run, conversational pace.",
+    "long": "Long run, relaxed and steady.",
+    "strides": "Easy run with 6 x 20 s strides at the end.",
+    "tempo": "Tempo run: 10 min easy, 20-30 min comfortably hard, 10 min easy.",
+    "intervals": "Intervals: 5-6 x 3 min hard with 2 min jog recoveries.",
+    "race_pace": "Race pace practice: 3 x 10 min at goal pace with 3 min easy between.",
+    "race": "Goal race.",
+}
+
+
+def _running_session(kind: str, km: float, week: PlanWeek, easy_pace: float, max_hr: int, elevation_per_km: float) -> AnyWorkoutSessionDTO:
+    hr_share, pace_factor = RUNNING_INTENSITY[kind]
+    km = round(max(km, 2.0), 1)
+    return AnyWorkoutSessionDTO(RunningWorkoutDTO(
+        sessionDescription=f"{_week_label(week)}. {RUNNING_DESCRIPTIONS[kind]}",
+        distanceKm=km,
+        heartRate=round(max_hr * hr_share),
+        elevationGain=round(km * elevation_per_km),
+        paceMinPerKm=round(easy_pace * pace_factor),
+    ))
+
+
+def running_plan(start: date, deadline: date, weekly_km: float, runs_per_week: int,
+                 easy_pace_sec_per_km: float = 360, max_hr: int = 190, elevation_per_km: float = 10,
+                 race_distance_km: Optional[float] = None) -> list[tuple[date, AnyWorkoutSessionDTO]]:
+    """
+    (date, session) pairs from `start` to `deadline`. The last run of the week is the long run (about 30% of the
+    week's km, and at least as long as any other run), quality sessions follow the block, the rest are easy. With `race_distance_km` the deadline is the race.
+    """
+    sessions: list[tuple[date, AnyWorkoutSessionDTO]] = []
+    for week in plan_weeks(start, deadline, weekly_km):
+        days = _session_dates(week, runs_per_week, deadline)
+        if race_distance_km and week.start <= deadline < week.start + timedelta(weeks=1):
+            days = [d for d in days if d < deadline]
+            sessions.append((deadline, _running_session("race", race_distance_km, week, easy_pace_sec_per_km, max_hr, elevation_per_km)))
+        if not days:
+            continue
+        kinds = ["easy"] * len(days)
+        if len(days) > 1:
+            kinds[-1] = "long"
+        quality = [] if week.recovery else RUNNING_QUALITY[week.phase]
+        for slot, kind in zip(range(len(days) - (len(days) > 1)), quality):
+            kinds[slot] = kind
+        # About 30% of the week, but never shorter than the other runs when there are few of them.
+        long_km = max(week.volume * 0.3, week.volume / len(days))
+        other_km = (week.volume - long_km) / max(len(days) - 1, 1)
+        for day, kind in zip(days, kinds):
+            km = long_km if kind == "long" or len(days) == 1 else other_km
+            sessions.append((day, _running_session(kind, km, week, easy_pace_sec_per_km, max_hr, elevation_per_km)))
+    return sorted(sessions, key=lambda pair: pair[0])
+
+
+### Climbing
+
+# (description, grade offsets from the project grade for the routes, share of the week's routes)
+CLIMBING_SESSIONS = {
+    "volume": ("Volume / endurance: lots of mileage well below your limit, focus on smooth movement.", (-4, -3, -3, -2), 1.2),
+    "technique": ("Technique: footwork and body position drills on moderate terrain.", (-3, -2), 0.8),
+    "strength": ("Strength: limit bouldering, long rests, stop when power drops.", (-1, 0, 0), 0.6),
+    "power_endurance": ("Power endurance: 4x4s or linked problems near your limit.", (-2, -1, -1), 1.0),
+    "projecting": ("Projecting: work the goal grade, full rest between attempts.", (-1, 0, 1), 0.5),
+    "light": ("Light session: stay fresh, a few moderate climbs only.", (-3, -2), 0.6),
+}
+CLIMBING_MIX = {
+    BASE: ["volume", "technique", "volume"],
+    BUILD: ["strength", "power_endurance", "volume"],
+    PEAK: ["projecting", "strength", "power_endurance"],
+    TAPER: ["projecting", "light"],
+}
+
+
+def _grade_ladder(project_grade: str) -> tuple[str, list[str], int]:
+    grade = project_grade.strip()
+    for scale, ladder in (("v", V_GRADES), ("yds", YDS_GRADES)):
+        normalized = grade.upper() if scale == "v" else grade.lower()
+        if normalized in ladder:
+            return scale, ladder, ladder.index(normalized)
+    raise PlanGeneratorError(f"unknown grade '{project_grade}', use V0-V17 or 5.4-5.15d")
+
+
+def climbing_plan(start: date, deadline: date, sessions_per_week: int, project_grade: str,
+                  routes_per_week: int = CLIMBING_WEEKLY_CLIMBS) -> list[tuple[date, AnyWorkoutSessionDTO]]:
+    """(date, session) pairs from `start` to `deadline`, with target routes graded relative to `project_grade`."""
+    scale, ladder, project = _grade_ladder(project_grade)
+    sessions: list[tuple[date, AnyWorkoutSessionDTO]] = []
+    for week in plan_weeks(start, deadline, routes_per_week):
+        days = _session_dates(week, sessions_per_week, deadline)
+        mix = ["light"] * len(days) if week.recovery else CLIMBING_MIX[week.phase]
+        kinds = [mix[i % len(mix)] for i in range(len(days))]
+        weights = [CLIMBING_SESSIONS[kind][2] for kind in kinds]
+        for day, kind, weight in zip(days, kinds, weights):
+            description, offsets, _ = CLIMBING_SESSIONS[kind]
+            count = max(1, round(week.volume * weight / sum(weights)))
+            grades = [ladder[min(max(project + offsets[i % len(offsets)], 0), len(ladder) - 1)] for i in range(min(count, MAX_LISTED_ROUTES))]
+            routes = [
+                ClimbRouteDTO(gradeValue={"scale": scale, "value": grade}, shortDescription=f"{kind.replace('_', ' ').capitalize()} climb {i + 1}")
+                for i, grade in enumerate(sorted(grades, key=ladder.index))
+            ]
+            sessions.append((day, AnyWorkoutSessionDTO(ClimbingWorkoutDTO(
+                sessionDescription=f"{_week_label(week)}. {description} ~{count} climbs.",
+                routes=routes,
+            ))))
+    return sessions
@@ -0,0 +1,129 @@
+# plan_index.py
+# Index over CoordinatorAgentContext.currentTrainingPlan for the plan tools.
+#   session id -> (day, position in day.sessions)   dict, O(1)
+#   date       -> day                                bisect over the sorted day dates, O(log n)
+# The plan itself stays a plain list of DailyWorkoutDTO (that is what the client sends and gets back),
+# kept sorted by date so the bisect lookups hold.
+import bisect
+from datetime import date, datetime, time, timezone
+from typing import Optional, Union
+from uuid import UUID, uuid4
+
+from models import CoordinatorAgentContext
+from planned_workouts_model import AnyWorkoutSessionDTO, DailyWorkoutDTO, derived_session_id
+
+
+class PlanIndexError(ValueError):
+    pass
+
+
+def _as_datetime(when: Union[date, datetime]) -> datetime:
+    if isinstance(when, datetime):
+        return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+    return datetime.combine(when, time(), tzinfo=timezone.utc)
+
+
+def _day_key(when: Union[date, datetime]) -> date:
+    return _as_datetime(when).astimezone(timezone.utc).date()
+
+
+class PlanIndex:
+    def __init__(self, plan: list[DailyWorkoutDTO]):
+        self.plan = plan
+        keys = [_day_key(day.date) for day in plan]
+        if any(a > b for a, b in zip(keys, keys[1:])):
+            # Sorted in place, so the context keeps the same list object.
+            plan.sort(key=lambda day: _day_key(day.date))
+            keys.sort()
+        self._keys = keys
+        self._sessions: dict[UUID, tuple[DailyWorkoutDTO, int]] = {}
+        for day in plan:
+            self._index_day(day)
+
+    def _index_day(self, day: DailyWorkoutDTO, start: int = 0) -> None:
+        for position in range(start, len(day.sessions)):
+            self._sessions[day.sessions[position].id] = (day, position)
+
+    def _day_position(self, day: DailyWorkoutDTO) -> int:
+        key = _day_key(day.date)
+        lo, hi = bisect.bisect_left(self._keys, key), bisect.bisect_right(self._keys, key)
+        for i in range(lo, hi):
+            if self.plan[i] is day:
+                return i
+        raise PlanIndexError(f"day {key} is not in the plan")
+
+    ### Lookups
+
+    def find(self, session_id: UUID) -> tuple[DailyWorkoutDTO, int]:
+        """(day, position in day.sessions) of a planned session."""
+        try:
+            return self._sessions[session_id]
+        except KeyError:
+            raise PlanIndexError(f"no planned session with id {session_id}") from None
+
+    def day_for(self, when: Union[date, datetime]) -> Optional[DailyWorkoutDTO]:
+        key = _day_key(when)
+        i = bisect.bisect_left(self._keys, key)
+        return self.plan[i] if i < len(self._keys) and self._keys[i] == key else None
+
+    def days_between(self, start: Optional[Union[date, datetime]] = None, end: Optional[Union[date, datetime]] = None) -> list[DailyWorkoutDTO]:
+        """Days from `start` to `end`, both inclusive."""
+        lo = bisect.bisect_left(self._keys, _day_key(start)) if start else 0
+        hi = bisect.bisect_right(self._keys, _day_key(end)) if end else len(self._keys)
+        return self.plan[lo:hi]
+
+    ### Edits
+
+    def insert(self, session: AnyWorkoutSessionDTO, when: Union[date, datetime]) -> DailyWorkoutDTO:
+        """
+        Add a session to the day for `when`, creating that day in date order if the plan doesn't have it.
+        A session built without an id gets the derived id, the same one it will have when the client sends it back.
+        """
+        if "id" not in session.root.model_fields_set:
+            session.root.id = derived_session_id(_as_datetime(when), session.root, self._sessions)
+        if session.id in self._sessions:
+            raise PlanIndexError(f"a planned session with id {session.id} already exists")
+        day = self.day_for(when)
+        if day is None:
+            key = _day_key(when)
+            i = bisect.bisect_left(self._keys, key)
+            day = DailyWorkoutDTO(tracking_id=uuid4(), date=_as_datetime(when), sessions=[])
+            self.plan.insert(i, day)
+            self._keys.insert(i, key)
+        day.sessions.append(session)
+        self._sessions[session.id] = (day, len(day.sessions) - 1)
+        return day
+
+    def update(self, session: AnyWorkoutSessionDTO) -> DailyWorkoutDTO:
+        """Replace the session with the same id, in place."""
+        day, position = self.find(session.id)
+        day.sessions[position] = session
+        return day
+
+    def delete(self, session_id: UUID) -> AnyWorkoutSessionDTO:
+        """Remove a session. A day left without sessions is removed from the plan too."""
+        day, position = self.find(session_id)
+        session = day.sessions.pop(position)
+        del self._sessions[session_id]
+        self._index_day(day, start=position)
+        if not day.sessions:
+            i = self._day_position(day)
+            del self.plan[i]
+            del self._keys[i]
+        return session
+
+    def move(self, session_id: UUID, when: Union[date, datetime]) -> DailyWorkoutDTO:
+        session = self.delete(session_id)
+        return self.insert(session, when)
+
+
+def plan_index(context: CoordinatorAgentContext) -> PlanIndex:
+    """
+    The PlanIndex for this context, built on first use and reused for the rest of the run.
+    Rebuilt if currentTrainingPlan was replaced (patch_context / update_context assign a new list).
+    """
+    index = context._plan_index
+    if index is None or index.plan is not context.currentTrainingPlan or len(index._keys) != len(context.currentTrainingPlan):
+        index = PlanIndex(context.currentTrainingPlan)
+        context._plan_index = index
+    return index
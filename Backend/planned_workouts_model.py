@@ -3,9 +3,9 @@
 from __future__ import annotations
 
 from typing import List, Literal, Union, Any, Dict, Annotated
-from uuid import UUID, uuid4
+from uuid import UUID, uuid4, uuid5
 from datetime import datetime, timezone, timedelta
-from pydantic import BaseModel, Field, field_validator, RootModel
+from pydantic import BaseModel, Field, field_validator, model_validator, RootModel
 import json
 
 from grades_model import GradeValueModel
@@ -28,7 +28,11 @@ class WorkoutSessionDTO(BaseModel):
     Mirrors the Swift protocol WorkoutSessionDTO:
       - var sessionDescription: String { get set }
       - var activity: ActivityTypeEnum { get }
+
+    Sessions sent without an `id` (the iOS client doesn't track one yet) get one derived from their day and content
+    when the day is parsed, see derived_session_id.
     """
+    id: UUID = Field(default_factory=uuid4)
     sessionDescription: str
     activity: ActivityTypeEnum
 
@@ -113,6 +117,10 @@ class AnyWorkoutSessionDTO(RootModel[AnyWorkoutSessionPayload]):
 
     # Convenience accessors like the Swift computed properties
 
+    @property
+    def id(self) -> UUID:
+        return self.root.id
+
     @property
     def activity(self) -> ActivityTypeEnum:
         return self.root.activity
@@ -126,6 +134,27 @@ class AnyWorkoutSessionDTO(RootModel[AnyWorkoutSessionPayload]):
         self.root.sessionDescription = value
 
 
+# ----------------------------
+# Session ids
+# The client doesn't store session ids, so the whole plan comes in without them on every request. Instead of a
+# random id per request, a session gets a uuid5 of its day, activity and description: the same plan sent again
+# gets the same ids, and the model can use an id it saw earlier in the conversation. Editing or moving a session
+# gives it a new id from the next request on.
+# ----------------------------
+
+SESSION_ID_NAMESPACE = UUID("5b0c7d52-9a4e-4f43-8d3a-1f6f2c1e9b7a")
+
+
+def derived_session_id(day: datetime, session: WorkoutSessionDTO, taken: Any) -> UUID:
+    """The id for a session planned on `day`. Identical sessions on the same day are numbered, skipping ids in `taken`."""
+    day = day if day.tzinfo else day.replace(tzinfo=timezone.utc)
+    key = f"{day.astimezone(timezone.utc).date().isoformat()}/{session.activity}/{session.sessionDescription}"
+    n = 0
+    while (session_id := uuid5(SESSION_ID_NAMESPACE, f"{key}/{n}")) in taken:
+        n += 1
+    return session_id
+
+
 # ----------------------------
 # Container model
 # Mirrors DailyWorkoutDTO in Swift
@@ -161,6 +190,16 @@ class DailyWorkoutDTO(BaseModel):
         # 3) Already a datetime
         return v
 
+    @model_validator(mode="after")
+    def _assign_session_ids(self):
+        # Sessions that came without an id (model_fields_set) got a random one; replace it with the derived id.
+        taken = {session.id for session in self.sessions if "id" in session.root.model_fields_set}
+        for session in self.sessions:
+            if "id" not in session.root.model_fields_set:
+                session.root.id = derived_session_id(self.date, session.root, taken)
+                taken.add(session.root.id)
+        return self
+
     def to_swift_json_obj(
         self,
         *,
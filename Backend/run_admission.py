@@ -0,0 +1,184 @@
+# run_admission.py
+# Admission control in front of Runner.run.
+# Caps how many agent runs the process has in flight (each one holds model calls open), queues the rest by
+# priority, and turns them away with a 429 + Retry-After once the queue is full instead of letting latency pile up.
+# Interactive chat turns always go before background work (fitness re-evaluations, bulk imports), and a few slots
+# are kept free for them. Within a priority, waiting users are served round robin, so one busy user can't starve
+# the others.
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+AGENT_MAX_CONCURRENT_RUNS = int(os.environ.get("AGENT_MAX_CONCURRENT_RUNS", "8"))
+# Slots background runs may never take, so a chat turn doesn't wait behind a wave of re-evaluations.
+AGENT_RESERVED_INTERACTIVE_RUNS = int(os.environ.get("AGENT_RESERVED_INTERACTIVE_RUNS", "2"))
+# Runs for one user edit the same context and are serialized anyway, so one at a time keeps them from holding slots.
+AGENT_MAX_RUNS_PER_USER = int(os.environ.get("AGENT_MAX_RUNS_PER_USER", "1"))
+AGENT_MAX_QUEUED_INTERACTIVE_RUNS = int(os.environ.get("AGENT_MAX_QUEUED_INTERACTIVE_RUNS", "32"))
+AGENT_MAX_QUEUED_BACKGROUND_RUNS = int(os.environ.get("AGENT_MAX_QUEUED_BACKGROUND_RUNS", "200"))
+AGENT_MAX_QUEUED_RUNS_PER_USER = int(os.environ.get("AGENT_MAX_QUEUED_RUNS_PER_USER", "4"))
+# How long a request waits for a slot before it is answered with a 429.
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("AGENT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AgentRunScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = AGENT_MAX_CONCURRENT_RUNS,
+        reserved_interactive: int = AGENT_RESERVED_INTERACTIVE_RUNS,
+        max_per_user: int = AGENT_MAX_RUNS_PER_USER,
+        max_queued_interactive: int = AGENT_MAX_QUEUED_INTERACTIVE_RUNS,
+        max_queued_background: int = AGENT_MAX_QUEUED_BACKGROUND_RUNS,
+        max_queued_per_user: int = AGENT_MAX_QUEUED_RUNS_PER_USER,
+        queue_timeout_seconds: float = AGENT_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.reserved_interactive = min(reserved_interactive, max_concurrent - 1)
+        self.max_per_user = max_per_user
+        self.max_queued = {INTERACTIVE: max_queued_interactive, BACKGROUND: max_queued_background}
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._running = 0
+        self._running_by_user: dict[str, int] = {}
+        # priority -> user -> that user's waiters, oldest first. Users are rotated to the back when served.
+        self._waiting: dict[int, OrderedDict[str, deque[asyncio.Future]]] = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self._queued = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._queued_by_user: dict[str, int] = {}
+        self._average_run_seconds = 10.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "running": self._running,
+            "waiting": {PRIORITY_NAMES[priority]: count for priority, count in self._queued.items()},
+            "average_run_seconds": round(self._average_run_seconds, 3),
+        }
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued run would start: the backlog divided over the slots."""
+        backlog = self._running + sum(self._queued.values())
+        return max(1, math.ceil(self._average_run_seconds * backlog / self.max_concurrent))
+
+    def check(self, userId: str, priority: int) -> None:
+        """Raise AdmissionRejected if a run for this user and priority would be turned away right now."""
+        user = userId.lower()
+        if self._can_start(user, priority) and not self._waiting[priority]:
+            return
+        if self._queued[priority] >= self.max_queued[priority]:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(f"too many {PRIORITY_NAMES[priority]} agent runs queued", self.retry_after())
+        if self._queued_by_user.get(user, 0) >= self.max_queued_per_user:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected("too many agent runs queued for this user", self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, userId: str, priority: int, reject: bool = True) -> AsyncIterator[None]:
+        """
+        Hold one agent run slot for the block. With `reject` (request handlers), a full queue or waiting longer than
+        AGENT_QUEUE_TIMEOUT_SECONDS raises AdmissionRejected; without it (already accepted background jobs) it waits.
+        """
+        user = userId.lower()
+        if reject:
+            self.check(user, priority)
+        if self._can_start(user, priority) and not self._waiting[priority]:
+            self._start(user)
+        else:
+            await self._wait_for_slot(user, priority, reject)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._average_run_seconds = 0.8 * self._average_run_seconds + 0.2 * (time.monotonic() - started)
+            self._release(user)
+
+    async def _wait_for_slot(self, user: str, priority: int, reject: bool) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting[priority].setdefault(user, deque()).append(waiter)
+        self._queued[priority] += 1
+        self._queued_by_user[user] = self._queued_by_user.get(user, 0) + 1
+        self.stats["queued"] += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_seconds if reject else None)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted at the same moment; hand the slot on.
+                self._release(user)
+            else:
+                waiter.cancel()
+                self._forget(user, priority, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timed_out"] += 1
+                raise AdmissionRejected("timed out waiting for an agent run slot", self.retry_after()) from None
+            raise
+        finally:
+            self._queued[priority] -= 1
+            self._queued_by_user[user] -= 1
+            if not self._queued_by_user[user]:
+                del self._queued_by_user[user]
+
+    def _can_start(self, user: str, priority: int) -> bool:
+        limit = self.max_concurrent - (self.reserved_interactive if priority == BACKGROUND else 0)
+        return self._running < limit and self._running_by_user.get(user, 0) < self.max_per_user
+
+    def _start(self, user: str) -> None:
+        self._running += 1
+        self._running_by_user[user] = self._running_by_user.get(user, 0) + 1
+        self.stats["admitted"] += 1
+
+    def _release(self, user: str) -> None:
+        self._running -= 1
+        self._running_by_user[user] -= 1
+        if not self._running_by_user[user]:
+            del self._running_by_user[user]
+        self._dispatch()
+
+    def _forget(self, user: str, priority: int, waiter: asyncio.Future) -> None:
+        waiters = self._waiting[priority].get(user)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._waiting[priority][user]
+
+    def _dispatch(self) -> None:
+        """Start as many waiters as the limits allow: highest priority first, users round robin within it."""
+        started = True
+        while started:
+            started = False
+            for priority in (INTERACTIVE, BACKGROUND):
+                users = self._waiting[priority]
+                for user in list(users):
+                    if not self._can_start(user, priority):
+                        continue
+                    waiters = users[user]
+                    waiter = waiters.popleft()
+                    if waiters:
+                        users.move_to_end(user)
+                    else:
+                        del users[user]
+                    self._start(user)
+                    waiter.set_result(None)
+                    started = True
+
+
+run_scheduler = AgentRunScheduler()
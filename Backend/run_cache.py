@@ -0,0 +1,55 @@
+# run_cache.py
+# Memoization for the duration of one run, stored on the CoordinatorAgentContext.
+# Every agent in a run (including the coaches and context_updator called as tools) shares the same context object,
+# so e.g. the coordinator's and the coach's get_context calls, or two identical history searches, are only done once.
+# Serialized context is keyed on the context's version, which every tool that edits the context bumps.
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from models import CoordinatorAgentContext
+
+T = TypeVar("T")
+
+run_cache_stats = {"context_hits": 0, "context_misses": 0, "search_hits": 0, "search_misses": 0}
+
+
+def start_run(context: CoordinatorAgentContext) -> None:
+    """Drop anything cached by an earlier run. Needed when a context object is reused (e.g. from the session store)."""
+    context._run_cache.clear()
+
+
+def mark_context_changed(context: CoordinatorAgentContext) -> None:
+    """Call after every edit to the context, so no stale serialized context is handed out."""
+    context._version += 1
+    context._run_cache.pop("context", None)
+
+
+def memoize_context_dump(context: CoordinatorAgentContext, key: Hashable, build: Callable[[], str]) -> str:
+    dumps = context._run_cache.setdefault("context", {})
+    dumped = dumps.get(key)
+    if dumped is None:
+        run_cache_stats["context_misses"] += 1
+        dumped = dumps[key] = build()
+    else:
+        run_cache_stats["context_hits"] += 1
+    return dumped
+
+
+async def memoize_search(context: CoordinatorAgentContext, key: Hashable, search: Callable[[], Awaitable[T]]) -> T:
+    """
+    Memoize an async lookup for the rest of the run. The task is stored rather than the result, so concurrent
+    identical lookups (e.g. two coaches consulted in parallel) share one call. Failures are not kept.
+    """
+    searches = context._run_cache.setdefault("search", {})
+    task = searches.get(key)
+    if task is None:
+        run_cache_stats["search_misses"] += 1
+        task = searches[key] = asyncio.ensure_future(search())
+    else:
+        run_cache_stats["search_hits"] += 1
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        if searches.get(key) is task:
+            del searches[key]
+        raise
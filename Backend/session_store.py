@@ -0,0 +1,165 @@
+# session_store.py
+# Server side conversation state for /chat, keyed by conversation_id.
+# Lets clients send only the new message (plus the context version they hold) instead of
+# re-uploading the whole history and context every turn.
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+from pydantic_core import to_jsonable_python
+
+from models import CoordinatorAgentContext
+
+load_dotenv()
+
+SESSION_STORE_MAX_SESSIONS = int(os.environ.get("SESSION_STORE_MAX_SESSIONS", "1000"))
+# When set, sessions are also persisted to this SQLite file and survive restarts / LRU eviction.
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH")
+
+
+@dataclass
+class ConversationSession:
+    conversation_id: str
+    userId: str
+    messages: list[dict[str, Any]]
+    context: CoordinatorAgentContext
+    contextVersion: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+
+class SessionBackend(ABC):
+    """Persistent storage behind the in-memory session cache."""
+
+    @abstractmethod
+    async def load(self, conversation_id: str) -> Optional[ConversationSession]:
+        ...
+
+    @abstractmethod
+    async def save(self, session: ConversationSession) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, conversation_id: str) -> None:
+        ...
+
+
+class SqliteSessionBackend(SessionBackend):
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_sessions (
+                    conversation_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    messages TEXT NOT NULL,
+                    context TEXT NOT NULL,
+                    context_version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _load(self, conversation_id: str) -> Optional[ConversationSession]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT user_id, messages, context, context_version, updated_at FROM conversation_sessions WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return ConversationSession(
+            conversation_id=conversation_id,
+            userId=row[0],
+            messages=json.loads(row[1]),
+            context=CoordinatorAgentContext.model_validate_json(row[2]),
+            contextVersion=row[3],
+            updated_at=row[4],
+        )
+
+    def _save(self, session: ConversationSession) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    session.conversation_id,
+                    session.userId,
+                    json.dumps(to_jsonable_python(session.messages), separators=(",", ":")),
+                    session.context.model_dump_json(),
+                    session.contextVersion,
+                    session.updated_at,
+                ),
+            )
+
+    def _delete(self, conversation_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM conversation_sessions WHERE conversation_id = ?", (conversation_id,))
+
+    async def load(self, conversation_id: str) -> Optional[ConversationSession]:
+        return await asyncio.to_thread(self._load, conversation_id)
+
+    async def save(self, session: ConversationSession) -> None:
+        await asyncio.to_thread(self._save, session)
+
+    async def delete(self, conversation_id: str) -> None:
+        await asyncio.to_thread(self._delete, conversation_id)
+
+
+class SessionStore:
+    """
+    LRU cache of the most recently used conversations, optionally backed by a persistent
+    SessionBackend (read-through on a cache miss, write-through on every save).
+    """
+
+    def __init__(self, max_sessions: int = SESSION_STORE_MAX_SESSIONS, backend: Optional[SessionBackend] = None):
+        self.max_sessions = max_sessions
+        self.backend = backend
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+
+    async def get(self, conversation_id: str) -> Optional[ConversationSession]:
+        session = self._sessions.get(conversation_id)
+        if session is not None:
+            self._sessions.move_to_end(conversation_id)
+            return session
+        if self.backend is None:
+            return None
+        session = await self.backend.load(conversation_id)
+        if session is not None:
+            self._remember(session)
+        return session
+
+    async def save(self, session: ConversationSession) -> None:
+        session.updated_at = time.time()
+        self._remember(session)
+        if self.backend is not None:
+            await self.backend.save(session)
+
+    async def delete(self, conversation_id: str) -> None:
+        self._sessions.pop(conversation_id, None)
+        if self.backend is not None:
+            await self.backend.delete(conversation_id)
+
+    def _remember(self, session: ConversationSession) -> None:
+        self._sessions[session.conversation_id] = session
+        self._sessions.move_to_end(session.conversation_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+def create_session_store() -> SessionStore:
+    backend = SqliteSessionBackend(SESSION_STORE_PATH) if SESSION_STORE_PATH else None
+    return SessionStore(backend=backend)
+
+
+session_store = create_session_store()
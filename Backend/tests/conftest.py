@@ -0,0 +1,48 @@
+# Tests run against the flat Backend modules, the way uvicorn imports them (`uvicorn main:app` from Backend/).
+# Config is read at import time, so the local, throwaway backends are selected here, before any app module loads.
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TEST_DIR = tempfile.mkdtemp(prefix="dojo-tests-")
+os.environ.setdefault("MEMORY_BACKEND", "local")
+os.environ.setdefault("LOCAL_MEMORY_EMBEDDER", "hashing")
+os.environ.setdefault("LOCAL_MEMORY_DIR", os.path.join(_TEST_DIR, "memory"))
+os.environ.setdefault("WORKOUT_STORE_PATH", os.path.join(_TEST_DIR, "workouts.db"))
+os.environ.setdefault("IDEMPOTENCY_STORE_PATH", os.path.join(_TEST_DIR, "idempotency.db"))
+os.environ.setdefault("CONTEXT_VERSION_STORE_PATH", os.path.join(_TEST_DIR, "context_versions.db"))
+os.environ.setdefault("SESSION_STORE_PATH", "")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import pytest
+
+
+@pytest.fixture
+def context_data() -> dict:
+    """A small CoordinatorAgentContext as the iOS app sends it: one goal, two fitness levels, a week of plan."""
+    return {
+        "userId": "6F9619FF-8B86-D011-B42D-00C04FC964FF",
+        "goals": [{
+            "id": "0b7c1c9e-3f0a-4c3e-9a55-2f1d3c1b9e01", "goalActivity": "running", "title": "Sub 1:45 half",
+            "description": "Spring half marathon", "goalDeadline": "2025-05-04T09:00:00+00:00", "isCompleted": False,
+        }],
+        "activityFitnessLevels": [
+            {"activity": "running", "userDefinedFitnessLevel": "Intermediate", "agentDefinedFitnessLevel": "Intermediate"},
+            {"activity": "climbing", "userDefinedFitnessLevel": "V4"},
+        ],
+        "currentTrainingPlan": [
+            {
+                "tracking_id": f"00000000-0000-4000-8000-00000000000{day}",
+                "date": f"2025-01-0{day}T00:00:00+00:00",
+                "sessions": [{"activity": "running", "sessionDescription": "Easy zone 2 run", "distanceKm": 8,
+                              "heartRate": 140, "elevationGain": 60, "paceMinPerKm": 360}]
+                if day % 2 else
+                [{"activity": "climbing", "sessionDescription": "Limit bouldering",
+                  "routes": [{"gradeValue": {"scale": "v", "value": "V5"}, "shortDescription": "Crimpy overhang"}]}],
+            }
+            for day in range(1, 8)
+        ],
+    }
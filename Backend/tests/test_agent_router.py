@@ -0,0 +1,29 @@
+import pytest
+
+from agent_router import route_message
+
+
+@pytest.mark.parametrize("text, route", [
+    ("How should I pace my long run on Sunday?", "running"),
+    ("Did a 5.5 km tempo run today at 5.10 min/km", "running"),
+    ("I'm working on a 5.11c at the crag, any tips for the crimps?", "climbing"),
+    ("Bouldering tonight, trying to flash a V5", "climbing"),
+    ("Should I balance climbing and running this week?", "coordinator"),
+    ("Add a goal for a spring marathon", "coordinator"),
+    ("I need to send the project report before Friday", "coordinator"),
+    ("Ran 12 km this morning, legs feel heavy", "running"),
+    ("I ran late to the gym again", "coordinator"),
+    ("I ran out of chalk at the crag", "climbing"),
+])
+def test_route_message(text, route):
+    assert route_message(text).route == route
+
+
+@pytest.mark.parametrize("text", ["5.5 km", "5.9km easy", "ran 5.12 miles", "5.10/km"])
+def test_distances_and_paces_are_not_yds_grades(text):
+    assert route_message(text).scores["climbing"] == 0
+
+
+@pytest.mark.parametrize("text", ["5.9", "5.10a", "5.12d", "5.15"])
+def test_yds_grades_count_as_climbing(text):
+    assert route_message(f"my next route is a {text}").scores["climbing"] > 0
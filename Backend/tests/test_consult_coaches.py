@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from openai.types.responses import ResponseOutputMessage, ResponseOutputText
+
+from agents import Model, ModelResponse, Usage, set_tracing_disabled
+from agents.tool_context import ToolContext
+
+import custom_agents
+from custom_agents import CONTEXT_WRITING_TOOLS, consult_coaches
+from models import CoordinatorAgentContext
+
+set_tracing_disabled(True)
+
+
+class ToolListingModel(Model):
+    """Answers with the names of the tools it was given."""
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        message = ResponseOutputMessage(
+            type="message", id="msg_1", role="assistant", status="completed",
+            content=[ResponseOutputText(type="output_text", text=",".join(sorted(tool.name for tool in tools)), annotations=[])],
+        )
+        return ModelResponse(output=[message], usage=Usage(requests=1), response_id=None)
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+class CancelledModel(ToolListingModel):
+    async def get_response(self, *args, **kwargs):
+        raise asyncio.CancelledError()
+
+
+def _consult(context_data: dict) -> dict:
+    context = CoordinatorAgentContext.model_validate(context_data)
+    arguments = json.dumps({"question": "How should I balance my week?"})
+    tool_context = ToolContext(context, tool_name="consult_coaches", tool_call_id="1", tool_arguments=arguments)
+    return json.loads(asyncio.run(consult_coaches.on_invoke_tool(tool_context, arguments)))
+
+
+def test_consulted_coaches_cannot_edit_the_context(monkeypatch, context_data):
+    monkeypatch.setattr(custom_agents, "COACHES", {
+        activity: coach.clone(model=ToolListingModel()) for activity, coach in custom_agents.COACHES.items()
+    })
+
+    answers = _consult(context_data)
+
+    assert set(answers) == {"running_coach", "climbing_coach"}
+    for answer in answers.values():
+        tools = set(answer.split(","))
+        assert "search_workout_history" in tools
+        assert not tools & CONTEXT_WRITING_TOOLS
+
+
+def test_a_cancelled_coach_is_reported_without_losing_the_other(monkeypatch, context_data):
+    monkeypatch.setattr(custom_agents, "COACHES", {
+        "running": custom_agents.running_coach.clone(model=ToolListingModel()),
+        "climbing": custom_agents.climbing_coach.clone(model=CancelledModel()),
+    })
+
+    answers = _consult(context_data)
+
+    assert answers["climbing_coach"].startswith("error: climbing_coach failed")
+    assert "search_workout_history" in answers["running_coach"]
@@ -0,0 +1,55 @@
+import pytest
+
+from context_patch import ContextPatchError, apply_context_patch, apply_operations
+from models import CoordinatorAgentContext
+
+
+def test_operations_follow_json_patch_semantics():
+    document = {"plan": [{"km": 8}, {"km": 10}], "goal": "half"}
+    changed = apply_operations(document, [
+        {"op": "replace", "path": "/plan/0/km", "value": 6},
+        {"op": "add", "path": "/plan/-", "value": {"km": 12}},
+        {"op": "move", "from": "/goal", "path": "/target"},
+        {"op": "test", "path": "/plan/2/km", "value": 12},
+    ])
+    assert document == {"plan": [{"km": 6}, {"km": 10}, {"km": 12}], "target": "half"}
+    assert changed == ["/plan/0/km", "/plan/2", "/goal", "/target"]
+
+
+def test_patch_is_applied_to_the_live_context(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    apply_context_patch(context, [{"op": "replace", "path": "/activityFitnessLevels/0/agentDefinedFitnessLevel", "value": "Advanced"}])
+    assert context.activityFitnessLevels[0].agentDefinedFitnessLevel == "Advanced"
+
+
+def test_failed_patch_leaves_the_context_untouched(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    before = context.model_dump()
+    with pytest.raises(ContextPatchError):
+        apply_context_patch(context, [
+            {"op": "remove", "path": "/goals/0"},
+            {"op": "replace", "path": "/currentTrainingPlan/0/sessions/0/distanceKm", "value": "far"},
+        ])
+    assert context.model_dump() == before
+
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "replace", "path": "/userId", "value": "someone-else"}],
+    [{"op": "replace", "path": "/activityFitnessLevels/1/userDefinedFitnessLevel", "value": "V8"}],
+    # Whole entries: no protected token in the path, the user's level still goes away or changes.
+    [{"op": "remove", "path": "/activityFitnessLevels/0"}],
+    [{"op": "replace", "path": "/activityFitnessLevels/1", "value": {"activity": "climbing", "userDefinedFitnessLevel": "V8"}}],
+    [{"op": "move", "from": "/activityFitnessLevels/0", "path": "/goals/-"}],
+])
+def test_user_owned_values_cannot_be_changed(context_data, operations):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    before = context.model_dump()
+    with pytest.raises(ContextPatchError):
+        apply_context_patch(context, operations)
+    assert context.model_dump() == before
+
+
+def test_reordering_fitness_levels_is_allowed(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    apply_context_patch(context, [{"op": "move", "from": "/activityFitnessLevels/1", "path": "/activityFitnessLevels/0"}])
+    assert [level.activity.value for level in context.activityFitnessLevels] == ["climbing", "running"]
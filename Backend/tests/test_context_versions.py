@@ -0,0 +1,251 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+
+import fitness_reevaluation
+import main
+from context_versions import ContextConflict, ContextVersionStore, UserContextVersions, merge_contexts
+from fitness_reevaluation import ReevaluationJob, run_coach
+from idempotency import IdempotencyStore
+from memory_management import BulkWorkoutPayload, WorkoutPayload
+from models import CoordinatorAgentContext
+
+USER = "6F9619FF-8B86-D011-B42D-00C04FC964FF"
+
+
+def _context(context_data: dict, **changes) -> CoordinatorAgentContext:
+    return CoordinatorAgentContext.model_validate({**context_data, **changes})
+
+
+def _levels(context: CoordinatorAgentContext) -> dict:
+    return {level.activity: level.model_dump(mode="json") for level in context.activityFitnessLevels}
+
+
+def _bump(context_data: dict, activity: str, level: str) -> CoordinatorAgentContext:
+    levels = [{**entry, "agentDefinedFitnessLevel": level} if entry["activity"] == activity else entry
+              for entry in context_data["activityFitnessLevels"]]
+    return _context(context_data, activityFitnessLevels=levels)
+
+
+async def _commit(versions: UserContextVersions, context: CoordinatorAgentContext) -> int:
+    async with versions.mutation(USER) as transaction:
+        return await versions.commit(USER, transaction, context)
+
+
+def test_merge_keeps_changes_from_both_sides(context_data):
+    base = _context(context_data)
+    ours = _bump(context_data, "running", "Advanced")
+    ours.currentTrainingPlan = ours.currentTrainingPlan[:-1]
+    theirs = _bump(context_data, "climbing", "V6")
+
+    merged = merge_contexts(base, ours, theirs)
+
+    assert _levels(merged)["running"] == _levels(ours)["running"]
+    assert _levels(merged)["climbing"] == _levels(theirs)["climbing"]
+    assert len(merged.currentTrainingPlan) == len(base.currentTrainingPlan) - 1
+
+
+def test_merge_prefers_ours_when_both_change_the_same_entry(context_data):
+    base = _context(context_data)
+    merged = merge_contexts(base, _bump(context_data, "running", "Advanced"), _bump(context_data, "running", "Beginner"))
+    assert _levels(merged)["running"]["agentDefinedFitnessLevel"] == "Advanced"
+
+
+def test_rebase_merges_what_was_committed_after_the_base(context_data):
+    versions = UserContextVersions()
+
+    async def scenario():
+        base_version = await _commit(versions, _context(context_data))
+        # A fitness re-evaluation commits while the client edits its copy of base_version.
+        await _commit(versions, _bump(context_data, "climbing", "V6"))
+        async with versions.mutation(USER):
+            return versions.rebase(USER, _bump(context_data, "running", "Advanced"), base_version)
+
+    rebased = asyncio.run(scenario())
+    assert _levels(rebased)["climbing"]["agentDefinedFitnessLevel"] == "V6"
+    assert _levels(rebased)["running"]["agentDefinedFitnessLevel"] == "Advanced"
+    assert versions.stats["merged"] == 1
+
+
+def test_rebase_on_a_version_past_the_history_is_a_conflict(context_data):
+    versions = UserContextVersions(history=2)
+
+    async def scenario():
+        first = await _commit(versions, _context(context_data))
+        for level in ("V5", "V6", "V7"):
+            await _commit(versions, _bump(context_data, "climbing", level))
+        versions.rebase(USER, _context(context_data), first)
+
+    with pytest.raises(ContextConflict) as conflict:
+        asyncio.run(scenario())
+    assert conflict.value.version == 4
+
+
+def test_stale_expected_version_is_rejected(context_data):
+    versions = UserContextVersions()
+
+    async def scenario():
+        await _commit(versions, _context(context_data))
+        await _commit(versions, _bump(context_data, "running", "Advanced"))
+        async with versions.mutation(USER, expected_version=1):
+            pass
+
+    with pytest.raises(ContextConflict) as conflict:
+        asyncio.run(scenario())
+    assert conflict.value.version == 2
+    assert _levels(conflict.value.context)["running"]["agentDefinedFitnessLevel"] == "Advanced"
+
+
+def test_versions_survive_a_restart(tmp_path, context_data):
+    path = str(tmp_path / "versions.db")
+    first = _context(context_data)
+
+    async def scenario():
+        await _commit(UserContextVersions(ContextVersionStore(path)), first)
+        await _commit(UserContextVersions(ContextVersionStore(path)), _bump(context_data, "running", "Advanced"))
+        restarted = UserContextVersions(ContextVersionStore(path))
+        await restarted.load(USER)
+        return restarted
+
+    restarted = asyncio.run(scenario())
+    assert restarted.current_version(USER) == 2
+    assert restarted.context_at(USER, 1).model_dump_json() == first.model_dump_json()
+    assert _levels(restarted.latest_context(USER))["running"]["agentDefinedFitnessLevel"] == "Advanced"
+
+
+def test_mutations_for_one_user_run_one_at_a_time(context_data):
+    versions = UserContextVersions()
+    inside = []
+
+    async def run(level: str):
+        async with versions.mutation(USER) as transaction:
+            inside.append(level)
+            assert len(inside) == 1
+            await asyncio.sleep(0.01)
+            inside.remove(level)
+            await versions.commit(USER, transaction, _bump(context_data, "running", level))
+
+    async def scenario():
+        await asyncio.gather(*(run(level) for level in ("Beginner", "Intermediate", "Advanced")))
+
+    asyncio.run(scenario())
+    assert versions.current_version(USER) == 3
+    assert versions.stats["waited"] == 2
+
+
+def test_bulk_import_that_loses_the_race_stores_nothing(monkeypatch, context_data):
+    versions = UserContextVersions()
+    monkeypatch.setattr(main, "user_contexts", versions)
+    stored = []
+
+    async def add_many(userId, workouts):
+        stored.extend(workouts)
+
+    monkeypatch.setattr(main.workout_store, "add_many", add_many)
+    payload = BulkWorkoutPayload.model_validate({
+        "userId": USER,
+        "coordinatorContext": context_data,
+        "workouts": [{"activity": "running", "date": "2025-01-01T07:00:00", "userNotes": "felt ok", "distanceKm": 8.0,
+                      "avgHeartRate": 150, "elevationGain": 40, "avgPacePerKm": 5.5}],
+    })
+
+    async def scenario():
+        version = await _commit(versions, _context(context_data))
+        # Another run holds the lock and commits while the import waits for it.
+        async with versions.mutation(USER) as transaction:
+            submit = asyncio.create_task(main._submit_workouts(payload, version))
+            await asyncio.sleep(0.01)
+            await versions.commit(USER, transaction, _bump(context_data, "running", "Advanced"))
+        await submit
+
+    with pytest.raises(ContextConflict):
+        asyncio.run(scenario())
+    assert stored == []
+
+
+RUN = {"activity": "running", "date": "2025-01-02T07:00:00", "userNotes": "felt ok", "distanceKm": 8.0,
+       "avgHeartRate": 150, "elevationGain": 40, "avgPacePerKm": 5.5}
+
+
+@pytest.fixture
+def workout_submissions(monkeypatch, tmp_path):
+    """/submit_workout with fresh versions and idempotency store, recording the scheduled jobs instead of running them."""
+    versions, scheduled = UserContextVersions(), []
+    monkeypatch.setattr(main, "user_contexts", versions)
+    monkeypatch.setattr(main, "idempotency_store", IdempotencyStore(str(tmp_path / "idempotency.db")))
+
+    async def nothing(*args):
+        pass
+
+    monkeypatch.setattr(main.workout_store, "add", nothing)
+    monkeypatch.setattr(main.ingestion_queue, "enqueue", nothing)
+
+    def schedule(userId, workout, context, base_version):
+        scheduled.append((context, base_version))
+        return SimpleNamespace(id=f"job-{len(scheduled)}")
+
+    monkeypatch.setattr(main.fitness_scheduler, "schedule", schedule)
+
+    async def submit(context_data: dict, if_match=None, **fields):
+        payload = WorkoutPayload.model_validate({"userId": USER, "workout": RUN, "coordinatorContext": context_data, **fields})
+        return await main.submit_workout(payload, Response(), wait=False, idempotency_key="k", if_match=if_match)
+
+    return versions, scheduled, submit
+
+
+def test_retried_submission_gets_the_stored_response_not_a_412(workout_submissions, context_data):
+    versions, scheduled, submit = workout_submissions
+
+    async def scenario():
+        await _commit(versions, _context(context_data))
+        first = await submit(context_data, if_match='"1"')
+        # The re-evaluation commits before the client's retry arrives.
+        await _commit(versions, _bump(context_data, "running", "Advanced"))
+        return first, await submit(context_data, if_match='"1"')
+
+    first, retry = asyncio.run(scenario())
+    assert retry == first
+    assert len(scheduled) == 1
+
+
+def test_stale_context_without_a_version_is_rejected(workout_submissions, context_data):
+    versions, scheduled, submit = workout_submissions
+
+    async def scenario():
+        await _commit(versions, _context(context_data))
+        await _commit(versions, _bump(context_data, "climbing", "V6"))
+        await submit(context_data)
+
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(scenario())
+    assert rejected.value.status_code == 412
+    assert scheduled == []
+
+
+def test_stale_context_with_its_version_is_merged_by_the_reevaluation(workout_submissions, monkeypatch, context_data):
+    versions, scheduled, submit = workout_submissions
+    monkeypatch.setattr(fitness_reevaluation, "user_contexts", versions)
+
+    class Runner:
+        @staticmethod
+        async def run(starting_agent, input, context, max_turns):
+            return SimpleNamespace(context_wrapper=SimpleNamespace(context=context))
+
+    monkeypatch.setattr(fitness_reevaluation, "Runner", Runner)
+    context_data["goals"][0]["title"] = "Sub 1:40 half"
+
+    async def scenario():
+        await _commit(versions, _context(context_data))
+        await _commit(versions, _bump(context_data, "climbing", "V6"))
+        # The client edited its copy of version 1 and never saw version 2.
+        await submit(context_data, contextVersion=1)
+        context, base_version = scheduled[0]
+        job = ReevaluationJob(id="job", userId=USER, activity="running", context=context, base_version=base_version)
+        return await run_coach(job)
+
+    context = asyncio.run(scenario())
+    assert context.goals[0].title == "Sub 1:40 half"
+    assert _levels(context)["climbing"]["agentDefinedFitnessLevel"] == "V6"
+    assert versions.current_version(USER) == 3
@@ -0,0 +1,38 @@
+import json
+
+from history_compaction import compact_history
+
+
+def _get_context(call_id: str, output: str, **arguments) -> list[dict]:
+    return [
+        {"type": "function_call", "call_id": call_id, "name": "get_context", "arguments": json.dumps(arguments)},
+        {"type": "function_call_output", "call_id": call_id, "output": output},
+    ]
+
+
+def _outputs(items: list[dict]) -> list[str]:
+    return [item["output"] for item in items if item.get("type") == "function_call_output"]
+
+
+def test_snapshots_with_different_arguments_are_kept():
+    history = [{"role": "user", "content": "plan my week"}]
+    history += _get_context("1", "goals v1", sections=["goals"])
+    history += _get_context("2", "plan for march", sections=["training_plan"], start_date="2025-03-01")
+    history += _get_context("3", "goals v2", sections=["goals"])
+
+    outputs = _outputs(compact_history(history))
+
+    assert outputs[1:] == ["plan for march", "goals v2"]
+    assert outputs[0].startswith("[outdated get_context")
+
+
+def test_a_full_snapshot_outdates_every_earlier_projection():
+    history = [{"role": "user", "content": "plan my week"}]
+    history += _get_context("1", "goals", sections=["goals"])
+    history += _get_context("2", "everything", sections=None)
+    history += _get_context("3", "plan for march", sections=["training_plan"], start_date="2025-03-01")
+
+    outputs = _outputs(compact_history(history))
+
+    assert outputs[0].startswith("[outdated get_context")
+    assert outputs[1:] == ["everything", "plan for march"]
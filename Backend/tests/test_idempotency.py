@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from idempotency import IdempotencyStore
+
+
+def test_identical_requests_at_the_same_time_run_the_handler_once(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+    runs = []
+
+    async def handler():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {"stored": len(runs)}
+
+    async def scenario():
+        return await asyncio.gather(*(store.run_once("key", handler) for _ in range(2)))
+
+    results = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True]
+    assert all(response == {"stored": 1} for response, _ in results)
+
+
+def test_retry_that_reads_while_the_first_response_is_stored_is_replayed(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+    runs, handled = [], asyncio.Event()
+    get_sync, put_sync = store.get_sync, store.put_sync
+
+    def slow_get(key):
+        # The read finishes before the first request has stored its response, but returns after it is done.
+        cached = get_sync(key)
+        time.sleep(0.05)
+        return cached
+
+    def slow_put(key, response):
+        time.sleep(0.01)
+        put_sync(key, response)
+
+    monkeypatch.setattr(store, "get_sync", slow_get)
+    monkeypatch.setattr(store, "put_sync", slow_put)
+
+    async def handler():
+        runs.append(1)
+        handled.set()
+        return {"stored": len(runs)}
+
+    async def scenario():
+        first = asyncio.create_task(store.run_once("key", handler))
+        await handled.wait()
+        retry = await store.run_once("key", handler)
+        return await first, retry
+
+    first, retry = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert retry == ({"stored": 1}, True)
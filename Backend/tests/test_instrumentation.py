@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from openai.types.responses import ResponseFunctionToolCall, ResponseOutputMessage, ResponseOutputText
+
+from agents import Agent, Model, ModelResponse, Runner, Usage, set_tracing_disabled
+
+import instrumentation
+from instrumentation import MetricsHooks
+
+set_tracing_disabled(True)
+
+
+class SleepyModel(Model):
+    """Answers after the number of seconds given as the user message."""
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        await asyncio.sleep(float(input if isinstance(input, str) else input[-1]["content"]))
+        message = ResponseOutputMessage(
+            type="message", id="msg_1", role="assistant", status="completed",
+            content=[ResponseOutputText(type="output_text", text="done", annotations=[])],
+        )
+        return ModelResponse(output=[message], usage=Usage(requests=1), response_id=None)
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+class TwoToolCallsModel(SleepyModel):
+    """Calls the "sleepy" tool twice in parallel, for 0.1 and 0.3 seconds, then answers."""
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs):
+        if any(item.get("type") == "function_call_output" for item in input):
+            return await super().get_response(system_instructions, "0", model_settings, tools, output_schema, handoffs, tracing)
+        calls = [
+            ResponseFunctionToolCall(type="function_call", id=f"fc_{n}", call_id=f"call_{n}", name="sleepy",
+                                     arguments=json.dumps({"input": seconds}), status="completed")
+            for n, seconds in enumerate(("0.1", "0.3"))
+        ]
+        return ModelResponse(output=calls, usage=Usage(requests=1), response_id=None)
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+        self.by_agent = {}
+
+    def observe(self, value, **labels):
+        self.values.append(value)
+        self.by_agent.setdefault(labels.get("agent"), []).append(value)
+
+
+def test_parallel_runs_of_one_agent_on_one_context_keep_their_own_timings(monkeypatch):
+    agent_runs, llm_calls = Recorder(), Recorder()
+    monkeypatch.setattr(instrumentation, "agent_run_seconds", agent_runs)
+    monkeypatch.setattr(instrumentation, "llm_call_seconds", llm_calls)
+    agent = Agent(name="sleepy", model=SleepyModel(), hooks=MetricsHooks())
+    context = object()
+
+    async def scenario():
+        # The first run finishes while the second, started later, is still going.
+        first = asyncio.create_task(Runner.run(agent, "0.2", context=context))
+        await asyncio.sleep(0.1)
+        await asyncio.gather(first, Runner.run(agent, "0.3", context=context))
+
+    unscoped = instrumentation.hook_stats["unscoped"]
+    asyncio.run(scenario())
+
+    for recorded in (agent_runs, llm_calls):
+        first, second = recorded.values
+        assert 0.18 <= first < 0.28 and 0.28 <= second < 0.38
+    # Timed per run, not by the per-context fallback.
+    assert instrumentation.hook_stats["unscoped"] == unscoped
+
+
+def test_parallel_agent_as_tool_calls_are_timed_per_nested_run(monkeypatch):
+    agent_runs = Recorder()
+    monkeypatch.setattr(instrumentation, "agent_run_seconds", agent_runs)
+    hooks = MetricsHooks()
+    sleepy = Agent(name="sleepy", model=SleepyModel(), hooks=hooks)
+    parent = Agent(name="parent", model=TwoToolCallsModel(), hooks=hooks,
+                   tools=[sleepy.as_tool(tool_name="sleepy", tool_description="Sleeps for the given seconds.")])
+
+    unscoped = instrumentation.hook_stats["unscoped"]
+    asyncio.run(Runner.run(parent, "go", context=object()))
+
+    first, second = sorted(agent_runs.by_agent["sleepy"])
+    assert 0.08 <= first < 0.18 and 0.28 <= second < 0.38
+    assert instrumentation.hook_stats["unscoped"] == unscoped
@@ -0,0 +1,31 @@
+import asyncio
+
+from memory_backends import LocalVectorBackend
+
+
+def test_local_backend_finds_what_was_added(tmp_path):
+    backend = LocalVectorBackend(root=str(tmp_path))
+
+    async def scenario():
+        await backend.add("Tempo run, 8 km at threshold. Legs felt heavy.", "running", {"user": "u1", "date": "2025-03-01"})
+        await backend.add("Bouldering session, sent a V5 crimp problem.", "climbing", {"user": "u1", "date": "2025-03-02"})
+        return await backend.search_documents("u1", "tempo threshold run", "running")
+
+    hits = asyncio.run(scenario())
+    assert [hit["content"] for hit in hits] == ["Tempo run, 8 km at threshold. Legs felt heavy."]
+    assert hits[0]["date"] == "2025-03-01"
+
+
+def test_concurrent_adds_and_searches_keep_rows_and_metadata_aligned(tmp_path):
+    backend = LocalVectorBackend(root=str(tmp_path))
+
+    async def scenario():
+        notes = [f"Easy run number {i}, {i} km." for i in range(20)]
+        await asyncio.gather(
+            *(backend.add(note, "running", {"user": "u1"}) for note in notes),
+            *(backend.search_memories("u1", "easy run", "running", limit=3) for _ in range(20)),
+        )
+        return await backend.search_documents("u1", "Easy run number 7, 7 km.", "running", limit=1)
+
+    hits = asyncio.run(scenario())
+    assert hits[0]["content"] == "Easy run number 7, 7 km."
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from memory_ingestion import MemoryIngestionQueue
+
+
+def _payload(n: int):
+    return SimpleNamespace(userId=f"user-{n}")
+
+
+def test_workers_write_everything_before_flush_returns():
+    async def run():
+        written = []
+
+        async def write(payload):
+            await asyncio.sleep(0)
+            written.append(payload.userId)
+
+        queue = MemoryIngestionQueue(write, maxsize=2, workers=2)
+        await queue.start()
+        await queue.enqueue_many([_payload(n) for n in range(7)], batch_size=3)
+        assert await queue.flush(timeout=5)
+        await queue.stop()
+        return written, queue.stats
+
+    written, stats = asyncio.run(run())
+    assert sorted(written) == sorted(f"user-{n}" for n in range(7))
+    assert stats["enqueued"] == 7 and stats["written"] == 7
+
+
+def test_failed_writes_are_retried_then_given_up():
+    async def run():
+        attempts = {"flaky": 0, "broken": 0}
+
+        async def write(payload):
+            attempts[payload.userId] += 1
+            if payload.userId == "broken" or attempts["flaky"] < 2:
+                raise RuntimeError("backend down")
+
+        queue = MemoryIngestionQueue(write, workers=1, max_retries=2, backoff_seconds=0.001)
+        await queue.start()
+        await queue.enqueue(SimpleNamespace(userId="flaky"))
+        await queue.enqueue(SimpleNamespace(userId="broken"))
+        await queue.stop(timeout=5)
+        return attempts, queue.stats
+
+    attempts, stats = asyncio.run(run())
+    assert attempts == {"flaky": 2, "broken": 3}
+    assert stats["written"] == 1 and stats["failed"] == 1
+
+
+def test_without_workers_enqueue_writes_inline():
+    async def run():
+        written = []
+
+        async def write(payload):
+            written.append(payload.userId)
+
+        queue = MemoryIngestionQueue(write)
+        await queue.enqueue(_payload(1))
+        return written
+
+    assert asyncio.run(run()) == ["user-1"]
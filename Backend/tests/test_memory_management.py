@@ -0,0 +1,72 @@
+import asyncio
+
+import memory_management
+from memory_management import SearchCache, merge_search_results
+
+
+def _hit(content: str, score: float, document_ids=(), source="memory") -> dict:
+    return {"source": source, "score": score, "date": "2025-03-01", "content": content, "document_ids": list(document_ids)}
+
+
+def test_equivalent_queries_share_a_cache_key():
+    assert SearchCache.make_key("U", "running", "Show me my  running workouts", 5) == SearchCache.make_key("u", "running", "running", 5)
+
+
+def test_time_qualifiers_and_word_order_keep_queries_apart():
+    key = SearchCache.make_key("u", "running", "tempo run", 5)
+    assert SearchCache.make_key("u", "running", "last tempo run", 5) != key
+    assert SearchCache.make_key("u", "running", "recent tempo run", 5) != key
+    assert SearchCache.make_key("u", "running", "run tempo", 5) != key
+
+
+def test_invalidate_drops_only_that_users_activity():
+    cache = SearchCache()
+    running, climbing = SearchCache.make_key("u", "running", "tempo", 5), SearchCache.make_key("u", "climbing", "crimps", 5)
+    cache.set(running, [{"content": "run"}])
+    cache.set(climbing, [{"content": "climb"}])
+    cache.invalidate("U", "running")
+    assert cache.get(running) is None
+    assert cache.get(climbing) == [{"content": "climb"}]
+
+
+def test_set_is_skipped_when_the_scope_was_invalidated_during_the_search():
+    cache = SearchCache()
+    key = SearchCache.make_key("u", "running", "tempo", 5)
+    generation = cache.generation(key)
+    cache.invalidate("u", "running")
+    cache.set(key, [{"content": "stale"}], generation=generation)
+    assert cache.get(key) is None
+    assert cache.stats["stale_skipped"] == 1
+
+
+def test_search_racing_an_invalidation_does_not_cache_stale_results(monkeypatch):
+    cache = SearchCache()
+    monkeypatch.setattr(memory_management, "search_cache", cache)
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_search(userId, query, activity, limit):
+        started.set()
+        await release.wait()
+        return [_hit("before the new workout", 1.0)]
+
+    monkeypatch.setattr(memory_management, "search_workout_documents", slow_search)
+    monkeypatch.setattr(memory_management, "search_workout_memories", slow_search)
+
+    async def run():
+        search = asyncio.create_task(memory_management.search_workout_history("u", "tempo", "running", 5))
+        await started.wait()
+        cache.invalidate("u", "running")  # a workout was saved meanwhile
+        release.set()
+        return await search
+
+    assert asyncio.run(run())[0]["content"] == "before the new workout"
+    assert cache.get(SearchCache.make_key("u", "running", "tempo", 5)) is None
+
+
+def test_merge_collapses_hits_on_the_same_text_or_document():
+    merged = merge_search_results(
+        [_hit("a", 0.5, ["doc-1"], "document"), _hit("b", 0.9, ["doc-2"], "document")],
+        [_hit("A ", 0.8, ["doc-3"]), _hit("b memory", 0.7, ["doc-2"])],
+        limit=5,
+    )
+    assert [(hit["content"], hit["score"]) for hit in merged] == [("b", 0.9), ("A ", 0.8)]
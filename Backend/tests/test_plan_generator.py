@@ -0,0 +1,53 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import pytest
+
+from plan_generator import BASE, BUILD, PEAK, TAPER, PlanGeneratorError, climbing_plan, periodize, plan_weeks, running_plan
+
+START = date(2025, 3, 3)
+
+
+def test_periodize_splits_into_blocks_in_order():
+    phases = periodize(16)
+    assert phases == [BASE] * 7 + [BUILD] * 5 + [PEAK] * 2 + [TAPER] * 2
+    assert periodize(1) == [BASE]
+
+
+def test_volume_is_capped_and_tapers_before_the_deadline():
+    weeks = plan_weeks(START, START + timedelta(weeks=20), 30)
+    assert max(week.volume for week in weeks) <= 30 * 1.6
+    assert weeks[-1].volume < weeks[-3].volume
+    assert any(week.recovery for week in weeks)
+
+
+@pytest.mark.parametrize("runs_per_week", [2, 3, 4, 5, 6, 7])
+def test_long_run_is_the_longest_run_of_the_week(runs_per_week):
+    weeks: dict[date, list] = defaultdict(list)
+    for day, session in running_plan(START, START + timedelta(weeks=12), weekly_km=30, runs_per_week=runs_per_week):
+        weeks[day - timedelta(days=(day - START).days % 7)].append(session.root)
+
+    # A week cut short by the deadline can hold a single run, which is not a long run.
+    for runs in (runs for runs in weeks.values() if len(runs) > 1):
+        long_runs = [run for run in runs if run.sessionDescription.endswith(" Long run, relaxed and steady.")]
+        assert len(long_runs) == 1
+        assert all(long_runs[0].distanceKm >= run.distanceKm for run in runs)
+
+
+def test_race_is_planned_on_the_deadline():
+    deadline = START + timedelta(weeks=8, days=6)
+    sessions = running_plan(START, deadline, weekly_km=30, runs_per_week=4, race_distance_km=21.1)
+    day, race = sessions[-1]
+    assert day == deadline and race.root.distanceKm == 21.1
+    assert all(day <= deadline for day, _ in sessions)
+
+
+def test_climbing_routes_are_graded_around_the_project():
+    sessions = climbing_plan(START, START + timedelta(weeks=6), sessions_per_week=3, project_grade="v6")
+    grades = {route.gradeValue.value for _, session in sessions for route in session.root.routes}
+    assert grades <= {f"V{n}" for n in range(2, 8)}
+
+
+def test_unknown_grade_is_rejected():
+    with pytest.raises(PlanGeneratorError):
+        climbing_plan(START, START + timedelta(weeks=6), sessions_per_week=3, project_grade="7a")
@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+
+from models import CoordinatorAgentContext
+from plan_index import PlanIndexError, plan_index
+from planned_workouts_model import AnyWorkoutSessionDTO, RunningWorkoutDTO
+
+
+def _run(description: str = "Tempo run") -> AnyWorkoutSessionDTO:
+    return AnyWorkoutSessionDTO(RunningWorkoutDTO(sessionDescription=description, distanceKm=10, heartRate=160, elevationGain=40, paceMinPerKm=300))
+
+
+def _ids(context: CoordinatorAgentContext) -> list:
+    return [session.id for day in context.currentTrainingPlan for session in day.sessions]
+
+
+def test_session_ids_are_the_same_every_time_the_plan_is_sent(context_data):
+    assert _ids(CoordinatorAgentContext.model_validate(context_data)) == _ids(CoordinatorAgentContext.model_validate(context_data))
+
+
+def test_identical_sessions_on_one_day_get_different_ids(context_data):
+    day = context_data["currentTrainingPlan"][0]
+    day["sessions"].append(dict(day["sessions"][0]))
+    context = CoordinatorAgentContext.model_validate(context_data)
+    first, second = context.currentTrainingPlan[0].sessions
+    assert first.id != second.id
+
+
+def test_ids_sent_by_the_client_are_kept(context_data):
+    session_id = "556753e8-3e2a-4716-945d-65e77da47398"
+    context_data["currentTrainingPlan"][0]["sessions"][0]["id"] = session_id
+    context = CoordinatorAgentContext.model_validate(context_data)
+    assert str(context.currentTrainingPlan[0].sessions[0].id) == session_id
+
+
+def test_created_session_keeps_its_id_when_the_client_sends_it_back(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    session = _run()
+    plan_index(context).insert(session, date(2025, 1, 10))
+
+    returned = context.model_dump(mode="json")
+    for day in returned["currentTrainingPlan"]:
+        for sent in day["sessions"]:
+            del sent["id"]  # the iOS client drops the ids
+    assert session.id in _ids(CoordinatorAgentContext.model_validate(returned))
+
+
+def test_insert_keeps_the_plan_in_date_order(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    index = plan_index(context)
+    index.insert(_run(), date(2024, 12, 31))
+    index.insert(_run("Long run"), date(2025, 1, 4))
+
+    days = [day.date.date() for day in context.currentTrainingPlan]
+    assert days == sorted(days) and days[0] == date(2024, 12, 31)
+    assert [s.sessionDescription for s in index.day_for(date(2025, 1, 4)).sessions] == ["Limit bouldering", "Long run"]
+
+
+def test_move_and_delete(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    index = plan_index(context)
+    session_id = context.currentTrainingPlan[0].sessions[0].id
+
+    index.move(session_id, date(2025, 1, 2))
+    assert index.day_for(date(2025, 1, 1)) is None
+    day, position = index.find(session_id)
+    assert day.date.date() == date(2025, 1, 2) and position == 1
+
+    index.delete(session_id)
+    with pytest.raises(PlanIndexError):
+        index.find(session_id)
+    assert len(context.currentTrainingPlan) == 6
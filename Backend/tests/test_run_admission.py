@@ -0,0 +1,130 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Response
+
+import main
+from context_versions import UserContextVersions
+from idempotency import IdempotencyStore
+from memory_management import WorkoutPayload
+from run_admission import BACKGROUND, INTERACTIVE, AdmissionRejected, AgentRunScheduler
+
+
+async def _hold(scheduler: AgentRunScheduler, user: str, priority: int, started: list, release: asyncio.Event, reject: bool = True):
+    async with scheduler.slot(user, priority, reject=reject):
+        started.append(user)
+        await release.wait()
+
+
+def test_interactive_runs_go_before_background_ones():
+    async def scenario():
+        scheduler = AgentRunScheduler(max_concurrent=1, reserved_interactive=0)
+        started, release = [], asyncio.Event()
+        first = asyncio.create_task(_hold(scheduler, "a", INTERACTIVE, started, release))
+        await asyncio.sleep(0)
+        # Queued in this order, but the chat turn is served first.
+        waiting = [asyncio.create_task(_hold(scheduler, "b", BACKGROUND, started, release, reject=False)),
+                   asyncio.create_task(_hold(scheduler, "c", INTERACTIVE, started, release))]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *waiting)
+        return started
+
+    assert asyncio.run(scenario()) == ["a", "c", "b"]
+
+
+def test_background_runs_leave_the_reserved_slots_free():
+    async def scenario():
+        scheduler = AgentRunScheduler(max_concurrent=2, reserved_interactive=1)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(scheduler, user, BACKGROUND, started, release, reject=False)) for user in ("a", "b")]
+        tasks.append(asyncio.create_task(_hold(scheduler, "c", INTERACTIVE, started, release)))
+        await asyncio.sleep(0)
+        running = list(started)
+        release.set()
+        await asyncio.gather(*tasks)
+        return running
+
+    assert asyncio.run(scenario()) == ["a", "c"]
+
+
+def test_a_busy_user_does_not_starve_the_others():
+    async def scenario():
+        scheduler = AgentRunScheduler(max_concurrent=1, reserved_interactive=0, max_queued_per_user=10)
+        started, release = [], asyncio.Event()
+        # User a queues four runs before b's only one.
+        tasks = [asyncio.create_task(_hold(scheduler, user, INTERACTIVE, started, release)) for user in "aaaab"]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(scenario()) == ["a", "a", "b", "a", "a"]
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        scheduler = AgentRunScheduler(max_concurrent=1, reserved_interactive=0, max_queued_interactive=1)
+        started, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(scheduler, user, INTERACTIVE, started, release)) for user in ("a", "b")]
+        await asyncio.sleep(0)
+        try:
+            scheduler.check("c", INTERACTIVE)
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(scenario())
+    assert rejected.value.retry_after >= 1
+
+
+def test_waiting_past_the_timeout_is_rejected_and_frees_the_queue():
+    async def scenario():
+        scheduler = AgentRunScheduler(max_concurrent=1, reserved_interactive=0, queue_timeout_seconds=0.01)
+        started, release = [], asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, "a", INTERACTIVE, started, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            async with scheduler.slot("b", INTERACTIVE):
+                pass
+        release.set()
+        await holder
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["timed_out"] == 1
+    assert snapshot["running"] == 0
+    assert snapshot["waiting"] == {"interactive": 0, "background": 0}
+
+
+def test_retry_of_an_accepted_workout_is_replayed_when_the_queue_is_full(monkeypatch, tmp_path, context_data):
+    scheduler = AgentRunScheduler(max_concurrent=1, reserved_interactive=0, max_queued_background=0)
+    monkeypatch.setattr(main, "run_scheduler", scheduler)
+    monkeypatch.setattr(main, "user_contexts", UserContextVersions())
+    monkeypatch.setattr(main, "idempotency_store", IdempotencyStore(str(tmp_path / "idempotency.db")))
+
+    async def nothing(*args):
+        pass
+
+    monkeypatch.setattr(main.workout_store, "add", nothing)
+    monkeypatch.setattr(main.ingestion_queue, "enqueue", nothing)
+    monkeypatch.setattr(main.fitness_scheduler, "schedule", lambda *args: SimpleNamespace(id="job"))
+    payload = WorkoutPayload.model_validate({
+        "userId": context_data["userId"], "coordinatorContext": context_data,
+        "workout": {"activity": "running", "date": "2025-01-02T07:00:00", "userNotes": "felt ok", "distanceKm": 8.0,
+                    "avgHeartRate": 150, "elevationGain": 40, "avgPacePerKm": 5.5},
+    })
+
+    async def submit():
+        return await main.submit_workout(payload, Response(), wait=False, idempotency_key="k", if_match=None)
+
+    async def scenario():
+        first = await submit()
+        # Every slot is taken and nothing may queue: a new workout would get a 429.
+        async with scheduler.slot("someone else", INTERACTIVE):
+            return first, await submit()
+
+    first, retry = asyncio.run(scenario())
+    assert retry == first
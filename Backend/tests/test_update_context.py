@@ -0,0 +1,21 @@
+import asyncio
+import json
+
+from agents.tool_context import ToolContext
+
+from custom_agents import update_context
+from models import CoordinatorAgentContext, UserDefinedGoal
+from planned_workouts_model import DailyWorkoutDTO
+
+
+def test_update_context_keeps_the_models_typed(context_data):
+    context = CoordinatorAgentContext.model_validate(context_data)
+    context_data["goals"][0]["title"] = "Sub 1:40 half"
+    arguments = json.dumps({"new_context_json_string": json.dumps(context_data)})
+    tool_context = ToolContext(context, tool_name="update_context", tool_call_id="1", tool_arguments=arguments)
+
+    result = asyncio.run(update_context.on_invoke_tool(tool_context, arguments))
+
+    assert result == "Successfully updated context."
+    assert isinstance(context.goals[0], UserDefinedGoal) and context.goals[0].title == "Sub 1:40 half"
+    assert all(isinstance(day, DailyWorkoutDTO) for day in context.currentTrainingPlan)
@@ -0,0 +1,197 @@
+# training_analytics.py
+# Vectorised training-load numbers over completed workout history, so the coaches get exact figures
+# (weekly volume, trends, acute:chronic ratio, HR zones, send rates, grade pyramids) instead of
+# doing arithmetic over raw workout JSON.
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from completed_workouts_model import CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO
+
+# Lower bounds of HR zones 1-5 as a fraction of max HR.
+HR_ZONE_BOUNDS = np.array([0.0, 0.70, 0.80, 0.87, 0.93])
+DAY = np.timedelta64(1, "D")
+
+
+def _days(dates: list[datetime]) -> np.ndarray:
+    return np.array([d.astimezone(timezone.utc).date() for d in dates], dtype="datetime64[D]")
+
+
+def _week_starts(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday, so (days + 3) % 7 is 0 on Mondays.
+    return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+
+
+def _trend(values: np.ndarray) -> Optional[float]:
+    """Least squares slope per week, None when there are fewer than 3 points."""
+    if len(values) < 3:
+        return None
+    return round(float(np.polyfit(np.arange(len(values)), values, 1)[0]), 3)
+
+
+def _weekly(days: np.ndarray, weeks: int, as_of: np.datetime64) -> tuple[np.ndarray, np.ndarray]:
+    """Week start for each of the last `weeks` weeks, and the week slot of every workout (-1 = out of range)."""
+    last_week = _week_starts(np.array([as_of]))[0]
+    starts = last_week - np.arange(weeks - 1, -1, -1) * 7 * DAY
+    slot = ((_week_starts(days) - starts[0]) // (7 * DAY)).astype(np.int64)
+    slot[(slot < 0) | (slot >= weeks)] = -1
+    return starts, slot
+
+
+def acute_chronic_ratio(days: np.ndarray, load: np.ndarray, as_of: np.datetime64) -> dict:
+    """Rolling 7 day average load over rolling 28 day average load (coupled), as of `as_of`."""
+    age = (as_of - days) // DAY
+    acute = float(load[(age >= 0) & (age < 7)].sum()) / 7
+    chronic = float(load[(age >= 0) & (age < 28)].sum()) / 28
+    return {
+        "acute_daily": round(acute, 2),
+        "chronic_daily": round(chronic, 2),
+        "ratio": round(acute / chronic, 2) if chronic > 0 else None,
+    }
+
+
+def running_analytics(workouts: list[CompletedRunningWorkoutDTO], weeks: int = 12, max_hr: Optional[float] = None, as_of: Optional[datetime] = None) -> dict:
+    if not workouts:
+        return {"activity": "running", "workouts": 0}
+    days = _days([w.date for w in workouts])
+    distance = np.array([w.distanceKm for w in workouts], dtype=np.float64)
+    elevation = np.array([w.elevationGain for w in workouts], dtype=np.float64)
+    pace = np.array([w.avgPacePerKm for w in workouts], dtype=np.float64)
+    heart_rate = np.array([w.avgHeartRate for w in workouts], dtype=np.float64)
+    today = _days([as_of or datetime.now(timezone.utc)])[0]
+
+    starts, slot = _weekly(days, weeks, today)
+    in_range = slot >= 0
+    weekly_distance = np.bincount(slot[in_range], weights=distance[in_range], minlength=weeks)
+    weekly_elevation = np.bincount(slot[in_range], weights=elevation[in_range], minlength=weeks)
+    weekly_runs = np.bincount(slot[in_range], minlength=weeks)
+    # Distance weighted pace, NaN for weeks without runs.
+    weighted_pace = np.bincount(slot[in_range], weights=(pace * distance)[in_range], minlength=weeks)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weekly_pace = np.where(weekly_distance > 0, weighted_pace / weekly_distance, np.nan)
+    active = ~np.isnan(weekly_pace)
+
+    # Max HR: given by the caller, otherwise estimated from the hardest average HR we've seen.
+    valid_hr = heart_rate > 0
+    hr_max = max_hr or (float(np.percentile(heart_rate[valid_hr], 95)) / 0.88 if valid_hr.any() else None)
+    zones = None
+    if hr_max:
+        zone = np.searchsorted(HR_ZONE_BOUNDS, heart_rate[valid_hr] / hr_max, side="right")
+        zones = {
+            "max_hr_used": round(hr_max),
+            "max_hr_estimated": max_hr is None,
+            "km_per_zone": {f"z{z}": round(float(distance[valid_hr][zone == z].sum()), 1) for z in range(1, 6)},
+        }
+
+    return {
+        "activity": "running",
+        "workouts": len(workouts),
+        "weeks": [
+            {
+                "week_of": str(start),
+                "runs": int(runs),
+                "km": round(float(km), 1),
+                "elevation_m": round(float(elev)),
+                "avg_pace_min_per_km": None if np.isnan(p) else round(float(p), 2),
+            }
+            for start, runs, km, elev, p in zip(starts, weekly_runs, weekly_distance, weekly_elevation, weekly_pace)
+        ],
+        "trend_per_week": {
+            "km": _trend(weekly_distance),
+            "elevation_m": _trend(weekly_elevation),
+            # Negative means getting faster.
+            "pace_min_per_km": _trend(weekly_pace[active]),
+        },
+        "acute_chronic_km": acute_chronic_ratio(days, distance, today),
+        "hr_zones": zones,
+        "longest_run_km": round(float(distance.max()), 1),
+    }
+
+
+_YDS = re.compile(r"^5\.(\d{1,2})([abcd])?$", re.IGNORECASE)
+_V = re.compile(r"^V(B|\d{1,2})$", re.IGNORECASE)
+
+
+def grade_score(grade: str) -> tuple[Optional[str], Optional[float]]:
+    """('yds' | 'v', sortable number) for a grade string like '5.10a' or 'V5'; (None, None) if unknown."""
+    grade = grade.strip()
+    match = _YDS.match(grade)
+    if match:
+        number, letter = int(match.group(1)), match.group(2)
+        return "yds", number + ("abcd".index(letter.lower()) * 0.25 if letter else 0.0)
+    match = _V.match(grade)
+    if match:
+        return "v", -1.0 if match.group(1).upper() == "B" else float(match.group(1))
+    return None, None
+
+
+def climbing_analytics(workouts: list[CompletedClimbingWorkoutDTO], weeks: int = 12, as_of: Optional[datetime] = None) -> dict:
+    routes = [(w.date, r) for w in workouts for r in w.routes]
+    if not routes:
+        return {"activity": "climbing", "workouts": len(workouts), "routes": 0}
+    session_days = _days([w.date for w in workouts])
+    route_days = _days([d for d, _ in routes])
+    # One spelling per grade ("v5" -> "V5", "5.10A" -> "5.10a") so they group together.
+    grades = np.array([r.grade.strip().upper() if r.grade.strip()[:1] in "vV" else r.grade.strip().lower() for _, r in routes])
+    scored = [grade_score(r.grade) for _, r in routes]
+    scale = np.array([s or "" for s, _ in scored])
+    score = np.array([np.nan if v is None else v for _, v in scored], dtype=np.float64)
+    sent = np.array([r.send for _, r in routes], dtype=bool)
+    attempts = np.array([max(r.attempts, 1) for _, r in routes], dtype=np.float64)
+    today = _days([as_of or datetime.now(timezone.utc)])[0]
+
+    starts, slot = _weekly(route_days, weeks, today)
+    in_range = slot >= 0
+    weekly_routes = np.bincount(slot[in_range], minlength=weeks)
+    weekly_sends = np.bincount(slot[in_range], weights=sent[in_range].astype(np.float64), minlength=weeks)
+    _, session_slot = _weekly(session_days, weeks, today)
+    weekly_sessions = np.bincount(session_slot[session_slot >= 0], minlength=weeks)
+
+    per_scale = {}
+    for name in ("v", "yds"):
+        mask = scale == name
+        if not mask.any():
+            continue
+        labels, inverse = np.unique(grades[mask], return_inverse=True)
+        label_score = np.full(len(labels), np.nan)
+        label_score[inverse] = score[mask]
+        tried = np.bincount(inverse, minlength=len(labels))
+        sends = np.bincount(inverse, weights=sent[mask].astype(np.float64), minlength=len(labels))
+        tries = np.bincount(inverse, weights=attempts[mask], minlength=len(labels))
+        order = np.argsort(-label_score)
+        sent_scores = score[mask & sent]
+        per_scale[name] = {
+            "max_sent": str(labels[np.argmax(label_score == sent_scores.max())]) if sent_scores.size else None,
+            # Highest grades first, like reading a pyramid from the top.
+            "pyramid": [
+                {
+                    "grade": str(labels[i]),
+                    "sends": int(sends[i]),
+                    "tried": int(tried[i]),
+                    "send_rate": round(float(sends[i] / tried[i]), 2),
+                    "attempts_per_send": round(float(tries[i] / sends[i]), 1) if sends[i] else None,
+                }
+                for i in order
+            ],
+        }
+
+    weekly_sent = np.where(weekly_routes > 0, weekly_sends / np.maximum(weekly_routes, 1), np.nan)
+    return {
+        "activity": "climbing",
+        "workouts": len(workouts),
+        "routes": len(routes),
+        "send_rate": round(float(sent.mean()), 2),
+        "weeks": [
+            {"week_of": str(start), "sessions": int(sessions), "routes": int(n), "sends": int(s)}
+            for start, sessions, n, s in zip(starts, weekly_sessions, weekly_routes, weekly_sends)
+        ],
+        "trend_per_week": {
+            "routes": _trend(weekly_routes.astype(np.float64)),
+            "send_rate": _trend(weekly_sent[~np.isnan(weekly_sent)]),
+        },
+        # Load = routes climbed per day.
+        "acute_chronic_routes": acute_chronic_ratio(route_days, np.ones(len(routes)), today),
+        "grades": per_scale,
+    }
@@ -0,0 +1,167 @@
+# workout_store.py
+# Local structured log of every completed workout, written next to the memory ingest.
+# Supermemory is great for fuzzy "what did my hard runs feel like" questions, but "my last 10 runs" or
+# "every run over 15 km since March" should be an exact, indexed query. SQLite in WAL mode so reads
+# never block the writer.
+import asyncio
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+from dotenv import load_dotenv
+
+from completed_workouts_model import CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO
+from training_analytics import grade_score
+
+load_dotenv()
+
+WORKOUT_STORE_PATH = os.environ.get("WORKOUT_STORE_PATH", "workouts.db")
+
+CompletedWorkout = Union[CompletedClimbingWorkoutDTO, CompletedRunningWorkoutDTO]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completed_workouts (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    activity TEXT NOT NULL,
+    date REAL NOT NULL,               -- unix seconds, UTC
+    distance_km REAL,                 -- running only
+    pace_min_per_km REAL,
+    elevation_gain REAL,
+    avg_heart_rate REAL,
+    max_sent_v REAL,                  -- climbing only, see training_analytics.grade_score
+    max_sent_yds REAL,
+    routes INTEGER,
+    sends INTEGER,
+    payload TEXT NOT NULL             -- the workout DTO as JSON
+);
+CREATE INDEX IF NOT EXISTS idx_completed_workouts_user_activity_date
+    ON completed_workouts (user_id, activity, date);
+"""
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _row(userId: str, workout: CompletedWorkout) -> tuple:
+    if isinstance(workout, CompletedRunningWorkoutDTO):
+        return (
+            userId.lower(), workout.activity, _timestamp(workout.date),
+            workout.distanceKm, workout.avgPacePerKm, workout.elevationGain, workout.avgHeartRate,
+            None, None, None, None,
+            workout.model_dump_json(),
+        )
+    sent = {"v": [], "yds": []}
+    for route in workout.routes:
+        scale, score = grade_score(route.grade)
+        if route.send and scale:
+            sent[scale].append(score)
+    return (
+        userId.lower(), workout.activity, _timestamp(workout.date),
+        None, None, None, None,
+        max(sent["v"], default=None), max(sent["yds"], default=None),
+        len(workout.routes), sum(route.send for route in workout.routes),
+        workout.model_dump_json(),
+    )
+
+
+class WorkoutStore:
+    def __init__(self, path: str = WORKOUT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (asyncio.to_thread uses a pool of threads).
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    ### Sync API
+
+    def add_many_sync(self, userId: str, workouts: list[CompletedWorkout]) -> int:
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO completed_workouts (user_id, activity, date, distance_km, pace_min_per_km, elevation_gain,
+                    avg_heart_rate, max_sent_v, max_sent_yds, routes, sends, payload)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [_row(userId, workout) for workout in workouts],
+            )
+        return len(workouts)
+
+    def query_sync(
+        self,
+        userId: str,
+        activity: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        min_distance_km: Optional[float] = None,
+        max_distance_km: Optional[float] = None,
+        min_pace_min_per_km: Optional[float] = None,
+        max_pace_min_per_km: Optional[float] = None,
+        min_grade: Optional[str] = None,
+        max_grade: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True,
+    ) -> list[CompletedWorkout]:
+        """
+        Exact lookup on the (user, activity, date) index plus optional numeric filters.
+        Grade filters compare the hardest sent route on the grade's own scale (a V grade only matches V grades).
+        """
+        clauses = ["user_id = ?", "activity = ?"]
+        params: list = [userId.lower(), activity]
+        for column, op, value in (
+            ("date", ">=", _timestamp(start_date) if start_date else None),
+            ("date", "<=", _timestamp(end_date) if end_date else None),
+            ("distance_km", ">=", min_distance_km),
+            ("distance_km", "<=", max_distance_km),
+            ("pace_min_per_km", ">=", min_pace_min_per_km),
+            ("pace_min_per_km", "<=", max_pace_min_per_km),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        for grade, op in ((min_grade, ">="), (max_grade, "<=")):
+            if grade:
+                scale, score = grade_score(grade)
+                if scale is None:
+                    raise ValueError(f"unknown grade '{grade}', use V grades like 'V5' or YDS grades like '5.10a'")
+                clauses.append(f"max_sent_{scale} {op} ?")
+                params.append(score)
+
+        sql = f"SELECT payload FROM completed_workouts WHERE {' AND '.join(clauses)} ORDER BY date {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        model = CompletedClimbingWorkoutDTO if activity == "climbing" else CompletedRunningWorkoutDTO
+        rows = self._connection().execute(sql, params).fetchall()
+        return [model.model_validate_json(payload) for (payload,) in rows]
+
+    ### Async API (the SQLite calls run in a worker thread so they never block the event loop)
+
+    async def add(self, userId: str, workout: CompletedWorkout) -> None:
+        await asyncio.to_thread(self.add_many_sync, userId, [workout])
+
+    async def add_many(self, userId: str, workouts: list[CompletedWorkout]) -> int:
+        return await asyncio.to_thread(self.add_many_sync, userId, workouts)
+
+    async def query(self, userId: str, activity: str, **filters) -> list[CompletedWorkout]:
+        return await asyncio.to_thread(self.query_sync, userId, activity, **filters)
+
+    async def last_n(self, userId: str, activity: str, n: int) -> list[CompletedWorkout]:
+        return await self.query(userId, activity, limit=n)
+
+
+workout_store = WorkoutStore()